@@ -0,0 +1,396 @@
+#!/usr/bin/python3
+#
+# Benchmark and synthetic capture generator for nfsiostat_plotter_v4.py
+#
+# License: GNU GPL v2 (http://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+#
+#
+# The generator writes nfsiostat output ("nfsiostat -h -m -t") for N NFS
+# mounts and M intervals with the same system line, time stamp line,
+# "Filesystem:" header and two line file system blocks as the real tool,
+# so the file goes through exactly the same parser code. The values are
+# made up but consistent: a slow daily cycle plus noise and a few bursts,
+# server reads that depend on a cache hit ratio, ops that follow from
+# the throughput and an rsize/wsize.
+#
+# The benchmark generates a capture and runs it through parse() and
+# render() of nfsiostat_plotter_v4.py, the same code as the command
+# line, with the stage timer of the plotter:
+#
+#    parse       - nfsiostat_blocks() into the columnar store
+#    time        - interval_seconds()
+#    statistics  - fs_summary(), derived metrics and detect_anomalies()
+#    figures     - HTML fragments and figure jobs
+#    render      - PNG rendering of the five figures of every mount (in
+#                  a pool of --jobs processes, without the figure cache)
+#
+# and prints the time, the throughput in lines/s and the peak RSS (high
+# water mark of this process and of the render processes).
+#
+# [laytonjb ~]$ ./nfsiostat_bench.py --mounts=4 --intervals=1000,10000,100000
+#
+# Options:
+#    --mounts=N          number of NFS mounts (default 4)
+#    --intervals=M[,M..] number of intervals, one benchmark per value
+#                        (default 10000)
+#    --jobs=N            render processes (default: number of cores)
+#    --no-render         only parse (skip render())
+#    --json=FILE         also write the results as JSON (for comparing runs)
+#    --generate=FILE     only write a capture to FILE and exit
+#    --seed=S            random seed (default 1)
+#    --check             only run the correctness checks (time stamps
+#                        across daylight saving time changes) and exit
+#
+
+from __future__ import print_function
+import sys
+try:
+   import os                          # Needed for paths and temp files
+   import time                        # Needed for timing
+   import tempfile                    # Needed for the scratch directory
+   import shutil                      # Needed to remove the scratch directory
+   import json                        # Needed for --json
+except ImportError:
+   print("Cannot import standard modules - these are needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import numpy;                      # Needed to generate the values
+except ImportError:
+   print("Cannot import numpy module - this is needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+# nfsiostat_plotter_v4.py lives next to this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)));
+try:
+   import nfsiostat_plotter_v4 as plotter;
+except ImportError:
+   print("Cannot import nfsiostat_plotter_v4.py - it must be in the same directory.");
+   print("Exiting...")
+   sys.exit();
+
+
+
+
+def help_out():
+   #
+   # Prints the usage (the comment block at the top of this file)
+   #
+   print("nfsiostat_plotter_v4.py benchmark");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_bench.py --mounts=4 --intervals=1000,10000,100000 ");
+   print(" ");
+   print("   --mounts=N          number of NFS mounts (default 4)");
+   print("   --intervals=M[,M..] number of intervals, one benchmark per value (default 10000)");
+   print("   --jobs=N            render processes (default: number of cores)");
+   print("   --no-render         only parse (skip render())");
+   print("   --json=FILE         also write the results as JSON");
+   print("   --generate=FILE     only write a capture to FILE and exit");
+   print("   --seed=S            random seed (default 1)");
+   print("   --check             only run the correctness checks and exit");
+   print(" ");
+# end def
+
+
+
+
+def capture_values(nmounts, nintervals, rng):
+   #
+   # Makes up the values of every mount and interval.
+   #
+   # Returns a (nmounts, 9, nintervals) array in the column order of
+   #   nfsiostat (plotter.FS_METRICS)
+   #
+   t = numpy.arange(nintervals);
+   values = numpy.zeros( (nmounts, len(plotter.FS_METRICS), nintervals) );
+   for imount in range(0, nmounts):
+      # Daily cycle + noise, with bursts of 10-60 intervals
+      level = 20.0*rng.random_sample() + 5.0;
+      cycle = 1.0 + 0.5*numpy.sin(2.0*numpy.pi*(t/86400.0 + rng.random_sample()));
+      load = level*cycle*rng.lognormal(0.0, 0.3, nintervals);
+      for junk1 in range(0, 1 + nintervals // 20000):
+         start = rng.randint(0, max(1, nintervals - 60));
+         load[start:start + rng.randint(10, 60)] *= 10.0 + 30.0*rng.random_sample();
+      # end for
+
+      read_share = 0.3 + 0.5*rng.random_sample();
+      direct_share = 0.2*rng.random_sample();
+      cache_hit = numpy.clip(rng.normal(0.6, 0.2, nintervals), 0.0, 1.0);
+      rsize = 1024.0*rng.choice([0.0625, 0.25, 1.0]);          # KB
+      wsize = 1024.0*rng.choice([0.0625, 0.25, 1.0]);
+
+      rMB_app = load*read_share;
+      wMB_app = load*(1.0 - read_share);
+      rMB_dir = rMB_app*direct_share;
+      wMB_dir = wMB_app*direct_share;
+      rMB_nor = rMB_app - rMB_dir;
+      wMB_nor = wMB_app - wMB_dir;
+      rMB_svr = rMB_nor*(1.0 - cache_hit) + rMB_dir;
+      wMB_svr = wMB_nor + wMB_dir;
+      # small I/O makes the average operation smaller than rsize/wsize
+      rops = 1024.0*rMB_svr/(rsize*rng.uniform(0.3, 1.0, nintervals));
+      wops = 1024.0*wMB_svr/(wsize*rng.uniform(0.3, 1.0, nintervals));
+      ops = rops + wops + rng.poisson(20.0, nintervals);
+      values[imount] = [rMB_nor, wMB_nor, rMB_dir, wMB_dir, rMB_svr, wMB_svr,
+                        ops, rops, wops];
+   # end for
+   return values;
+# end def
+
+
+
+def generate_capture(filename, nmounts, nintervals, seed):
+   #
+   # Writes a synthetic nfsiostat capture (see the top of this file).
+   #   The intervals are written in chunks so memory stays bounded.
+   #
+   # Returns the number of lines written
+   #
+   rng = numpy.random.RandomState(seed);
+   start = time.mktime( (2014, 4, 10, 11, 59, 50, 0, 0, -1) );
+   header = "Filesystem:           rMB_nor/s    wMB_nor/s    rMB_dir/s    wMB_dir/s    rMB_svr/s    wMB_svr/s     ops/s    rops/s    wops/s\n";
+   mounts = ["192.168.1.%d:/export/vol%d\n" % (imount % 250, imount) for imount in range(0, nmounts)];
+   value_format = "        " + " ".join(["%12.2f"]*6) + " " + " ".join(["%9.2f"]*3) + "\n";
+
+   f = open(filename, 'w');
+   f.write("Linux 3.10.0-123.el7.x86_64 (benchhost) \t04/10/2014 \t_x86_64_\t(8 CPU)\n");
+   f.write("\n");
+   nlines = 2;
+   chunk = 10000;
+   for i0 in range(0, nintervals, chunk):
+      i1 = min(i0 + chunk, nintervals);
+      values = capture_values(nmounts, i1 - i0, rng);
+      lines = [];
+      for i in range(i0, i1):
+         lines.append(time.strftime("%m/%d/%Y %I:%M:%S %p\n", time.localtime(start + i)));
+         lines.append(header);
+         for imount in range(0, nmounts):
+            lines.append(mounts[imount]);
+            lines.append(value_format % tuple(values[imount, :, i - i0]));
+         # end for
+         lines.append("\n");
+      # end for
+      f.writelines(lines);
+      nlines = nlines + len(lines);
+   # end for
+   f.close();
+   return nlines;
+# end def
+
+
+
+
+def bench_stages(timer, nlines):
+   #
+   # Stages recorded by the plotter's stage timer (see stage_mark()) with
+   #   the throughput in lines of the capture per second
+   #
+   stages = [];
+   for junk1 in timer["stages"]:
+      local_dict = {};
+      local_dict["stage"] = junk1["stage"];
+      local_dict["seconds"] = junk1["wall"];
+      local_dict["cpu_seconds"] = junk1["cpu"];
+      local_dict["lines_per_second"] = nlines/max(junk1["wall"], 1.0e-9);
+      local_dict["peak_rss_mb"] = junk1["peak_rss_mb"];
+      local_dict["children_peak_rss_mb"] = junk1["children_peak_rss_mb"];
+      stages.append(local_dict);
+      print("   %-12s %10.3f s %14.0f lines/s   peak RSS %8.1f MB (render processes %.1f MB)" % \
+            (local_dict["stage"], local_dict["seconds"], local_dict["lines_per_second"],
+             local_dict["peak_rss_mb"], local_dict["children_peak_rss_mb"]));
+   # end for
+   return stages;
+# end def
+
+
+
+def time_checks():
+   #
+   # Checks the time stamp conversion and the --from/--to window of the
+   #   plotter on the days the UTC offset changes (Europe/Prague:
+   #   03/30/2014 02:00 -> 03:00 and 10/26/2014 03:00 -> 02:00) against
+   #   time.mktime() of every sample. Returns the list of failed checks.
+   #
+   failed = [];
+   tz = os.environ.get("TZ");
+   os.environ["TZ"] = "Europe/Prague";
+   time.tzset();
+   plotter.date_epoch_cache.clear();
+   plotter.hour_epoch_cache.clear();
+   try:
+      # 01:59:59 -> 03:00:00 on the spring change is one second
+      (x_seconds, x_epoch) = plotter.interval_seconds(["03/30/2014", "03/30/2014"],
+                                                      ["01:59:59", "03:00:00"], ["AM", "AM"]);
+      if (x_seconds.tolist() != [0.0, 1.0]):
+         failed.append("spring DST change: x_seconds " + str(x_seconds.tolist()));
+      # end if
+
+      # every 7 minutes around both changes, 12 hour clock
+      date_list = [];
+      time_list = [];
+      meridian_list = [];
+      expected = [];
+      for start in ["03/29/2014 20:00:00", "10/25/2014 20:00:00"]:
+         ts = time.mktime(time.strptime(start, '%m/%d/%Y %H:%M:%S'));
+         for junk1 in range(0, 12*60//7):
+            junk2 = time.localtime(ts + junk1*420);
+            date_list.append(time.strftime('%m/%d/%Y', junk2));
+            time_list.append(time.strftime('%I:%M:%S', junk2));
+            meridian_list.append(time.strftime('%p', junk2));
+            expected.append(time.mktime(time.strptime(date_list[-1] + " " + time_list[-1] + " " + \
+                                                      meridian_list[-1], '%m/%d/%Y %I:%M:%S %p')));
+         # end for
+      # end for
+      (x_seconds, x_epoch) = plotter.interval_seconds(date_list, time_list, meridian_list);
+      for junk1 in numpy.nonzero(x_epoch != numpy.array(expected))[0]:
+         failed.append("%s %s %s: %.0f instead of %.0f" % (date_list[junk1], time_list[junk1],
+                       meridian_list[junk1], x_epoch[junk1], expected[junk1]));
+      # end for
+
+      # --from/--to dates and times of day on the spring change, and a
+      #   window that ends on the next day (the autumn change)
+      for (time_from, time_to, stamps) in \
+         [("2014-03-30 03:00", "2014-03-30 03:30",
+                             [("03/30/2014", "01:59:59", "AM", -1), ("03/30/2014", "03:00:00", "AM", 0),
+                              ("03/30/2014", "03:30:00", "AM", 0), ("03/30/2014", "03:30:01", "AM", 1)]),
+          ("03:00", "03:30", [("03/30/2014", "01:59:59", "AM", -1), ("03/30/2014", "03:00:00", "AM", 0),
+                              ("03/30/2014", "03:30:00", "AM", 0), ("03/30/2014", "03:30:01", "AM", 1)]),
+          ("22:00", "04:00", [("10/25/2014", "09:59:59", "PM", -1), ("10/25/2014", "10:00:00", "PM", 0),
+                              ("10/26/2014", "03:59:59", "AM", 0), ("10/26/2014", "04:00:01", "AM", 1)])]:
+         ingest_filter = plotter.ingest_filter_new(time_from, time_to);
+         for (local_date, local_time, local_meridian, junk1) in stamps:
+            junk2 = plotter.ingest_time_ok(ingest_filter, local_date, local_time, local_meridian);
+            if (junk2 != junk1):
+               failed.append("--from=%s --to=%s: %s %s %s is %d instead of %d" % (time_from, time_to,
+                             local_date, local_time, local_meridian, junk2, junk1));
+            # end if
+         # end for
+      # end for
+   finally:
+      if (tz == None):
+         del os.environ["TZ"];
+      else:
+         os.environ["TZ"] = tz;
+      # end if
+      time.tzset();
+      plotter.date_epoch_cache.clear();
+      plotter.hour_epoch_cache.clear();
+   # end try
+   return failed;
+# end def
+
+
+
+def bench_run(scratch, nmounts, nintervals, nworkers, render, seed):
+   #
+   # Generates a capture and times the stages of the plotter on it.
+   #   Returns a dictionary with the size of the run and the stages.
+   #
+   filename = os.path.join(scratch, "nfsiostat_%d_%d.out" % (nmounts, nintervals));
+   start = time.time();
+   nlines = generate_capture(filename, nmounts, nintervals, seed);
+   print(" ");
+   print("%d mounts x %d intervals: %d lines, %.1f MB (generated in %.1f s)" % \
+         (nmounts, nintervals, nlines, os.path.getsize(filename)/1048576.0, time.time() - start));
+   run = {"mounts": nmounts, "intervals": nintervals, "lines": nlines,
+          "bytes": os.path.getsize(filename), "stages": []};
+
+   # Parse and render exactly as main() of the plotter does
+   timer = plotter.stage_timer_new();
+   data = plotter.parse(filename, timer=timer);
+   if (render == 1):
+      dirname = os.path.join(scratch, "HTML_REPORT");
+      plotter.render(data, dirname, 0, nworkers, timer=timer, figure_cache=0);
+   # end if
+   print(" ");
+   run["stages"] = bench_stages(timer, nlines);
+
+   os.remove(filename);
+   return run;
+# end def
+
+
+
+
+# ===================
+# Main Python section
+# ===================
+
+if __name__ == '__main__':
+
+   # Get the command line inputs
+   nmounts = 4;
+   nintervals_list = [10000];
+   nworkers = plotter.multiprocessing.cpu_count();
+   render = 1;
+   json_filename = "";
+   generate_filename = "";
+   seed = 1;
+   check = 0;
+   for item in sys.argv[1:]:
+      item2 = item.lower();
+      if (item2[0:9] == "--mounts="):
+         nmounts = int(item2[9:]);
+      elif (item2[0:12] == "--intervals="):
+         nintervals_list = [int(junk1) for junk1 in item2[12:].split(",")];
+      elif (item2[0:7] == "--jobs="):
+         nworkers = int(item2[7:]);
+      elif (item2 == "--no-render"):
+         render = 0;
+      elif (item2[0:7] == "--json="):
+         json_filename = item[7:];
+      elif (item2[0:11] == "--generate="):
+         generate_filename = item[11:];
+      elif (item2[0:7] == "--seed="):
+         seed = int(item2[7:]);
+      elif (item2 == "--check"):
+         check = 1;
+      elif ( (item2[0:2] == "-h") or (item2[0:3] == "--h") ):
+         help_out();
+         sys.exit();
+      # end if
+   # end for
+
+   # Correctness checks only
+   if (check == 1):
+      failed = time_checks();
+      for junk1 in failed:
+         print("FAILED: ",junk1);
+      # end for
+      if (len(failed) > 0):
+         sys.exit(1);
+      # end if
+      print("All checks passed");
+      sys.exit();
+   # end if
+
+   # Generator only
+   if (len(generate_filename) > 0):
+      nlines = generate_capture(generate_filename, nmounts, nintervals_list[0], seed);
+      print("Wrote ",nlines," lines to ",generate_filename);
+      sys.exit();
+   # end if
+
+   print("nfsiostat_plotter_v4.py benchmark (",nworkers," render processes)");
+   scratch = tempfile.mkdtemp(prefix="nfsiostat_bench.");
+   runs = [];
+   try:
+      for nintervals in nintervals_list:
+         runs.append(bench_run(scratch, nmounts, nintervals, nworkers, render, seed));
+      # end for
+   finally:
+      shutil.rmtree(scratch);
+   # end try
+
+   if (len(json_filename) > 0):
+      json_file = open(json_filename, 'w');
+      json.dump({"python": sys.version.split()[0], "numpy": numpy.__version__,
+                 "jobs": nworkers, "runs": runs}, json_file, indent=1, sort_keys=True);
+      json_file.close();
+      print(" ");
+      print("Results written to ",json_filename);
+   # end if
+
+# end if
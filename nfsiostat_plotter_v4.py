@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 #
 # Enhanced data plotter for nfsiostat output. April 10, 2014
 #
@@ -27,7 +27,7 @@
 # [laytonjb ~]$ ./nfsiostat_plotter_v4.py nfsiostat.out
 #
 # where "nfsiostat.out" is the output from nfsiostat. The code is written
-# in Python (obviously) and uses the shlex, time, os, and matplotlib
+# in Python (obviously) and uses the time, os, and matplotlib
 # modules. nfsiostat_plotter is smart enough to gather the data for each
 # device and plot them separately.
 #
@@ -39,51 +39,132 @@
 #
 # If you want to get CPU usage information then you have to run iostat along
 # with nfsiostat. Then you first process the iostat output using the
-# iostat_plotter.py code which produces a Python Pickle file. The pickle
-# is then used as input to nfsiostat_plotter_v4.py. If you don't do this
-# you won't get CPU usage information (Note: this is because nfsiostat does
-# not gather CPU usage).
+# iostat_plotter.py code which produces a columnar directory
+# "iostat_file.columns" (older versions produce a Python Pickle file,
+# "iostat_file.pickle", which is still read). This is then used as input
+# to nfsiostat_plotter_v4.py. If you don't do this you won't get CPU usage
+# information (Note: this is because nfsiostat does not gather CPU usage).
+# nfsiostat_plotter_v4.py writes its own data to "nfsiostat_file.columns"
+# in the same format for other tools.
+#
+# The code runs with Python 3 (and Python 2.7) and can also be imported as
+# a module: parse() reads a capture into a data store and render() writes
+# the report (see "Library API" below). matplotlib is only imported when
+# the first figure is drawn.
 #
 
+from __future__ import print_function
 import sys
 try:
-   import shlex                      # Needed for splitting input lines
+   import time;                       # Needed for time conversion function
+   time_var = 1
 except ImportError:
-   print "Cannot import shlex module - this is needed for this application.";
-   print "Exiting..."
+   time_var = 0;
+   print("Cannot import time module - this is needed for this application.");
+   print("Exiting...")
    sys.exit();
 
 try:
-   import time;                       # Needed for time conversion function
-   time_var = 1
+   import numpy;                      # Needed for per-filesystem data arrays
+   from numpy.lib.stride_tricks import as_strided;   # Needed for rolling windows
 except ImportError:
-   time_var = 0;
-   print "Cannot import time module - this is needed for this application.";
-   print "Exiting..."
+   print("Cannot import numpy module - this is needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+# matplotlib (needed for plots) is imported by matplotlib_import() when
+#   the first figure is drawn, so parse() does not have to load it
+matplotlib = None;
+Figure = None;
+FigureCanvasAgg = None;
+
+try:
+   import multiprocessing             # Needed for parallel plot rendering
+except ImportError:
+   print("Cannot import multiprocessing module - this is needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import json                        # Needed for the checkpoint and summary.json
+except ImportError:
+   print("Cannot import json module - this is needed for this application.");
+   print("Exiting...")
    sys.exit();
 
 try:
-   import matplotlib.pyplot as plt;   # Needed for plots
-   matplotlib_var = 1
+   import base64                      # Needed for the interactive report data
 except ImportError:
-   matplotlib_var = 0;
-   print "Cannot import matplotlib module - this is needed for this application.";
-   print "Exiting..."
+   print("Cannot import base64 module - this is needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import gzip                        # Needed for gzip compressed input
+   import bz2                         # Needed for bzip2 compressed input
+   import io                          # Needed for zstd compressed input
+except ImportError:
+   print("Cannot import gzip/bz2/io modules - these are needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import struct                      # Needed for the remote write export
+except ImportError:
+   print("Cannot import struct module - this is needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import warnings                    # Needed to silence all-NaN statistics
+except ImportError:
+   print("Cannot import warnings module - this is needed for this application.");
+   print("Exiting...")
    sys.exit();
 
 try:
    import os                          # Needed for mkdir
+   import shutil                      # Needed to replace output directories
+except ImportError:
+   print("Cannot import os module - this is needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import re                          # Needed for the --fs selection
+   import fnmatch
 except ImportError:
-   print "Cannot import os module - this is needed for this application.";
-   print "Exiting..."
+   print("Cannot import re/fnmatch modules - these are needed for this application.");
+   print("Exiting...")
    sys.exit();
 
+try:
+   import hashlib                     # Needed for the figure cache
+except ImportError:
+   print("Cannot import hashlib module - this is needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import cProfile                    # Needed for --profile
+   import pstats
+except ImportError:
+   print("Cannot import cProfile/pstats modules - these are needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import resource                    # Needed for the peak memory use
+   resource_success = 1;
+except ImportError:
+   resource_success = 0;              # e.g. Windows: no peak RSS in the timings
+
 try:
    import pickle                      # Needed for pickle
    pickle_success = 1;
 except ImportError:
-   print "Cannot import pickle module - this is not needed for this application.";
-   print "Continuing to process";
+   print("Cannot import pickle module - this is only needed for old iostat_file.pickle files.");
+   print("Continuing to process");
    pickle_success = 0;
 
 
@@ -95,588 +176,1586 @@ except ImportError:
 
 def help_out():
    # prints out help information and stops
-   print " ";
-   print "This application creates a short HTML based report from nfsiostat";
-   print "output (part of the sysstat tools). The report includes plots that";
-   print "help analyze the output. This version relies on sysstat tools version";
-   print "10.x. Many distributions such as CentOS or Red Hat use sysstat version";
-   print "9.x. If this is the case, please upgrade your sysstat tools. This is ";
-   print "not a difficult task but be sure you install over the previous version.";
-   print " ";
-   print "To run the application first gather the nfsiostat information using: ";
-   print "the following example.";
-   print " ";
-   print "[laytonjb ~]$ nfsiostat -h -m -t 1 100 > nfsiostat.out ";
-   print " ";
-   print "where \"1 100\" tells nfsiostat to use \"1\" second intervals and ";
-   print "\"100\" means to gather data for 100 internvals (or 100 seconds in this";
-   print "case). The output from nfsiostat is send to a file which is ";
-   print "\"nfsiostat.out\". You can name the file anything you want but be sure ";
-   print "note the name of the file.";
-   print " ";
-   print "Then to run nfsiostat_plotter using the nfsiostat output file, the command is, ";
-   print " ";
-   print "[laytonjb ~]$ ./nfsiostat_plotter_v4.py nfsiostat.out ";
-   print " ";
-   print "where \"nfsiostat.out\" is the output from nfsiostat. The code is written ";
-   print "in Python (obviously) and uses the shlex, time, os, and matplotlib ";
-   print "modules. Be sure this libraries are installed on your system.";
-   print " ";
-   print "You can run nfsiostat_plotter in one of two ways. The first way creates ";
-   print "the set of plots for each NFS file system mounted on the node. In this ";
-   print "version of nfsiostat_plotter, four plots are created, so if you have ";
-   print "two NFS mounts on the node, then you will ahve a total of eight plots.";
-   print " ";
-   print "The other way to run nfsiostat_plotter is to combine the results for each";
-   print "NFS file system in the plots. This means you will have only four plots";
-   print "in the HTML report even if you have more than one NFS mount. You run this ";
-   print "with the following command:";
-   print " ";
-   print "[laytonjb ~]$ ./nfsiostat_plotter_v4.py -c nfsiostat.out ";
-   print " ";
-   print "The option \"-c\" tells nfsiostat_plotter to \"combine\" the NFS";
-   print "mount point results into a single plot. Currently, you can analyze about";
-   print "four NFS mount points. With more than four NFS mounts, the legend labels";
-   print "run into each other.";
-   print " ";
-   print "When nfsiostat_plotter is done it will create a subdirectory \"HTML_REPORT\" ";
-   print "that contains the plots and an html file \"report.html\". Open that ";
-   print "html file in a browser or word processor and you will see the plots ";
-   print "and a small write-up about them. Feel free to modify the code but ";
-   print "please send back changes. ";
-   print " ";
-   print "Nfsiostat does not collect CPU usage. If you want to plot CPU usage along";
-   print "with NFS usage, you nede to run \"iostat\" when you run \"nfsiostat\". ";
-   print "Once \"iostat\" is done you process the data using \"iostat_plotter.py\". ";
-   print "This code produces a pickle called \"iostat_file.pickle\". This is used by ";
-   print "\"nfsiostat_plotter_v4.py\" as input. If the file exists then the plots ";
-   print "will include CPU usage data. If it doesn't exist then the plots will not ";
-   print "plot CPU usage, only NFS usage.";
-   print " ";
-
-# end def
-
-
-
-
-def Three_Chart(x1, y1, x2, y2, x3, y3, xlabel, ylabel1, ylabel2, ylabel3, 
-                d1, d2, d3, fsize, flegsize, filename, box_expansion):
-   #
-   # Creates 3 vertical subplots with legends and 1 x-axis label at the
-   #   the bottom
-   #
-   # x1 = x-axis data for top plot
-   # x2 = x-axis data for middle plot
-   # x3 = x-axis data for bottom plot
-   # y1 = y-axis data for top plot
-   # y2 = y-axis data for middle plot
-   # y3 = y-axis data for bottom plot
-   # xlabel = x-axis label (only on bottom plot)
-   # ylabel1 = label for top y-axis
-   # ylabel2 = label for middle y-axis
-   # ylabel3 = label for bottom plot
-   # d1 = data label for top plot
-   # d2 = data label for middle plot
-   # d3 = data label for bottom plot
-   # fsize = font size for tick labels
-   # flegsize = font size for legend labels
-   # filename = name of file for plot output
-   # box_expansion = expansion factor on legend box
-   #
-   
-   # Top plot
-   ax1 = plt.subplot(311);                 # Define top plot using subplot function
-   plt.plot(x1,y1, "ro-", label=d1);       # Plot the first data set with a red line wiht "o" as a symbol
-   plt.grid();
-   plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-   plt.ylabel(ylabel1, fontsize=6);        # Use a 6 pt font for y-axis label
-   ax1.set_xticklabels([]);                # get x-axis tick label
-   
-   # Legend
-   box = ax1.get_position()
-   ax1.set_position([box.x0, box.y0, box.width * box_expansion, box.height])  
-   leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame1 = leg1.get_frame();
-   frame1.set_facecolor("0.80");            # Make legend box have a gray background
-   for t in leg1.get_texts():
-      t.set_fontsize(flegsize);             # Change the font size of the legend text to 10 pt.
+   print(" ");
+   print("This application creates a short HTML based report from nfsiostat");
+   print("output (part of the sysstat tools). The report includes plots that");
+   print("help analyze the output. This version relies on sysstat tools version");
+   print("10.x. Many distributions such as CentOS or Red Hat use sysstat version");
+   print("9.x. If this is the case, please upgrade your sysstat tools. This is ");
+   print("not a difficult task but be sure you install over the previous version.");
+   print(" ");
+   print("To run the application first gather the nfsiostat information using: ");
+   print("the following example.");
+   print(" ");
+   print("[laytonjb ~]$ nfsiostat -h -m -t 1 100 > nfsiostat.out ");
+   print(" ");
+   print("where \"1 100\" tells nfsiostat to use \"1\" second intervals and ");
+   print("\"100\" means to gather data for 100 internvals (or 100 seconds in this");
+   print("case). The output from nfsiostat is send to a file which is ");
+   print("\"nfsiostat.out\". You can name the file anything you want but be sure ");
+   print("note the name of the file.");
+   print(" ");
+   print("Then to run nfsiostat_plotter using the nfsiostat output file, the command is, ");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py nfsiostat.out ");
+   print(" ");
+   print("where \"nfsiostat.out\" is the output from nfsiostat. The code is written ");
+   print("in Python (obviously) and uses the time, os, and matplotlib ");
+   print("modules. Be sure this libraries are installed on your system.");
+   print(" ");
+   print("You can run nfsiostat_plotter in one of two ways. The first way creates ");
+   print("the set of plots for each NFS file system mounted on the node. In this ");
+   print("version of nfsiostat_plotter, five plots are created, so if you have ");
+   print("two NFS mounts on the node, then you will ahve a total of ten plots.");
+   print(" ");
+   print("The other way to run nfsiostat_plotter is to combine the results for each");
+   print("NFS file system in the plots. This means you will have only five plots");
+   print("in the HTML report even if you have more than one NFS mount. You run this ");
+   print("with the following command:");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py -c nfsiostat.out ");
+   print(" ");
+   print("The option \"-c\" tells nfsiostat_plotter to \"combine\" the NFS");
+   print("mount point results into a single plot. Currently, you can analyze about");
+   print("four NFS mount points. With more than four NFS mounts, the legend labels");
+   print("run into each other.");
+   print(" ");
+   print("The report ends with the run time, CPU time and peak memory use of each");
+   print("stage. With \"--profile\" the reading and plotting are also profiled with");
+   print("cProfile (the plots are then drawn in one process); the results are in");
+   print("HTML_REPORT/profile.pstats and HTML_REPORT/profile.txt.");
+   print(" ");
+   print("With \"--interactive\" the figures are drawn by the browser instead of");
+   print("being saved as PNG files. The data is embedded in report.html, which");
+   print("then is a single file with charts that can be zoomed with the mouse.");
+   print(" ");
+   print("The nfsiostat output can be compressed with gzip, bzip2, xz or zstd; it");
+   print("is decompressed while it is read (xz needs the lzma module, zstd the");
+   print("zstandard module). Use \"-\" as the file name to read a plain or");
+   print("compressed capture from stdin:");
+   print(" ");
+   print("[laytonjb ~]$ ssh client1 cat nfsiostat.out.gz | ./nfsiostat_plotter_v4.py - ");
+   print(" ");
+   print("To combine the captures of many NFS clients into one report, use");
+   print("\"--fleet\" and list all of the capture files:");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py --fleet client*.out ");
+   print(" ");
+   print("The files are read in parallel and merged by host and NFS mount. The");
+   print("report plots the fleet totals and the \"--top=N\" busiest hosts");
+   print("(default 5), with the statistics of every host and NFS mount.");
+   print("\"--from\", \"--to\" and \"--fs\" (see below) select the intervals and");
+   print("mounts of every capture; \"-c\", \"--interactive\", \"--incremental\" and");
+   print("the exports are not available in the fleet mode.");
+   print(" ");
+   print("The report starts with a table of statistics (mean, 95th and 99th");
+   print("percentile, maximum) of every NFS mount and a table of the busiest");
+   print("intervals; the table columns can be sorted by clicking the header.");
+   print("The number of busiest intervals is set with \"--busiest=N\" (default 10).");
+   print("All statistics are also written to HTML_REPORT/summary.json.");
+   print(" ");
+   print("Bursts in ops/s, rMB_svr and wMB_svr are listed after the statistics:");
+   print("intervals more than \"--anomaly-threshold=Z\" (default 6) robust standard");
+   print("deviations above the median of the previous \"--anomaly-window=N\"");
+   print("intervals (default 60). They are also in summary.json.");
+   print(" ");
+   print("The plots are drawn in parallel, by default using one process per core.");
+   print("The number of processes can be set with the \"--jobs=N\" option, for");
+   print("example:");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py --jobs=4 nfsiostat.out ");
+   print(" ");
+   print("To look at a slice of a long capture, select a time window with");
+   print("\"--from=T\" and/or \"--to=T\" and the mounts with \"--fs=PATTERN\" (a glob,");
+   print("or a regular expression after \"re:\"; the option can be repeated):");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py --from=\"2014-04-10 14:00\" --to=15:30 --fs=\"*home*\" nfsiostat.out ");
+   print(" ");
+   print("T is \"YYYY-MM-DD HH:MM[:SS]\", \"MM/DD/YYYY HH:MM[:SS]\" or a time of day");
+   print("\"HH:MM[:SS]\" on the first day of the capture. Intervals outside the");
+   print("window are skipped while reading, so a slice is read in a fraction of");
+   print("the time of the whole file.");
+   print(" ");
+   print("Every plot is also kept in HTML_REPORT/figure_cache under a hash of its");
+   print("data and settings, so plots that did not change (e.g. when only \"-c\" is");
+   print("toggled, or the same capture is plotted again) are copied instead of");
+   print("redrawn. Use \"--no-figure-cache\" to always draw every plot.");
+   print(" ");
+   print("If nfsiostat is still writing to the file and the report is regenerated");
+   print("regularly, use the \"--incremental\" option. A checkpoint is kept in");
+   print("HTML_REPORT so each run only reads the new part of the file and only");
+   print("redraws the plots of file systems that have new data.");
+   print(" ");
+   print("To watch a running nfsiostat, use \"--follow\" with a growing file or");
+   print("with \"-\" to read from stdin:");
+   print(" ");
+   print("[laytonjb ~]$ nfsiostat -h -m -t 1 | ./nfsiostat_plotter_v4.py --follow - ");
+   print(" ");
+   print("This keeps the last \"--window=N\" intervals (default 600) per NFS mount");
+   print("and rewrites HTML_REPORT/dashboard.html every \"--refresh=S\" seconds");
+   print("(default 10).");
+   print(" ");
+   print("When nfsiostat_plotter is done it will create a subdirectory \"HTML_REPORT\" ");
+   print("that contains the plots and an html file \"report.html\". Open that ");
+   print("html file in a browser or word processor and you will see the plots ");
+   print("and a small write-up about them. Feel free to modify the code but ");
+   print("please send back changes. ");
+   print(" ");
+   print("Nfsiostat does not collect CPU usage. If you want to plot CPU usage along");
+   print("with NFS usage, you nede to run \"iostat\" when you run \"nfsiostat\". ");
+   print("Once \"iostat\" is done you process the data using \"iostat_plotter.py\". ");
+   print("This code produces a directory called \"iostat_file.columns\" (older ");
+   print("versions produce a pickle \"iostat_file.pickle\"). This is used by ");
+   print("\"nfsiostat_plotter_v4.py\" as input. If the file exists then the plots ");
+   print("will include CPU usage data. If it doesn't exist then the plots will not ");
+   print("plot CPU usage, only NFS usage.");
+   print(" ");
+   print("The iostat CPU samples are matched to the nfsiostat intervals using the");
+   print("time stamps of both runs. If the clocks of the two runs differ, use");
+   print("\"--clock-offset=S\" to add S seconds to the iostat time stamps.");
+   print(" ");
+   print("The NFS data is written to the directory \"nfsiostat_file.columns\" ");
+   print("(one numpy .npy file per column plus index.json) for use by other tools.");
+   print(" ");
+   print("The series can also be exported in bulk, every interval of every mount");
+   print("as one record, as InfluxDB line protocol to a file or to an HTTP write");
+   print("endpoint, to a Prometheus remote write endpoint (snappy compressed with");
+   print("the snappy module if it is installed), or as Parquet files partitioned");
+   print("by host and day (needs pyarrow):");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py --influx=nfsiostat.lp nfsiostat.out ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py --influx=http://localhost:8086/write?db=nfs nfsiostat.out ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py --remote-write=http://localhost:9090/api/v1/write nfsiostat.out ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py --parquet=/data/nfsiostat nfsiostat.out ");
+   print(" ");
+
+# end def
+
+
+
+
+# Metrics reported by nfsiostat for every file system (column order)
+FS_METRICS = ["rMB_nor", "wMB_nor", "rMB_dir", "wMB_dir", "rMB_svr", "wMB_svr",
+              "ops", "rops", "wops"];
+
+
+def nfs_store_new(capacity):
+   #
+   # Creates the columnar store for all file systems. The values live in
+   #   one float64 array indexed [file system id, metric, interval] so
+   #   that a whole interval can be stored with a single assignment.
+   #   Intervals in which a file system is not reported stay NaN.
+   #
+   # capacity = number of intervals to preallocate
+   #
+   store = {};
+   store["fs_names"] = [];         # file system name for each id
+   store["fs_index"] = {};         # file system name -> interned integer id
+   store["values"] = numpy.empty( (4, len(FS_METRICS), max(capacity, 16)) );
+   store["values"].fill(numpy.nan);
+   store["count"] = 0;             # number of intervals stored
+   return store;
+# end def
+
+
+def nfs_store_fs_id(store, fs):
+   #
+   # Returns the integer id of file system "fs", adding it to the store
+   #   (and growing the file system axis) the first time it is seen.
+   #
+   fs_id = store["fs_index"].get(fs);
+   if (fs_id == None):
+      fs_id = len(store["fs_names"]);
+      store["fs_index"][fs] = fs_id;
+      store["fs_names"].append(fs);
+      values = store["values"];
+      if (fs_id >= values.shape[0]):
+         new_values = numpy.empty( (max(2*values.shape[0], 4), values.shape[1], values.shape[2]) );
+         new_values.fill(numpy.nan);
+         new_values[0:values.shape[0], :, :] = values;
+         store["values"] = new_values;
+      # end if
+   # end if
+   return fs_id;
+# end def
+
+
+def nfs_store_append_interval(store, rows):
+   #
+   # Bulk ingest of one interval: converts the values of all file systems
+   #   in one numpy call and stores them with one fancy-index assignment.
+   #
+   # store = store created by nfs_store_new()
+   # rows = list of (file system, [9 values]) as yielded by nfsiostat_blocks()
+   #
+   index = store["count"];
+   values = store["values"];
+   if (index >= values.shape[2]):
+      # grow the interval axis by doubling the capacity
+      new_values = numpy.empty( (values.shape[0], values.shape[1], max(2*values.shape[2], 16)) );
+      new_values.fill(numpy.nan);
+      new_values[:, :, 0:index] = values[:, :, 0:index];
+      store["values"] = new_values;
+   # end if
+   if (len(rows) > 0):
+      fs_ids = [nfs_store_fs_id(store, local_fs) for (local_fs, junk1) in rows];
+      block = numpy.array([local_values for (junk1, local_values) in rows],
+                          dtype=numpy.float64);
+      store["values"][fs_ids, :, index] = block;
+   # end if
+   store["count"] = index + 1;
+# end def
+
+
+def nfs_store_fs_data_list(store):
+   #
+   # Trims the store to the intervals actually read and returns the list
+   #   of per file system dictionaries used by the plotting code. Every
+   #   metric is a numpy array view, e.g. local_dict["rMB_nor"].
+   #
+   count = store["count"];
+   store["values"] = store["values"][0:len(store["fs_names"]), :, 0:count].copy();
+   fs_data_list = [];
+   for fs_id in range(0, len(store["fs_names"])):
+      local_dict = {};
+      local_dict["fs"] = store["fs_names"][fs_id];
+      local_dict["values"] = store["values"][fs_id];
+      for j in range(0, len(FS_METRICS)):
+         local_dict[FS_METRICS[j]] = local_dict["values"][j, :];
+      # end for
+      fs_data_list.append(local_dict);
    # end for
+   return fs_data_list;
+# end def
+
+
+
+
+def text_str(value):
+   #
+   # str() of a string from a numpy string array. Arrays written by
+   #   Python 2 hold bytes, which Python 3 has to decode.
+   #
+   if isinstance(value, bytes) and (not isinstance(value, str)):
+      return value.decode("latin-1");
+   # end if
+   return str(value);
+# end def
+
+
+def checkpoint_save(checkpoint_filename, input_filename, nfs_store, date_list,
+                    time_list, meridian_list, system_info, parser_state, cpu_digest=""):
+   #
+   # Writes the incremental mode checkpoint: the columnar store, the time
+   #   columns, the system information, the parser state (byte offset
+   #   of the first interval that has not been read yet) and the
+   #   cpu_digest() of the CPU series the figures were drawn with.
+   #
+   meta = {};
+   meta["input_filename"] = os.path.abspath(input_filename);
+   meta["input_inode"] = os.stat(input_filename).st_ino;
+   meta["system_info"] = system_info;
+   meta["parser_state"] = parser_state;
+   meta["cpu_digest"] = cpu_digest;
    
-   plt.xticks(fontsize=6);
-   plt.yticks(fontsize=6);
-   
-   # Middle plot
-   ax2 = plt.subplot(312);
-   plt.plot(x2,y2, "bo-", label=d2);
-   plt.grid();
-   plt.xlabel(" ");
-   plt.ylabel(ylabel2, fontsize=fsize);
-   ax2.set_xticklabels([]);
-   
-   # Legend
-   box = ax2.get_position();
-   ax2.set_position([box.x0, box.y0, box.width * box_expansion, box.height]);
-   leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame2 = leg2.get_frame();
-   frame2.set_facecolor("0.80");
-   for t in leg2.get_texts():
-      t.set_fontsize(flegsize);
-   # end for
+   count = nfs_store["count"];
+   nfs = len(nfs_store["fs_names"]);
+   temp_filename = checkpoint_filename + ".tmp.npz";
+   numpy.savez(temp_filename,
+               values=nfs_store["values"][0:nfs, :, 0:count],
+               fs_names=numpy.array(nfs_store["fs_names"] + [""]),
+               date_list=numpy.array(date_list + [""]),
+               time_list=numpy.array(time_list + [""]),
+               meridian_list=numpy.array(meridian_list + [""]),
+               meta=numpy.array(json.dumps(meta)));
+   os.rename(temp_filename, checkpoint_filename);
+# end def
+
+
+def checkpoint_load(checkpoint_filename, input_filename):
+   #
+   # Reads a checkpoint written by checkpoint_save(). Returns None when
+   #   there is no usable checkpoint for input_filename (missing, other
+   #   file, file was rotated or truncated), otherwise a dictionary with
+   #   the keys "nfs_store", "date_list", "time_list", "meridian_list",
+   #   "system_info", "parser_state" and "cpu_digest".
+   #
+   if not os.path.isfile(checkpoint_filename):
+      return None;
+   # end if
+   data = numpy.load(checkpoint_filename);
+   meta = json.loads(text_str(data["meta"].item()));
+   input_stat = os.stat(input_filename);
+   if (meta["input_filename"] != os.path.abspath(input_filename)) or \
+      (meta["input_inode"] != input_stat.st_ino) or \
+      (meta["parser_state"]["offset"] > input_stat.st_size):
+      return None;
+   # end if
    
-   plt.xticks(fontsize=fsize);
-   plt.yticks(fontsize=fsize);
-   
-   # Bottom plot
-   ax3 = plt.subplot(313);
-   plt.plot(x3,y3, "go-", label=d3);
-   plt.grid();
-   plt.xlabel(xlabel);
-   plt.ylabel(ylabel3, fontsize=fsize);
-   
-   # Legend
-   box = ax3.get_position()
-   ax3.set_position([box.x0, box.y0, box.width * box_expansion, box.height])
-   leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame3 = leg3.get_frame();
-   frame3.set_facecolor("0.80");
-   for t in leg3.get_texts():
-      t.set_fontsize(flegsize);
+   checkpoint = {};
+   nfs_store = nfs_store_new(0);
+   nfs_store["values"] = data["values"];
+   nfs_store["count"] = data["values"].shape[2];
+   for fs in data["fs_names"].tolist()[0:-1]:
+      nfs_store["fs_index"][text_str(fs)] = len(nfs_store["fs_names"]);
+      nfs_store["fs_names"].append(text_str(fs));
    # end for
-   
-   plt.xticks(fontsize=fsize);
-   plt.yticks(fontsize=fsize);
-   
-   # Either save the plot to a file or display it to the screen
-   if (len(filename) == 0):
-      plt.show();
+   checkpoint["nfs_store"] = nfs_store;
+   checkpoint["date_list"] = [text_str(junk1) for junk1 in data["date_list"].tolist()[0:-1]];
+   checkpoint["time_list"] = [text_str(junk1) for junk1 in data["time_list"].tolist()[0:-1]];
+   checkpoint["meridian_list"] = [text_str(junk1) for junk1 in data["meridian_list"].tolist()[0:-1]];
+   checkpoint["system_info"] = dict([(str(key), str(value)) for (key, value) in meta["system_info"].items()]);
+   checkpoint["parser_state"] = meta["parser_state"];
+   checkpoint["cpu_digest"] = meta.get("cpu_digest", "");
+   data.close();
+   return checkpoint;
+# end def
+
+
+
+
+# Columnar exchange format (replaces the pickle handoff between
+#   iostat_plotter and nfsiostat_plotter):
+#
+#   <name>.columns/index.json   {"format": "nfsiostat-columns", "version": 1,
+#                                "meta": {...},
+#                                "columns": {"<column>": {"file": "<file>",
+#                                            "dtype": "<f8", "shape": [...]}}}
+#   <name>.columns/<file>.npy   one numpy .npy file per column
+#
+# Column names are paths into the nested data, e.g. "cpu_data/user_list",
+#   "time_data/date_list" or "device_data_list/0/r" (list elements use their
+#   index). A .npy file is a short header followed by the raw array, so one
+#   column can be memory-mapped with numpy.load(file, mmap_mode="r")
+#   without reading anything else. Strings are fixed width string arrays;
+#   object arrays (pickles) are never written or loaded.
+#
+# nfsiostat_file.columns holds "x_seconds", "x_epoch", "time_data/*",
+#   "system_info/*", "fs_names" and "fs_values", a float64 array indexed
+#   [file system, metric, interval] (metric order in meta "fs_metrics"),
+#   and "fs_derived", the same for the DERIVED_METRICS (meta
+#   "derived_metrics").
+#   With iostat data it also holds "cpu_data/*" and "cpu_aligned/*", the
+#   CPU series resampled onto x_seconds (NaN where iostat has no sample).
+COLUMNS_FORMAT = "nfsiostat-columns";
+
+
+def columns_flatten(data, prefix, columns):
+   #
+   # Flattens nested dictionaries/lists into {"column/name": numpy array}
+   #
+   if isinstance(data, dict):
+      for key in sorted(data.keys()):
+         columns_flatten(data[key], prefix + str(key) + "/", columns);
+      # end for
+   elif isinstance(data, list) and (len(data) > 0) and isinstance(data[0], (dict, list)):
+      for i in range(0, len(data)):
+         columns_flatten(data[i], prefix + str(i) + "/", columns);
+      # end for
    else:
-      plt.savefig(filename);
-      plt.close();
+      columns[prefix[0:-1]] = numpy.asarray(data);
    # end if
-   
 # end def
 
 
-
-def Two_Chart(x1, y1, x2, y2, xlabel, ylabel1, ylabel2, d1, d2, fsize, 
-              flegsize, filename, box_expansion):
+def columns_write(dirname, data, meta):
    #
-   # Creates 2 vertical subplots with legends and 1 x-axis label at the
-   #   the bottom
+   # Writes nested dictionaries/lists of arrays, number lists and strings
+   #   as a columnar directory (see COLUMNS_FORMAT above). The directory is
+   #   written next to the old one and swapped in when complete.
    #
-   # x1 = x-axis data for top plot
-   # x2 = x-axis data for bottom plot
-   # y1 = y-axis data for top plot
-   # y2 = y-axis data for bottom plot
-   # xlabel = x-axis label (only on bottom plot)
-   # ylabel1 = label for top y-axis
-   # ylabel2 = label for middle y-axis
-   # d1 = data label for top plot
-   # d2 = data label for middle plot
-   # fsize = font size for tick labels
-   # flegsize = font size for legend labels
-   # filename = name of file for plot output
-   # box_expansion = expansion factor on legend box
-   #
-   
-   # Top plot
-   ax1 = plt.subplot(211);                 # Define top plot using subplot function
-   plt.plot(x1,y1, "ro-", label=d1);       # Plot the first data set with a red line with "o" as a symbol
-   plt.grid();
-   plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-   plt.ylabel(ylabel1, fontsize=6);        # Use a 6 pt font for y-axis label
-   ax1.set_xticklabels([]);                # get x-axis tick label
-   
-   # Legend
-   box = ax1.get_position()
-   ax1.set_position([box.x0, box.y0, box.width * box_expansion, box.height])  
-   leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame1 = leg1.get_frame();
-   frame1.set_facecolor("0.80");           # Make legend box have a gray background
-   for t in leg1.get_texts():
-      t.set_fontsize(flegsize);            # Change the font size of the legend text to flegsize
-   # end for
+   columns = {};
+   columns_flatten(data, "", columns);
+   temp_dirname = dirname + ".tmp";
+   if os.path.exists(temp_dirname):
+      shutil.rmtree(temp_dirname);
+   # end if
+   os.makedirs(temp_dirname);
    
-   plt.xticks(fontsize=6);
-   plt.yticks(fontsize=6);
-   
-   # Bottom plot
-   ax2 = plt.subplot(212);
-   plt.plot(x2,y2, "go-", label=d2);
-   plt.grid();
-   plt.xlabel(xlabel);
-   plt.ylabel(ylabel2, fontsize=fsize);
-   
-   # Legend
-   box = ax2.get_position()
-   ax2.set_position([box.x0, box.y0, box.width * box_expansion, box.height])
-   leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame2 = leg2.get_frame();
-   frame2.set_facecolor("0.80");
-   for t in leg2.get_texts():
-      t.set_fontsize(flegsize);
+   index = {"format": COLUMNS_FORMAT, "version": 1, "meta": meta, "columns": {}};
+   for name in sorted(columns.keys()):
+      array = columns[name];
+      if (array.dtype.hasobject):
+         raise ValueError("column " + name + " is not a numeric or string array");
+      # end if
+      filename = name.replace("/", ".") + ".npy";
+      numpy.save(os.path.join(temp_dirname, filename), array, allow_pickle=False);
+      index["columns"][name] = {"file": filename, "dtype": array.dtype.str,
+                                "shape": list(array.shape)};
    # end for
+   index_file = open(os.path.join(temp_dirname, "index.json"), 'w');
+   json.dump(index, index_file, indent=1, sort_keys=True);
+   index_file.close();
    
-   plt.xticks(fontsize=fsize);
-   plt.yticks(fontsize=fsize);
-   
-   # Either save the plot to a file or display it to the screen
-   if (len(filename) == 0):
-      plt.show();
-   else:
-      plt.savefig(filename);
-      plt.close();
+   if os.path.exists(dirname):
+      shutil.rmtree(dirname);
    # end if
-   
+   os.rename(temp_dirname, dirname);
 # end def
 
 
-
-def plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-          time_sum_list, fsize, item, fs_data_list, line_list):
+def columns_index(dirname):
    #
-   # Figure 1: read(2), write(2), total CPU vs. time (skip initial data point
+   # Reads index.json of a columnar directory
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_read_write" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput, and Total CPU Utilization</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_read_write" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput, and Total CPU Utilization</a>";
-      output_str = output_str + "</H3> \n";
+   index_file = open(os.path.join(dirname, "index.json"), 'r');
+   index = json.load(index_file);
+   index_file.close();
+   if (index.get("format") != COLUMNS_FORMAT):
+      raise ValueError(dirname + " is not a " + COLUMNS_FORMAT + " directory");
    # end if
-   
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput from applications \n";
-   output_str = output_str + "using the read(2) and write(2) system call interfaces as well as \n";
-   output_str = output_str + "total CPU usage. You can find out more about write throughput by\n";
-   output_str = output_str + "simply typing \"man 2 read\" or  \"man 2 write\". The throughput  \n";
-   output_str = output_str + "is plotted as a function of time. \n";
-   f.write(output_str);
+   return index;
+# end def
 
-   # make the plot
-   ylabel1 = "NFS Client Read \n Throughput (MB/s) \n by apps via read(2)";
-   ylabel2 = "NFS Client Write \n Throughput (MB/s) \n by apps via write(2)";
-   ylabel3 = "Total CPU \n Percentage \n Utilization";
-   xlabel = "Time (seconds)";
-   #d1 = "NFS Client";
-   d1 = "NFS Client Read";
-   d2 = "NFS Client Write";
-   d3 = "Total CPU Utilization";
-   filename = dirname + "/app_read_write" + str(iloop);
-   fsize = 8;
-   flegsize = 6;
-   
-   if (combined_plots == 0):
-      
-      # Compute box_expansion factor:
-      box_expansion = 0.90;   # default
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         if (len(d3) > ilongest):
-            ilongest = len(d3);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;   # Curve fit of # chars vs. expansion box
-      expansion_box = round(junk1,2);
-      
-      Three_Chart(x_seconds, item["rMB_nor"], x_seconds, item["wMB_nor"],
-                  iostat_x_seconds, time_sum_list, xlabel, ylabel1, ylabel2, ylabel3,
-                  d1, d2, d3, fsize, flegsize, filename, box_expansion);
-   elif (combined_plots == 1):
-      jloop = -1;
-      expansion_box = 0.88;   # default
-      
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         d11 = item["fs"] + ": \n ";
-         if (len(d11) > ilongest):
-            ilongest = len(d11);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         d22 = item["fs"] + ": \n";
-         if (len(d22) > ilongest):
-            ilongest = len(d22);
-         # end if
-         if (len(d3) > ilongest):
-            ilongest = len(d3);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;   # Curve fit of # chars vs. expansion box
-      expansion_box = round(junk1,2);
-      
-      # Top plot:
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax1 = plt.subplot(311);                 # Define top plot using subplot function
-         d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_nor"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
-         ax1.set_xticklabels([]);                # get x-axis tick label
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend
-      box = ax1.get_position()
-      ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame1 = leg1.get_frame();
-      frame1.set_facecolor("0.80");           # Make legend box have a gray background
-      for t in leg1.get_texts():
-         t.set_fontsize(flegsize);               # Change the font size of the legend text to 10 pt.
+
+def columns_open(dirname, name, index=None):
+   #
+   # Opens a single column. Arrays are memory-mapped read only; scalar
+   #   columns (e.g. "system_info/kernel") are returned as Python values.
+   #
+   if (index == None):
+      index = columns_index(dirname);
+   # end if
+   entry = index["columns"][name];
+   filename = os.path.join(dirname, entry["file"]);
+   if (len(entry["shape"]) == 0) or (0 in entry["shape"]):
+      value = numpy.load(filename, allow_pickle=False);
+      if (len(entry["shape"]) > 0):
+         return value;
       # end if
-      
-      # Middle Plot:
-      jloop = -1;
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax2 = plt.subplot(312);
-         d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_nor"], marker, label=d22);
-         plt.xlabel(" ");
-         plt.ylabel(ylabel2, fontsize=fsize);
-         ax2.set_xticklabels([]);
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend:
-      box = ax2.get_position()
-      ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame2 = leg2.get_frame();
-      frame2.set_facecolor("0.80");
-      for t in leg2.get_texts():
-         t.set_fontsize(flegsize);
-      # end for
-      
-      # Bottom plot
-      ax3 = plt.subplot(313);
-      plt.plot(iostat_x_seconds, time_sum_list, "go-", label=d3);
-      plt.grid();
-      plt.xlabel(xlabel);
-      plt.ylabel(ylabel3, fontsize=fsize);
-      
-      # Legend
-      box = ax3.get_position()
-      ax3.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame3 = leg3.get_frame();
-      frame3.set_facecolor("0.80");
-      for t in leg3.get_texts():
-         t.set_fontsize(flegsize);
-      # end for
-      
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
-      
-      # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
+      value = value.item();
+      if isinstance(value, bytes):
+         value = text_str(value);
       # end if
+      return value;
    # end if
-      
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput, and Total CPU utilization for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput, and Total CPU utilization </strong></center><BR><BR> \n";
-   # end if
-   output_str = output_str + "<BR><BR> \n";
-   output_str = output_str + "</P> \n \n";
-   f.write(output_str);
-   
+   return numpy.load(filename, mmap_mode='r', allow_pickle=False);
 # end def
 
 
+def columns_series(dirname, fs, metric):
+   #
+   # Opens the series of one metric (e.g. "wMB_svr") of one file system in
+   #   nfsiostat_file.columns as a memory-mapped array.
+   #
+   index = columns_index(dirname);
+   fs_names = [text_str(junk1) for junk1 in columns_open(dirname, "fs_names", index)];
+   fs_values = columns_open(dirname, "fs_values", index);
+   return fs_values[fs_names.index(fs), index["meta"]["fs_metrics"].index(metric)];
+# end def
 
 
-def plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds,
-           fsize, item, fs_data_list, line_list):
+def columns_load(dirname):
    #
-   # Figure 1: read(2), write(2) (skip initial data point)
-   #   This is when iostat data is not included
+   # Opens all columns of a columnar directory and rebuilds the nested
+   #   dictionaries/lists (dictionaries with only numeric keys become
+   #   lists). Arrays stay memory-mapped. Returns (data, meta).
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_read_write" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_read_write" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput</a>";
-      output_str = output_str + "</H3> \n";
+   index = columns_index(dirname);
+   data = {};
+   for name in sorted(index["columns"].keys()):
+      parts = name.split("/");
+      local_dict = data;
+      for part in parts[0:-1]:
+         local_dict = local_dict.setdefault(part, {});
+      # end for
+      local_dict[parts[-1]] = columns_open(dirname, name, index);
+   # end for
+   return (columns_to_lists(data), index["meta"]);
+# end def
+
+
+def columns_to_lists(data):
+   #
+   # Turns dictionaries with keys "0", "1", ... back into lists
+   #
+   if not isinstance(data, dict):
+      return data;
    # end if
-   
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput from applications \n";
-   output_str = output_str + "using the read(2) and write(2) system call interfaces. You can  find\n";
-   output_str = output_str + "out more about write throughput by simply typing \"man 2 read\"\n";
-   output_str = output_str + "or  \"man 2 write\". The throughput is plotted as a function of time. \n";
-   f.write(output_str);
+   for key in data.keys():
+      data[key] = columns_to_lists(data[key]);
+   # end for
+   if (len(data) > 0) and all([str(key).isdigit() for key in data.keys()]):
+      return [data[key] for key in sorted(data.keys(), key=int)];
+   # end if
+   return data;
+# end def
 
-   # make the plot
-   ylabel1 = "NFS Client Read \n Throughput (MB/s) \n by apps via read(2)";
-   ylabel2 = "NFS Client Write \n Throughput (MB/s) \n by apps via write(2)";
-   xlabel = "Time (seconds)";
+
+
+
+# Cache of parsed dates: date string -> epoch seconds of local midnight
+date_epoch_cache = {};
+
+# Cache of local hours: (date string, hour) -> epoch seconds of HH:00:00
+hour_epoch_cache = {};
+
+
+def date_struct(date_str):
+   #
+   # Parses a date string of date_epoch() into a time.struct_time.
+   #
+   if (date_str.find("-") > 0):
+      return time.strptime(date_str, '%Y-%m-%d');
+   elif (len(date_str.split("/")[-1]) == 2):
+      return time.strptime(date_str, '%m/%d/%y');
+   # end if
+   return time.strptime(date_str, '%m/%d/%Y');
+# end def
+
+
+def date_epoch(date_str):
+   #
+   # Converts a date string written by nfsiostat/iostat ("MM/DD/YYYY",
+   #   "MM/DD/YY" or "YYYY-MM-DD") to the epoch seconds of local midnight.
+   #   A capture only spans a few distinct days so results are cached.
+   #
+   ts = date_epoch_cache.get(date_str);
+   if (ts == None):
+      ts = time.mktime(date_struct(date_str));
+      date_epoch_cache[date_str] = ts;
+   # end if
+   return ts;
+# end def
+
+
+def hour_epoch(date_str, hour):
+   #
+   # Epoch seconds of local time "hour":00:00 (0-23) on date_str. Local
+   #   midnight plus 3600*hour is wrong on the days the UTC offset changes
+   #   (daylight saving time), so the offset is taken from time.mktime()
+   #   for every distinct (date, hour) pair. Results are cached.
+   #
+   ts = hour_epoch_cache.get( (date_str, hour) );
+   if (ts == None):
+      junk1 = date_struct(date_str);
+      ts = time.mktime( (junk1.tm_year, junk1.tm_mon, junk1.tm_mday, hour, 0, 0, 0, 0, -1) );
+      hour_epoch_cache[ (date_str, hour) ] = ts;
+   # end if
+   return ts;
+# end def
+
+
+def interval_seconds(date_list, time_list, meridian_list):
+   #
+   # Vectorized conversion of the date/time/meridian columns to time
+   #   stamps. The "HH:MM:SS" strings are decoded as a byte matrix, the
+   #   12 hour clock is fixed up with array masks and every distinct
+   #   (date, hour) pair is converted once (see hour_epoch()).
+   #
+   # Returns (x_seconds, x_epoch) as float64 arrays where x_seconds is
+   #   relative to the first interval and x_epoch is in epoch seconds.
+   #
+   if (len(date_list) == 0):
+      return (numpy.zeros(0), numpy.zeros(0));
+   # end if
+   
+   # "HH:MM:SS" -> (n, 8) matrix of digits
+   times = numpy.char.zfill(numpy.array(time_list).astype('S8'), 8);
+   digits = times.view(numpy.uint8).reshape(-1, 8).astype(numpy.int64) - ord("0");
+   hours = digits[:, 0]*10 + digits[:, 1];
+   seconds = (digits[:, 3]*10 + digits[:, 4])*60 + digits[:, 6]*10 + digits[:, 7];
+   
+   # 12 hour clock: 1-11 PM -> 13-23, 12 AM -> 0
+   meridian = numpy.array(meridian_list).astype('S2');
+   hours = hours + 12*((meridian == b"PM") & (hours < 12));
+   hours = hours - 12*((meridian == b"AM") & (hours == 12));
+   
+   # Seconds of every distinct local (date, hour) pair, see hour_epoch()
+   (dates, date_inverse) = numpy.unique(numpy.array(date_list), return_inverse=True);
+   (date_hours, hour_inverse) = numpy.unique(date_inverse*24 + hours, return_inverse=True);
+   junk1 = [hour_epoch(text_str(dates[junk2 // 24]), int(junk2 % 24)) for junk2 in date_hours];
+   
+   x_epoch = numpy.array(junk1)[hour_inverse] + seconds;
+   x_seconds = x_epoch - x_epoch[0];
+   return (x_seconds, x_epoch);
+# end def
+
+
+
+
+def align_asof(target_epoch, source_epoch, source_values, tolerance=None):
+   #
+   # As-of merge of a sampled series onto another time base. iostat and
+   #   nfsiostat both report averages over the interval that ends at the
+   #   time stamp, so every target time takes the first source sample at
+   #   or after it, as long as that sample's interval covers the target
+   #   time (source time - target time <= tolerance). Target times in a
+   #   gap of the source (missing intervals, before or after the source
+   #   run) get NaN.
+   #
+   # tolerance defaults to the median sampling interval of the source.
+   # source_values is (n) or (k, n); the result is (len(target_epoch)) or
+   #   (k, len(target_epoch)) float64.
+   #
+   target_epoch = numpy.asarray(target_epoch, dtype=numpy.float64);
+   source_epoch = numpy.asarray(source_epoch, dtype=numpy.float64);
+   source_values = numpy.asarray(source_values, dtype=numpy.float64);
+   
+   order = numpy.argsort(source_epoch, kind="mergesort");
+   source_epoch = source_epoch[order];
+   source_values = source_values[..., order];
+   out_shape = source_values.shape[0:-1] + (len(target_epoch),);
+   if (len(source_epoch) == 0):
+      return numpy.nan*numpy.ones(out_shape);
+   # end if
+   if (tolerance == None):
+      if (len(source_epoch) > 1):
+         tolerance = numpy.median(numpy.diff(source_epoch));
+      else:
+         tolerance = 0.0;
+      # end if
+   # end if
+   
+   idx = numpy.searchsorted(source_epoch, target_epoch, side="left");
+   valid = idx < len(source_epoch);
+   idx = numpy.minimum(idx, len(source_epoch) - 1);
+   valid = valid & ((source_epoch[idx] - target_epoch) <= tolerance);
+   
+   aligned = source_values[..., idx];
+   aligned[..., ~valid] = numpy.nan;
+   return aligned;
+# end def
+
+
+# iostat CPU series that are put on the nfsiostat time base
+CPU_METRICS = ["user_list", "nice_list", "system_list", "iowait_list",
+               "steal_list", "idle_list", "time_sum_list"];
+
+
+def cpu_align(iostat_dict, x_epoch, clock_offset):
+   #
+   # Resamples the iostat CPU data onto the nfsiostat intervals (x_epoch)
+   #   with align_asof(). clock_offset (seconds) is added to the iostat
+   #   time stamps to correct for a clock difference between the two
+   #   captures. If the iostat time stamps cannot be decoded, both runs
+   #   are assumed to have started together.
+   #
+   # Returns (dictionary of CPU_METRICS arrays aligned to x_epoch,
+   #          number of nfsiostat intervals that have a CPU sample)
+   #
+   try:
+      (junk1, iostat_epoch) = interval_seconds(iostat_dict["time_data"]["date_list"],
+                                               iostat_dict["time_data"]["time_list"],
+                                               iostat_dict["time_data"]["meridian_list"]);
+   except (ValueError, IndexError, KeyError):
+      print("   Cannot decode iostat time stamps - assuming iostat and nfsiostat started together");
+      iostat_epoch = numpy.asarray(iostat_dict["x_seconds"], dtype=numpy.float64);
+      if (len(x_epoch) > 0):
+         iostat_epoch = iostat_epoch + x_epoch[0];
+      # end if
+   # end try
+   iostat_epoch = iostat_epoch + clock_offset;
+   
+   values = numpy.array([numpy.asarray(iostat_dict["cpu_data"][junk1], dtype=numpy.float64)
+                         for junk1 in CPU_METRICS]);
+   aligned = align_asof(x_epoch, iostat_epoch, values);
+   cpu_aligned = {};
+   for j in range(0, len(CPU_METRICS)):
+      cpu_aligned[CPU_METRICS[j]] = aligned[j];
+   # end for
+   matched = int(numpy.sum(~numpy.isnan(aligned[0])));
+   return (cpu_aligned, matched);
+# end def
+
+
+
+
+# Magic bytes at the start of compressed captures
+COMPRESSION_MAGIC = [(b"\x1f\x8b", "gzip"),
+                     (b"BZh", "bzip2"),
+                     (b"\xfd7zXZ\x00", "xz"),
+                     (b"\x28\xb5\x2f\xfd", "zstd")];
+
+
+def capture_compression(input_filename):
+   #
+   # Returns the compression of a capture file ("gzip", "bzip2", "xz",
+   #   "zstd") from its magic bytes, or "" for plain text and stdin.
+   #
+   if (input_filename == "-") or (not os.path.isfile(input_filename)):
+      return "";
+   # end if
+   raw_file = open(input_filename, 'rb');
+   magic = raw_file.read(6);
+   raw_file.close();
+   return magic_compression(magic);
+# end def
+
+
+def magic_compression(magic):
+   #
+   # Compression named by the first bytes of a capture (see
+   #   COMPRESSION_MAGIC), or "" for plain text
+   #
+   for (junk1, compression) in COMPRESSION_MAGIC:
+      if (magic[0:len(junk1)] == junk1):
+         return compression;
+      # end if
+   # end for
+   return "";
+# end def
+
+
+def open_capture(input_filename):
+   #
+   # Opens a capture file for reading line by line. Compressed captures
+   #   (see capture_compression()) are decompressed as they are read, so
+   #   nothing is written to disk and the file is only read once.
+   #   xz needs the lzma module (or backports.lzma on Python 2) and zstd
+   #   the zstandard module. "-" reads the capture from stdin (see
+   #   open_stdin_binary()).
+   #
+   # Lines are str on Python 2 and 3 (see capture_text()).
+   #
+   return capture_text(open_capture_binary(input_filename));
+# end def
+
+
+def capture_text(binary_file):
+   #
+   # Python 3: text view of a binary capture file. Latin-1 maps every
+   #   byte to one character and newline="" keeps "\r\n", so len(line)
+   #   is the size of the line in bytes and the parser offsets used by
+   #   the incremental mode stay byte offsets that can be seek()ed to.
+   #   Python 2 reads str lines from the binary file directly.
+   #
+   if (sys.version_info[0] < 3):
+      return binary_file;
+   # end if
+   return io.TextIOWrapper(binary_file, encoding="latin-1", newline="");
+# end def
+
+
+def lzma_module():
+   #
+   # Imports the lzma module (backports.lzma on Python 2) for xz input
+   #
+   try:
+      import lzma;
+   except ImportError:
+      try:
+         from backports import lzma;
+      except ImportError:
+         print("Cannot import lzma module - this is needed for xz compressed input.");
+         print("Exiting...")
+         sys.exit();
+      # end try
+   # end try
+   return lzma;
+# end def
+
+
+def zstd_reader(raw_file):
+   #
+   # Decompressing binary file for zstd input read from raw_file (needs
+   #   the zstandard module)
+   #
+   try:
+      import zstandard;
+   except ImportError:
+      print("Cannot import zstandard module - this is needed for zstd compressed input.");
+      print("Exiting...")
+      sys.exit();
+   # end try
+   reader = zstandard.ZstdDecompressor().stream_reader(raw_file, read_across_frames=True);
+   return io.BufferedReader(reader);
+# end def
+
+
+def open_capture_binary(input_filename):
+   #
+   # Opens a capture file as a binary file (see open_capture())
+   #
+   if (input_filename == "-"):
+      return open_stdin_binary();
+   # end if
+   compression = capture_compression(input_filename);
+   if (compression == "gzip"):
+      return gzip.open(input_filename, 'rb');
+   elif (compression == "bzip2"):
+      return bz2.BZ2File(input_filename, 'r');
+   elif (compression == "xz"):
+      return lzma_module().open(input_filename, 'rb');
+   elif (compression == "zstd"):
+      return zstd_reader(open(input_filename, 'rb'));
+   # end if
+   return open(input_filename, 'rb');
+# end def
+
+
+def open_stdin_binary():
+   #
+   # Standard input as a binary capture file, e.g. for
+   #   "xzcat capture.xz | ..." or a capture that is still compressed
+   #   ("cat capture.gz | ..."). The compression is taken from the magic
+   #   bytes in the peeked read buffer, so nothing is consumed before
+   #   the decompressor reads the stream. Python 2 can only read plain
+   #   text from stdin (its gzip and bz2 modules need a seekable file).
+   #
+   if (sys.version_info[0] < 3):
+      raw_file = io.open(sys.stdin.fileno(), 'rb', closefd=False);
+   else:
+      raw_file = sys.stdin.buffer;
+   # end if
+   compression = magic_compression(raw_file.peek(6)[0:6]);
+   if (compression != "") and (sys.version_info[0] < 3):
+      print("Compressed input on stdin needs Python 3 - decompress it first (e.g. with zcat).");
+      print("Exiting...")
+      sys.exit();
+   # end if
+   if (compression == "gzip"):
+      return gzip.GzipFile(fileobj=raw_file, mode='rb');
+   elif (compression == "bzip2"):
+      return bz2.BZ2File(raw_file, 'r');
+   elif (compression == "xz"):
+      return lzma_module().open(raw_file, 'rb');
+   elif (compression == "zstd"):
+      return zstd_reader(raw_file);
+   # end if
+   return raw_file;
+# end def
+
+
+
+
+# Parser states for nfsiostat_blocks()
+PARSE_SYSTEM = 1;      # waiting for the system information line
+PARSE_TIME = 2;        # waiting for the time stamp of the next interval
+PARSE_HEADER = 3;      # waiting for the "Filesystem:" column header
+PARSE_FS = 4;          # waiting for a file system name (or name + values)
+PARSE_VALUES = 5;      # waiting for the values of the current file system
+PARSE_SKIP = 6;        # in a block outside the time window (see ingest_filter_new())
+
+
+def nfsiostat_blocks(input_lines, system_info, parser_state=None, ingest_filter=None):
+   #
+   # Generator that walks nfsiostat output one line at a time and yields
+   #   one sample per interval block. Only the current block is held in
+   #   memory so the input can be arbitrarily large.
+   #
+   # input_lines = any iterable of lines (open file, sys.stdin, ...)
+   # system_info = dictionary that is filled in from the system line
+   # parser_state = optional dictionary to resume parsing (incremental mode):
+   #   parser_state["state"]  = state to start in (PARSE_SYSTEM or PARSE_TIME)
+   #   parser_state["offset"] = byte offset of input_lines in the file; it is
+   #                            advanced past every completed block
+   #   When parser_state is given, a trailing block that is not terminated
+   #   (by a blank line or the next time stamp) is not yielded since it may
+   #   still be being written.
+   # ingest_filter = optional ingest_filter_new() time window and file
+   #   system selection. Blocks outside the window are skipped after the
+   #   time stamp check without splitting their value lines, values of
+   #   file systems that are not selected are never stored, and reading
+   #   stops at the first block after the end of the window.
+   #
+   # Every yielded sample is a tuple (date, time, meridian, rows) where
+   #   date     = date string as written by nfsiostat (e.g. "04/10/2014")
+   #   time     = time string as written by nfsiostat (e.g. "02:15:01")
+   #   meridian = "AM", "PM" or "" when nfsiostat prints a 24 hour clock
+   #   rows     = list of (file system, [9 value strings]) in input order
+   #
+   # Lines are tokenized with a plain whitespace split. Both the "-h"
+   #   layout (name and values on separate lines) and the single line
+   #   layout are understood.
+   #
+   if (parser_state == None):
+      state = PARSE_SYSTEM;
+      offset = 0;
+   else:
+      state = parser_state["state"];
+      offset = parser_state["offset"];
+   # end if
+   sample = None;
+   temp_fs = "";
+   for line in input_lines:
+      if (parser_state != None) and (not line.endswith("\n")):
+         # Partial last line of a file that is still being written
+         break;
+      # end if
+      line_offset = offset;
+      offset = offset + len(line);
+
+      # Value lines (indented) that are not kept are not even split
+      if ((line[0:1] == " ") or (line[0:1] == "\t")) and (not line.isspace()):
+         if (state == PARSE_SKIP):
+            continue;
+         elif (state == PARSE_VALUES) and (temp_fs == None):
+            state = PARSE_FS;
+            continue;
+         # end if
+      # end if
+      currentline = line.split();
+
+      if (len(currentline) == 0):
+         # Blank line finishes an interval block
+         if (state != PARSE_SYSTEM):
+            state = PARSE_TIME;
+         # end if
+         if (parser_state != None):
+            parser_state["state"] = state;
+            parser_state["offset"] = offset;
+         # end if
+         if (sample != None) and (len(sample[3]) > 0):
+            yield sample;
+         # end if
+         sample = None;
+         continue;
+      # end if
+
+      if (state == PARSE_FS) or (state == PARSE_VALUES) or (state == PARSE_SKIP):
+         if (len(currentline) >= 2) and (len(currentline) <= 3) and \
+            (currentline[1].find(":") > 0):
+            # New time stamp without a separating blank line
+            state = PARSE_TIME;
+            if (parser_state != None):
+               parser_state["state"] = state;
+               parser_state["offset"] = line_offset;
+            # end if
+            if (sample != None) and (len(sample[3]) > 0):
+               yield sample;
+            # end if
+            sample = None;
+         # end if
+      # end if
+
+      if (state == PARSE_VALUES):
+         if (len(currentline) >= 9) and (temp_fs != None):
+            sample[3].append( (temp_fs, currentline[0:9]) );
+         # end if
+         state = PARSE_FS;
+      elif (state == PARSE_FS):
+         if (len(currentline) >= 10):
+            if (ingest_filter == None) or ingest_fs_ok(ingest_filter, currentline[0]):
+               sample[3].append( (currentline[0], currentline[1:10]) );
+            # end if
+         elif (len(currentline) == 1):
+            temp_fs = currentline[0];
+            if (ingest_filter != None) and (not ingest_fs_ok(ingest_filter, temp_fs)):
+               temp_fs = None;
+            # end if
+            state = PARSE_VALUES;
+         # end if
+      elif (state == PARSE_HEADER):
+         state = PARSE_FS;
+      elif (state == PARSE_TIME):
+         if (len(currentline) > 2):
+            meridian = currentline[2];
+         else:
+            meridian = "";
+         # end if
+         sample = (currentline[0], currentline[1], meridian, []);
+         state = PARSE_HEADER;
+         if (ingest_filter != None):
+            junk1 = ingest_time_ok(ingest_filter, currentline[0], currentline[1], meridian);
+            if (junk1 > 0):
+               # After the end of the time window: nothing more to read
+               sample = None;
+               break;
+            elif (junk1 < 0):
+               sample = None;
+               state = PARSE_SKIP;
+            # end if
+         # end if
+      elif (state == PARSE_SYSTEM):
+         system_info["OS"] = currentline[0];
+         system_info["kernel"] = currentline[1];
+         system_info["system_name"] = currentline[2][1:len(currentline[2])-1];
+         system_info["date"] = currentline[3];
+         system_info["CPU"] = currentline[4];
+         system_info["cores"] = currentline[5][1:];
+         state = PARSE_TIME;
+      # end if
+   # end for
+
+   # Last block is not always followed by a blank line
+   if (parser_state == None) and (sample != None) and (len(sample[3]) > 0):
+      yield sample;
+   # end if
+
+# end def
+
+
+def ingest_filter_new(time_from="", time_to="", fs_patterns=[]):
+   #
+   # Selection applied by nfsiostat_blocks() while reading:
+   #
+   # time_from, time_to = start and end of the time window ("" = open),
+   #   "YYYY-MM-DD HH:MM[:SS]" (or with a "T"), "MM/DD/YYYY HH:MM[:SS]",
+   #   or a time of day "HH:MM[:SS]" on the first day of the capture
+   #   (an end before the start is on the next day). Both ends are
+   #   included.
+   # fs_patterns = file systems to keep: glob patterns (fnmatch), or
+   #   regular expressions when prefixed with "re:". Empty keeps all.
+   #
+   # Reading stops at the first interval after the window, so the
+   #   capture is assumed to be in time order.
+   #
+   ingest_filter = {};
+   ingest_filter["from"] = window_time(time_from);
+   ingest_filter["to"] = window_time(time_to);
+   ingest_filter["resolved"] = 0;
+   ingest_filter["fs"] = [];
+   for pattern in fs_patterns:
+      if (pattern[0:3] == "re:"):
+         ingest_filter["fs"].append(re.compile(pattern[3:]));
+      else:
+         ingest_filter["fs"].append(re.compile(fnmatch.translate(pattern)));
+      # end if
+   # end for
+   ingest_filter["fs_ok"] = {};            # file system name -> selected (cache)
+   return ingest_filter;
+# end def
+
+
+def window_time(text):
+   #
+   # Decodes a --from/--to time (see ingest_filter_new()). Returns None
+   #   for "", ("epoch", seconds) for a date and time, or ("day", seconds
+   #   since midnight) for a time of day.
+   #
+   text = text.strip();
+   if (len(text) == 0):
+      return None;
+   # end if
+   for junk1 in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M',
+                 '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M']:
+      try:
+         return ("epoch", time.mktime(time.strptime(text, junk1)));
+      except ValueError:
+         pass;
+      # end try
+   # end for
+   for junk1 in ['%H:%M:%S', '%H:%M']:
+      try:
+         junk2 = time.strptime(text, junk1);
+         return ("day", junk2.tm_hour*3600 + junk2.tm_min*60 + junk2.tm_sec);
+      except ValueError:
+         pass;
+      # end try
+   # end for
+   raise ValueError("cannot decode time " + text);
+# end def
+
+
+def ingest_time_ok(ingest_filter, date_str, time_str, meridian):
+   #
+   # Time stamp check of one interval block against the time window of
+   #   ingest_filter_new(): -1 before the window, 0 inside, 1 after.
+   #   Times of day are put on the date of the first block checked.
+   #
+   if (ingest_filter["resolved"] == 0):
+      for junk1 in ["from", "to"]:
+         if (ingest_filter[junk1] != None) and (ingest_filter[junk1][0] == "day"):
+            junk2 = ingest_filter[junk1][1];
+            ingest_filter[junk1] = ("epoch", hour_epoch(date_str, junk2 // 3600) + junk2 % 3600);
+            if (junk1 == "to") and (ingest_filter["from"] != None) and \
+               (ingest_filter["to"][1] < ingest_filter["from"][1]):
+               # e.g. 22:00 to 02:00: the end is on the next day (local
+               #   midnight + 26 hours is on the next day, with or without DST)
+               junk3 = time.strftime('%Y-%m-%d', time.localtime(date_epoch(date_str) + 93600));
+               ingest_filter["to"] = ("epoch", hour_epoch(junk3, junk2 // 3600) + junk2 % 3600);
+            # end if
+         # end if
+      # end for
+      ingest_filter["resolved"] = 1;
+   # end if
+
+   junk1 = time_str.split(":");
+   hours = int(junk1[0]);
+   if (meridian == "PM") and (hours < 12):
+      hours = hours + 12;
+   elif (meridian == "AM") and (hours == 12):
+      hours = 0;
+   # end if
+   ts = hour_epoch(date_str, hours) + int(junk1[1])*60 + int(junk1[2]);
+   if (ingest_filter["from"] != None) and (ts < ingest_filter["from"][1]):
+      return -1;
+   elif (ingest_filter["to"] != None) and (ts > ingest_filter["to"][1]):
+      return 1;
+   # end if
+   return 0;
+# end def
+
+
+def ingest_fs_ok(ingest_filter, fs):
+   #
+   # True when file system "fs" is selected by ingest_filter_new()
+   #
+   ok = ingest_filter["fs_ok"].get(fs);
+   if (ok == None):
+      ok = (len(ingest_filter["fs"]) == 0) or any([junk1.match(fs) != None for junk1 in ingest_filter["fs"]]);
+      ingest_filter["fs_ok"][fs] = ok;
+   # end if
+   return ok;
+# end def
+
+
+
+
+def decimate_minmax(x, y, max_points):
+   #
+   # Per-pixel min/max envelope: splits the series into max_points/2
+   #   buckets and keeps the minimum and the maximum sample of every
+   #   bucket (in time order). Peaks survive, unlike plain striding.
+   #
+   # x = x-axis data, y = y-axis data (numpy arrays, NaN allowed)
+   # max_points = maximum number of points to keep
+   #
+   # Returns (x, y) unchanged when the series is already short enough.
+   #
+   n = len(y);
+   nbuckets = max_points // 2;
+   if (n <= max_points) or (nbuckets < 1):
+      return (x, y);
+   # end if
+   x = numpy.asarray(x);
+   y = numpy.asarray(y, dtype=numpy.float64);
+   size = -(-n // nbuckets);                      # samples per bucket (rounded up)
+   nbuckets = -(-n // size);
+   
+   # NaN (missing intervals) and padding never win min/max
+   padded = numpy.empty(nbuckets*size);
+   padded[0:n] = y;
+   padded[n:] = -numpy.inf;
+   padded[numpy.isnan(padded)] = -numpy.inf;
+   imax = numpy.argmax(padded.reshape(nbuckets, size), axis=1);
+   padded[padded == -numpy.inf] = numpy.inf;
+   imin = numpy.argmin(padded.reshape(nbuckets, size), axis=1);
+   
+   offset = numpy.arange(nbuckets)*size;
+   keep = numpy.union1d(offset + imin, offset + imax);
+   keep = keep[keep < n];
+   return (x[keep], y[keep]);
+# end def
+
+
+
+def matplotlib_import():
+   #
+   # Imports matplotlib (Agg backend, no display needed) the first time a
+   #   figure is needed. Raises ImportError when matplotlib is missing.
+   #
+   global matplotlib, Figure, FigureCanvasAgg;
+   if (matplotlib != None):
+      return;
+   # end if
+   try:
+      import matplotlib;
+      matplotlib.use("Agg");
+      from matplotlib.figure import Figure;
+      from matplotlib.backends.backend_agg import FigureCanvasAgg;
+   except ImportError:
+      print("Cannot import matplotlib module - this is needed for the plots.");
+      raise;
+   # end try
+# end def
+
+
+
+def plot_max_points():
+   #
+   # Maximum number of points per line: two (min and max) per pixel of
+   #   the figure width used for the PNG files.
+   #
+   matplotlib_import();
+   dpi = matplotlib.rcParams["savefig.dpi"];
+   if (dpi == "figure"):
+      dpi = matplotlib.rcParams["figure.dpi"];
+   # end if
+   return 2*int(matplotlib.rcParams["figure.figsize"][0] * dpi);
+# end def
+
+
+
+def figure_job(filename, xlabel, panels, fsize, flegsize, combined_plots,
+               item, fs_data_list, x_seconds, line_list):
+   #
+   # Describes one figure of stacked subplots (one x-axis label at the
+   #   bottom) as plain data so it can be drawn by render_figure() in
+   #   another process.
+   #
+   # filename = name of file for plot output (without ".png")
+   # xlabel = x-axis label (only on bottom plot)
+   # panels = list of (ylabel, data label, series) from top to bottom where
+   #          series is a metric name (e.g. "rMB_nor") plotted for "item"
+   #          (or for every file system if combined_plots == 1) or an
+   #          (x, y) tuple for data that is not per file system (CPU)
+   # fsize = font size for tick labels
+   # flegsize = font size for legend labels
+   #
+   # Long series are reduced with decimate_minmax() so at most two points
+   #   per pixel column are sent to the renderer.
+   #
+   max_points = plot_max_points();
+   if (len(panels) == 2):
+      single_markers = ["ro-", "go-"];
+   elif (len(panels) == 4):
+      single_markers = ["ro-", "bo-", "go-", "mo-"];
+   else:
+      single_markers = ["ro-", "bo-", "go-"];
+   # end if
+   
+   job = {};
+   job["filename"] = filename;
+   job["xlabel"] = xlabel;
+   job["fsize"] = fsize;
+   job["flegsize"] = flegsize;
+   job["panels"] = [];
+   job["cpu"] = 0;            # 1: draws data that is not per file system (CPU)
+   ilongest = 0;
+   for ipanel in range(0, len(panels)):
+      (ylabel, dlabel, series) = panels[ipanel];
+      lines = [];
+      if (type(series) == tuple):
+         job["cpu"] = 1;
+         (x, y) = decimate_minmax(series[0], series[1], max_points);
+         lines.append( (x, y, single_markers[ipanel], dlabel) );
+      elif (combined_plots == 0):
+         (x, y) = decimate_minmax(x_seconds, item[series], max_points);
+         lines.append( (x, y, single_markers[ipanel], dlabel) );
+      elif (combined_plots == 1):
+         jloop = -1;
+         for local_dict in fs_data_list:
+            jloop = jloop + 1;
+            marker = line_list[jloop % len(line_list)];
+            d11 = local_dict["fs"] + ": \n" + dlabel;
+            (x, y) = decimate_minmax(x_seconds, local_dict[series], max_points);
+            lines.append( (x, y, marker, d11) );
+            if (len(local_dict["fs"] + ": \n ") > ilongest):
+               ilongest = len(local_dict["fs"] + ": \n ");
+            # end if
+         # end for
+      # end if
+      if (len(dlabel) > ilongest):
+         ilongest = len(dlabel);
+      # end if
+      job["panels"].append( (ylabel, lines) );
+   # end for
+   
+   # Legend box expansion factor
+   if (combined_plots == 0):
+      job["box_expansion"] = 0.90;   # default
+   else:
+      junk1 = -0.0082702674*ilongest + 1.0538027948;   # Curve fit of # chars vs. expansion box
+      job["box_expansion"] = round(junk1,2);
+   # end if
+   return job;
+# end def
+
+
+
+def render_figure(job):
+   #
+   # Draws a figure described by figure_job() with the object oriented
+   #   matplotlib API on an Agg canvas and saves it as PNG. No pyplot
+   #   state is used so figures can be drawn in parallel processes.
+   #
+   fsize = job["fsize"];
+   flegsize = job["flegsize"];
+   box_expansion = job["box_expansion"];
+   
+   matplotlib_import();
+   fig = Figure();
+   FigureCanvasAgg(fig);
+   npanels = len(job["panels"]);
+   for ipanel in range(0, npanels):
+      (ylabel, lines) = job["panels"][ipanel];
+      ax = fig.add_subplot(npanels, 1, ipanel+1);
+      for (x, y, marker, label) in lines:
+         ax.plot(x, y, marker, label=label);
+      # end for
+      ax.grid();
+      ax.set_ylabel(ylabel, fontsize=fsize);
+      if (ipanel < npanels-1):
+         ax.set_xlabel(" ");                # Only the bottom plot has an x-axis label
+         ax.set_xticklabels([]);
+      else:
+         ax.set_xlabel(job["xlabel"]);
+      # end if
+      ax.tick_params(labelsize=fsize);
+      
+      # Legend
+      box = ax.get_position();
+      ax.set_position([box.x0, box.y0, box.width * box_expansion, box.height]);
+      leg = ax.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0,
+                      borderpad=0.15, handletextpad=0.2);
+      frame = leg.get_frame();
+      frame.set_facecolor("0.80");           # Make legend box have a gray background
+      for t in leg.get_texts():
+         t.set_fontsize(flegsize);
+      # end for
+   # end for
+   
+   fig.savefig(job["filename"] + ".png");
+   return job["filename"];
+# end def
+
+
+
+# Figure cache: PNGs stored under the figure_key() of the job that drew
+#   them, so a figure whose data and parameters did not change is copied
+#   instead of drawn again. Entries not used for FIGURE_CACHE_DAYS days,
+#   and the least recently used ones above FIGURE_CACHE_ENTRIES, are
+#   removed by figure_cache_prune().
+FIGURE_CACHE_VERSION = 1;
+FIGURE_CACHE_DAYS = 30;
+FIGURE_CACHE_ENTRIES = 500;
+
+
+def figure_key(job):
+   #
+   # Content hash of a figure job: the decimated series (as float64) plus
+   #   every plot parameter, the matplotlib version and the figure size
+   #   settings. The output file name is not part of the key.
+   #
+   matplotlib_import();
+   digest = hashlib.sha1();
+   junk1 = (FIGURE_CACHE_VERSION, matplotlib.__version__, str(matplotlib.rcParams["savefig.dpi"]),
+            str(matplotlib.rcParams["figure.dpi"]), list(matplotlib.rcParams["figure.figsize"]),
+            job["xlabel"], job["fsize"], job["flegsize"], job["box_expansion"]);
+   digest.update(repr(junk1).encode("utf-8"));
+   for (ylabel, lines) in job["panels"]:
+      digest.update(repr((ylabel, len(lines))).encode("utf-8"));
+      for (x, y, marker, label) in lines:
+         digest.update(repr((marker, label, len(x))).encode("utf-8"));
+         digest.update(numpy.ascontiguousarray(x, dtype=numpy.float64).tobytes());
+         digest.update(numpy.ascontiguousarray(y, dtype=numpy.float64).tobytes());
+      # end for
+   # end for
+   return digest.hexdigest();
+# end def
+
+
+def figure_cache_prune(cache_dirname, run_start, incremental=0):
+   #
+   # Removes figure cache entries that were not used for FIGURE_CACHE_DAYS
+   #   days and then the least recently used entries above
+   #   FIGURE_CACHE_ENTRIES (hits refresh the modification time). Entries
+   #   reused or stored by this run are never removed, so an unchanged
+   #   rerun of a report with more figures than FIGURE_CACHE_ENTRIES still
+   #   reuses all of them.
+   #
+   # run_start = time.time() before render_figures()
+   # incremental = 1: entries that were neither reused nor stored since
+   #   run_start are removed too. Used in the incremental mode, where every
+   #   new interval changes the figure keys so the entries of earlier runs
+   #   are never hit again.
+   #
+   if not os.path.isdir(cache_dirname):
+      return;
+   # end if
+   # allow for file systems with a coarse modification time
+   this_run = run_start - 2.0;
+   oldest = time.time() - FIGURE_CACHE_DAYS*86400;
+   if (incremental == 1):
+      oldest = max(oldest, this_run);
+   # end if
+   entries = [];
+   nkept = 0;
+   for filename in os.listdir(cache_dirname):
+      filename = os.path.join(cache_dirname, filename);
+      mtime = os.path.getmtime(filename);
+      if (filename[-4:] != ".png"):
+         # temporary file of a figure_cache_store() that may be running
+         if (mtime < time.time() - FIGURE_CACHE_DAYS*86400):
+            os.remove(filename);
+         # end if
+         continue;
+      # end if
+      if (mtime < oldest):
+         os.remove(filename);
+      elif (mtime < this_run):
+         entries.append( (mtime, filename) );
+      else:
+         # used by this run: kept, but counts towards FIGURE_CACHE_ENTRIES
+         nkept = nkept + 1;
+      # end if
+   # end for
+   entries.sort();
+   for (mtime, filename) in entries[0:max(0, nkept + len(entries) - FIGURE_CACHE_ENTRIES)]:
+      os.remove(filename);
+   # end for
+# end def
+
+
+def render_figures(figure_jobs, nworkers, cache_dirname=None):
+   #
+   # Renders all figure jobs, in a pool of "nworkers" processes when
+   #   nworkers > 1. Results come back in job order, and every figure is
+   #   drawn independently, so the output does not depend on nworkers.
+   #
+   # With cache_dirname, figures that are in the figure cache are copied
+   #   from it first and only the others are drawn (and then added to
+   #   the cache), so the time depends on what changed.
+   #
+   # Yields the index of every finished job (for progress messages).
+   #
+   todo = list(range(0, len(figure_jobs)));
+   cache_filenames = {};
+   if (cache_dirname != None):
+      if not os.path.exists(cache_dirname):
+         os.makedirs(cache_dirname);
+      # end if
+      todo = [];
+      for ijob in range(0, len(figure_jobs)):
+         cache_filename = os.path.join(cache_dirname, figure_key(figure_jobs[ijob]) + ".png");
+         if os.path.isfile(cache_filename):
+            shutil.copyfile(cache_filename, figure_jobs[ijob]["filename"] + ".png");
+            os.utime(cache_filename, None);
+            yield ijob;
+         else:
+            cache_filenames[ijob] = cache_filename;
+            todo.append(ijob);
+         # end if
+      # end for
+      print("   Reused ",len(figure_jobs) - len(todo)," of ",len(figure_jobs)," plots from the figure cache");
+   # end if
+   
+   if (nworkers > 1) and (len(todo) > 1):
+      pool = multiprocessing.Pool(min(nworkers, len(todo)));
+      try:
+         idone = -1;
+         for junk1 in pool.imap(render_figure, [figure_jobs[ijob] for ijob in todo]):
+            idone = idone + 1;
+            figure_cache_store(figure_jobs[todo[idone]], cache_filenames.get(todo[idone]));
+            yield todo[idone];
+         # end for
+      finally:
+         pool.terminate();
+      # end try
+   else:
+      for ijob in todo:
+         render_figure(figure_jobs[ijob]);
+         figure_cache_store(figure_jobs[ijob], cache_filenames.get(ijob));
+         yield ijob;
+      # end for
+   # end if
+# end def
+
+
+def figure_cache_store(job, cache_filename):
+   #
+   # Adds the PNG of a drawn figure job to the figure cache (nothing to do
+   #   when cache_filename is None). Written under a temporary name and
+   #   renamed, so concurrent runs never see half of a file.
+   #
+   if (cache_filename == None):
+      return;
+   # end if
+   temp_filename = cache_filename + "." + str(os.getpid()) + ".tmp";
+   shutil.copyfile(job["filename"] + ".png", temp_filename);
+   os.rename(temp_filename, cache_filename);
+# end def
+
+
+
+def plot1(iloop, iplot, combined_plots, dirname, x_seconds, time_sum_list,
+          fsize, item, fs_data_list, line_list):
+   #
+   # Figure 1: read(2), write(2), total CPU vs. time (skip initial data point
+   #   time_sum_list = total CPU aligned to x_seconds (see cpu_align())
+   #   Returns (HTML fragment, figure job for render_figure())
+   #
+   if (combined_plots == 0):
+      output_str = "<H4> \n"
+      junk1 = "app_read_write" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput, and Total CPU Utilization</a>";
+      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
+      output_str = output_str + "</H4> \n";
+   elif (combined_plots == 1):
+      output_str = "<H3> \n"
+      junk1 = "app_read_write" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput, and Total CPU Utilization</a>";
+      output_str = output_str + "</H3> \n";
+   # end if
+   
+   output_str = output_str + " \n";
+   output_str = output_str + "<P>This figure plots the read and write throughput from applications \n";
+   output_str = output_str + "using the read(2) and write(2) system call interfaces as well as \n";
+   output_str = output_str + "total CPU usage. You can find out more about write throughput by\n";
+   output_str = output_str + "simply typing \"man 2 read\" or  \"man 2 write\". The throughput  \n";
+   output_str = output_str + "is plotted as a function of time. \n";
+   
+   # make the plot
+   ylabel1 = "NFS Client Read \n Throughput (MB/s) \n by apps via read(2)";
+   ylabel2 = "NFS Client Write \n Throughput (MB/s) \n by apps via write(2)";
+   ylabel3 = "Total CPU \n Percentage \n Utilization";
+   xlabel = "Time (seconds)";
    d1 = "NFS Client Read";
    d2 = "NFS Client Write";
+   d3 = "Total CPU Utilization";
    filename = dirname + "/app_read_write" + str(iloop);
    fsize = 8;
    flegsize = 6;
    
+   panels = [(ylabel1, d1, "rMB_nor"),
+             (ylabel2, d2, "wMB_nor"),
+             (ylabel3, d3, (x_seconds, time_sum_list))];
+   job = figure_job(filename, xlabel, panels, fsize, flegsize, combined_plots,
+                    item, fs_data_list, x_seconds, line_list);
+   
+   # HTML Output:
+   output_str = output_str + "<center> \n";
+   junk1 = "app_read_write" + str(iloop) + ".png";
+   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
    if (combined_plots == 0):
-      
-      # Compute box_expansion factor:
-      box_expansion = 0.90;   # default
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;   # Curve fit of # chars vs. expansion box
-      expansion_box = round(junk1,2);
-      
-      Two_Chart(x_seconds, item["rMB_nor"], x_seconds, item["wMB_nor"], xlabel, ylabel1,
-                ylabel2, d1, d2, fsize, flegsize, filename, box_expansion);
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput, and Total CPU utilization for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
    elif (combined_plots == 1):
-      jloop = -1;
-      expansion_box = 0.88;   # default
-      
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         d11 = item["fs"] + ": \n ";
-         if (len(d11) > ilongest):
-            ilongest = len(d11);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         d22 = item["fs"] + ": \n";
-         if (len(d22) > ilongest):
-            ilongest = len(d22);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;   # Curve fit of # chars vs. expansion box
-      expansion_box = round(junk1,2);
-      
-      # Top plot:
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax1 = plt.subplot(211);                 # Define top plot using subplot function
-         d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_nor"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
-         ax1.set_xticklabels([]);                # get x-axis tick label
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend
-      box = ax1.get_position()
-      ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame1 = leg1.get_frame();
-      frame1.set_facecolor("0.80");           # Make legend box have a gray background
-      for t in leg1.get_texts():
-         t.set_fontsize(flegsize);               # Change the font size of the legend text to 10 pt.
-      # end if
-      
-      # Middle Plot:
-      jloop = -1;
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax2 = plt.subplot(212);
-         d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_nor"], marker, label=d22);
-         plt.xlabel(xlabel);
-         plt.ylabel(ylabel2, fontsize=fsize);
-         ax2.set_xticklabels([]);
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend:
-      box = ax2.get_position()
-      ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame2 = leg2.get_frame();
-      frame2.set_facecolor("0.80");
-      for t in leg2.get_texts():
-         t.set_fontsize(flegsize);
-      # end for
-      
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
-      
-      # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput, and Total CPU utilization </strong></center><BR><BR> \n";
    # end if
-      
+   output_str = output_str + "<BR><BR> \n";
+   output_str = output_str + "</P> \n \n";
+   return (output_str, job);
+   
+# end def
+
+
+
+
+def plot1a(iloop, iplot, combined_plots, dirname, x_seconds,
+           fsize, item, fs_data_list, line_list):
+   #
+   # Figure 1: read(2), write(2) (skip initial data point)
+   #   This is when iostat data is not included
+   #   Returns (HTML fragment, figure job for render_figure())
+   #
+   if (combined_plots == 0):
+      output_str = "<H4> \n"
+      junk1 = "app_read_write" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput</a>";
+      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
+      output_str = output_str + "</H4> \n";
+   elif (combined_plots == 1):
+      output_str = "<H3> \n"
+      junk1 = "app_read_write" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput</a>";
+      output_str = output_str + "</H3> \n";
+   # end if
+   
+   output_str = output_str + " \n";
+   output_str = output_str + "<P>This figure plots the read and write throughput from applications \n";
+   output_str = output_str + "using the read(2) and write(2) system call interfaces. You can  find\n";
+   output_str = output_str + "out more about write throughput by simply typing \"man 2 read\"\n";
+   output_str = output_str + "or  \"man 2 write\". The throughput is plotted as a function of time. \n";
+   
+   # make the plot
+   ylabel1 = "NFS Client Read \n Throughput (MB/s) \n by apps via read(2)";
+   ylabel2 = "NFS Client Write \n Throughput (MB/s) \n by apps via write(2)";
+   xlabel = "Time (seconds)";
+   d1 = "NFS Client Read";
+   d2 = "NFS Client Write";
+   filename = dirname + "/app_read_write" + str(iloop);
+   fsize = 8;
+   flegsize = 6;
+   
+   panels = [(ylabel1, d1, "rMB_nor"),
+             (ylabel2, d2, "wMB_nor")];
+   job = figure_job(filename, xlabel, panels, fsize, flegsize, combined_plots,
+                    item, fs_data_list, x_seconds, line_list);
+   
    # HTML Output:
-   output_str = "<center> \n";
+   output_str = output_str + "<center> \n";
    junk1 = "app_read_write" + str(iloop) + ".png";
    output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
    if (combined_plots == 0):
@@ -686,16 +1765,18 @@ def plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds,
    # end if
    output_str = output_str + "<BR><BR> \n";
    output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return (output_str, job);
    
 # end def
 
 
 
-def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-          time_sum_list, fsize, item, fs_data_list, line_list):
+def plot2(iloop, iplot, combined_plots, dirname, x_seconds, time_sum_list,
+          fsize, item, fs_data_list, line_list):
    #
    # Figure 2: read, write, total CPU vs. time (DIRECT IO)
+   #   time_sum_list = total CPU aligned to x_seconds (see cpu_align())
+   #   Returns (HTML fragment, figure job for render_figure())
    #
    if (combined_plots == 0):
       output_str = "<H4> \n"
@@ -715,7 +1796,6 @@ def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
    output_str = output_str + "applications that opened the file using the O_DIRECT flag. It \n";
    output_str = output_str + "also plots the total CPU usage (user + system). The throughput  \n";
    output_str = output_str + "is plotted as a function of time. \n";
-   f.write(output_str);
    
    # make the plot
    ylabel1 = "Read Throughput (MB/s) \n by apps using O_DIRECT";
@@ -729,315 +1809,267 @@ def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
    fsize = 8;
    flegsize = 6;
    
+   panels = [(ylabel1, d1, "rMB_dir"),
+             (ylabel2, d2, "wMB_dir"),
+             (ylabel3, d3, (x_seconds, time_sum_list))];
+   job = figure_job(filename, xlabel, panels, fsize, flegsize, combined_plots,
+                    item, fs_data_list, x_seconds, line_list);
+   
+   # HTML Output:
+   output_str = output_str + "<center> \n";
+   junk1 = "app_read_write_dir" + str(iloop) + ".png";
+   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
    if (combined_plots == 0):
-      box_expansion = 0.90; 
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         if (len(d3) > ilongest):
-            ilongest = len(d3);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      Three_Chart(x_seconds, item["rMB_dir"], x_seconds, item["wMB_dir"],
-                  iostat_x_seconds, time_sum_list, xlabel, ylabel1, ylabel2, ylabel3,
-                  d1, d2, d3, fsize, flegsize, filename, box_expansion);
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT, and Total CPU utilization for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
    elif (combined_plots == 1):
-      jloop = -1;
-      expansion_box = 0.88;   # default
-      
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         d11 = item["fs"] + ": \n ";
-         if (len(d11) > ilongest):
-            ilongest = len(d11);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         d22 = item["fs"] + ": \n";
-         if (len(d22) > ilongest):
-            ilongest = len(d22);
-         # end if
-         if (len(d3) > ilongest):
-            ilongest = len(d3);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      # Top plot:
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax1 = plt.subplot(311);                 # Define top plot using subplot function
-         d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_dir"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
-         ax1.set_xticklabels([]);                # get x-axis tick label
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend
-      box = ax1.get_position()
-      ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame1 = leg1.get_frame();
-      frame1.set_facecolor("0.80");           # Make legend box have a gray background
-      for t in leg1.get_texts():
-         t.set_fontsize(flegsize);               # Change the font size of the legend text to 10 pt.
-      # end if
-      
-      # Middle Plot:
-      jloop = -1;
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax2 = plt.subplot(312);
-         d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_dir"], marker, label=d22);
-         plt.xlabel(" ");
-         plt.ylabel(ylabel2, fontsize=fsize);
-         ax2.set_xticklabels([]);
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend:
-      box = ax2.get_position()
-      ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame2 = leg2.get_frame();
-      frame2.set_facecolor("0.80");
-      for t in leg2.get_texts():
-         t.set_fontsize(flegsize);
-      # end for
-      
-      # Bottom plot
-      ax3 = plt.subplot(313);
-      plt.plot(iostat_x_seconds, time_sum_list, "go-", label=d3);
-      plt.grid();
-      plt.xlabel(xlabel);
-      plt.ylabel(ylabel3, fontsize=fsize);
-      
-      # Legend
-      box = ax3.get_position()
-      ax3.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame3 = leg3.get_frame();
-      frame3.set_facecolor("0.80");
-      for t in leg3.get_texts():
-         t.set_fontsize(flegsize);
-      # end for
-      
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
-      
-      # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT, and Total CPU utilization </strong></center><BR><BR> \n";
+   # end if
+   output_str = output_str + "<BR><BR> \n";
+   output_str = output_str + "</P> \n \n";
+   return (output_str, job);
+   
+# end def
+
+
+
+
+def plot2a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item,
+           fs_data_list, line_list):
+   #
+   # Figure 2a: read, write vs. time (DIRECT IO)
+   #   No iostat data
+   #   Returns (HTML fragment, figure job for render_figure())
+   #
+   if (combined_plots == 0):
+      output_str = "<H4> \n"
+      junk1 = "app_read_write_dir" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput with O_DIRECT</a>";
+      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
+      output_str = output_str + "</H4> \n";
+   elif (combined_plots == 1):
+      output_str = "<H3> \n"
+      junk1 = "app_read_write_dir" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput with O_DIRECT</a>";
+      output_str = output_str + "</H3> \n";
+   # end if
+   
+   output_str = output_str + " \n";
+   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
+   output_str = output_str + "applications that opened the file using the O_DIRECT flag. \n";
+   output_str = output_str + "The throughput is plotted as a function of time. \n";
+   
+   # make the plot
+   ylabel1 = "Read Throughput (MB/s) \n by apps using O_DIRECT";
+   ylabel2 = "Write Throughput (MB/s) \n by apps using O_DIRECT";
+   xlabel = "Time (seconds)";
+   d1 = "NFS Client Read";
+   d2 = "NFS Client Write";
+   filename = dirname + "/app_read_write_dir" + str(iloop);
+   fsize = 8;
+   flegsize = 6;
+   
+   panels = [(ylabel1, d1, "rMB_dir"),
+             (ylabel2, d2, "wMB_dir")];
+   job = figure_job(filename, xlabel, panels, fsize, flegsize, combined_plots,
+                    item, fs_data_list, x_seconds, line_list);
+   
+   # HTML Output:
+   output_str = output_str + "<center> \n";
+   junk1 = "app_read_write_dir" + str(iloop) + ".png";
+   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
+   if (combined_plots == 0):
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
+   elif (combined_plots == 1):
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT</strong></center><BR><BR> \n";
+   # end if
+   output_str = output_str + "<BR><BR> \n";
+   output_str = output_str + "</P> \n \n";
+   return (output_str, job);
+   
+# end def
+
+
+
+
+
+
+def plot3(iloop, iplot, combined_plots, dirname, x_seconds, time_sum_list,
+          fsize, item, fs_data_list, line_list):
+   #
+   # Figure 3: read, write, total CPU vs. time (NFS READ and NFS WRITE)
+   #   time_sum_list = total CPU aligned to x_seconds (see cpu_align())
+   #   Returns (HTML fragment, figure job for render_figure())
+   #
+   if (combined_plots == 0):
+      output_str = "<H4> \n"
+      junk1 = "app_read_write_svr" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE, and Total CPU Utilization</a>";
+      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
+      output_str = output_str + "</H4> \n";
+   elif (combined_plots == 1):
+      output_str = "<H3> \n"
+      junk1 = "app_read_write_svr" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE, and Total CPU Utilization</a>";
+      output_str = output_str + "</H3> \n";
+   # end if
+   
+   output_str = output_str + " \n";
+   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
+   output_str = output_str + "applications that read from the server via an NFS READ request \n";
+   output_str = output_str + "or written to server via an NFS WRITE request. It also plots \n";
+   output_str = output_str + "the total CPU usage (user + system). The throughput  is plotted \n";
+   output_str = output_str + "as a function of time. \n";
+   
+   # make the plot
+   ylabel1 = "Read Throughput (MB/s) \n by apps using NFS READ";
+   ylabel2 = "Write Throughput (MB/s) \n by apps using NFS WRITE";
+   ylabel3 = "Total CPU \n Percentage \n Utilization";
+   xlabel = "Time (seconds)";
+   d1 = "NFS Client Read";
+   d2 = "NFS Client Write";
+   d3 = "Total CPU Utilization";
+   filename = dirname + "/app_read_write_svr" + str(iloop);
+   fsize = 8;
+   flegsize = 6;
+   
+   panels = [(ylabel1, d1, "rMB_svr"),
+             (ylabel2, d2, "wMB_svr"),
+             (ylabel3, d3, (x_seconds, time_sum_list))];
+   job = figure_job(filename, xlabel, panels, fsize, flegsize, combined_plots,
+                    item, fs_data_list, x_seconds, line_list);
+   
+   # HTML Output:
+   output_str = output_str + "<center> \n";
+   junk1 = "app_read_write_svr" + str(iloop) + ".png";
+   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
+   if (combined_plots == 0):
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE, and Total CPU utilization for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
+   elif (combined_plots == 1):
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE, and Total CPU utilization </strong></center><BR><BR> \n";
+   # end if
+   output_str = output_str + "<BR><BR> \n";
+   output_str = output_str + "</P> \n \n";
+   return (output_str, job);
+   
+# end def
+
+
+
+
+
+def plot3a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item,
+           fs_data_list, line_list):
+   #
+   # Figure 3a: read, write vs. time (NFS READ and NFS WRITE)
+   #   Returns (HTML fragment, figure job for render_figure())
+   #
+   if (combined_plots == 0):
+      output_str = "<H4> \n"
+      junk1 = "app_read_write_svr" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a>";
+      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
+      output_str = output_str + "</H4> \n";
+   elif (combined_plots == 1):
+      output_str = "<H3> \n"
+      junk1 = "app_read_write_svr" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a>";
+      output_str = output_str + "</H3> \n";
    # end if
-      
+   
+   output_str = output_str + " \n";
+   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
+   output_str = output_str + "applications that read from the server via an NFS READ request \n";
+   output_str = output_str + "or written to server via an NFS WRITE request. The throughput is \n";
+   output_str = output_str + "plotted as a function of time. \n";
+   
+   # make the plot
+   ylabel1 = "Read Throughput (MB/s) \n by apps using NFS READ";
+   ylabel2 = "Write Throughput (MB/s) \n by apps using NFS WRITE";
+   xlabel = "Time (seconds)";
+   d1 = "NFS Client Read";
+   d2 = "NFS Client Write";
+   filename = dirname + "/app_read_write_svr" + str(iloop);
+   fsize = 8;
+   flegsize = 6;
+   
+   panels = [(ylabel1, d1, "rMB_svr"),
+             (ylabel2, d2, "wMB_svr")];
+   job = figure_job(filename, xlabel, panels, fsize, flegsize, combined_plots,
+                    item, fs_data_list, x_seconds, line_list);
+   
    # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write_dir" + str(iloop) + ".png";
+   output_str = output_str + "<center> \n";
+   junk1 = "app_read_write_svr" + str(iloop) + ".png";
    output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
    if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT, and Total CPU utilization for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
    elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT, and Total CPU utilization </strong></center><BR><BR> \n";
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE</strong></center><BR><BR> \n";
    # end if
    output_str = output_str + "<BR><BR> \n";
    output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return (output_str, job);
    
 # end def
 
 
 
 
-def plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-           fs_data_list, line_list):
+
+
+def plot4(iloop, iplot, combined_plots, dirname, x_seconds, 
+          fsize, item, fs_data_list, line_list):
    #
-   # Figure 2a: read, write vs. time (DIRECT IO)
-   #   No iostat data
+   # Figure 4: ops, read ops, write ops vs. time
+   #   Returns (HTML fragment, figure job for render_figure())
    #
    if (combined_plots == 0):
       output_str = "<H4> \n"
-      junk1 = "app_read_write_dir" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput with O_DIRECT</a>";
+      junk1 = "app_ops" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a>";
       output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
       output_str = output_str + "</H4> \n";
    elif (combined_plots == 1):
       output_str = "<H3> \n"
-      junk1 = "app_read_write_dir" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput with O_DIRECT</a>";
+      junk1 = "app_ops" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a>";
       output_str = output_str + "</H3> \n";
    # end if
    
    output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
-   output_str = output_str + "applications that opened the file using the O_DIRECT flag. \n";
-   output_str = output_str + "The throughput is plotted as a function of time. \n";
-   f.write(output_str);
+   output_str = output_str + "<P>This figure plots the overall ops/s, read ops/ (Read IOPS), and \n";
+   output_str = output_str + "write ops/s (Write IOPS) versus time.  \n";
    
    # make the plot
-   ylabel1 = "Read Throughput (MB/s) \n by apps using O_DIRECT";
-   ylabel2 = "Write Throughput (MB/s) \n by apps using O_DIRECT";
+   ylabel1 = "Ops/s issued \n to Filesystem";
+   ylabel2 = "Read Ops/s \n to Filesystem";
+   ylabel3 = "Write Ops/s \n to Filesystem";
    xlabel = "Time (seconds)";
-   d1 = "NFS Client Read";
-   d2 = "NFS Client Write";
-   filename = dirname + "/app_read_write_dir" + str(iloop);
+   d1 = "Ops/s";
+   d2 = "Read Ops/s";
+   d3 = "Write Ops/s";
+   filename = dirname + "/app_ops" + str(iloop);
    fsize = 8;
    flegsize = 6;
    
-   if (combined_plots == 0):
-      box_expansion = 0.90; 
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      Two_Chart(x_seconds, item["rMB_dir"], x_seconds, item["wMB_dir"],
-                xlabel, ylabel1, ylabel2, d1, d2, fsize, flegsize,
-                filename, box_expansion);
-   elif (combined_plots == 1):
-      jloop = -1;
-      expansion_box = 0.88;   # default
-      
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         d11 = item["fs"] + ": \n ";
-         if (len(d11) > ilongest):
-            ilongest = len(d11);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         d22 = item["fs"] + ": \n";
-         if (len(d22) > ilongest):
-            ilongest = len(d22);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      # Top plot:
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax1 = plt.subplot(211);                 # Define top plot using subplot function
-         d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_dir"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
-         ax1.set_xticklabels([]);                # get x-axis tick label
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend
-      box = ax1.get_position()
-      ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame1 = leg1.get_frame();
-      frame1.set_facecolor("0.80");           # Make legend box have a gray background
-      for t in leg1.get_texts():
-         t.set_fontsize(flegsize);               # Change the font size of the legend text to 10 pt.
-      # end if
-      
-      # Middle Plot:
-      jloop = -1;
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax2 = plt.subplot(212);
-         d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_dir"], marker, label=d22);
-         plt.xlabel(xlabel);
-         plt.ylabel(ylabel2, fontsize=fsize);
-         ax2.set_xticklabels([]);
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend:
-      box = ax2.get_position()
-      ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame2 = leg2.get_frame();
-      frame2.set_facecolor("0.80");
-      for t in leg2.get_texts():
-         t.set_fontsize(flegsize);
-      # end for
-      
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
-      
-      # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
-   # end if
-      
+   panels = [(ylabel1, d1, "ops"),
+             (ylabel2, d2, "rops"),
+             (ylabel3, d3, "wops")];
+   job = figure_job(filename, xlabel, panels, fsize, flegsize, combined_plots,
+                    item, fs_data_list, x_seconds, line_list);
+   
    # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write_dir" + str(iloop) + ".png";
+   output_str = output_str + "<center> \n";
+   junk1 = "app_ops" + str(iloop) + ".png";
    output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
    if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Operations/s, Read ops/s, and Write ops/s for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
    elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT</strong></center><BR><BR> \n";
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Operations/s, Read ops/s, and Write ops/s </strong></center><BR><BR> \n";
    # end if
    output_str = output_str + "<BR><BR> \n";
    output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return (output_str, job);
    
 # end def
 
@@ -1046,553 +2078,1088 @@ def plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
 
 
 
-def plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-          time_sum_list, fsize, item, fs_data_list, line_list):
+
+
+
+def plot5(iloop, iplot, combined_plots, dirname, x_seconds,
+          fsize, item, fs_data_list, line_list):
    #
-   # Figure 3: read, write, total CPU vs. time (NFS READ and NFS WRITE)
+   # Figure 5: derived efficiency metrics vs. time (see derived_metrics())
+   #   Returns (HTML fragment, figure job for render_figure())
    #
    if (combined_plots == 0):
       output_str = "<H4> \n"
-      junk1 = "app_read_write_svr" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE, and Total CPU Utilization</a>";
+      junk1 = "app_derived" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Client Cache Effectiveness, Average I/O Size, and O_DIRECT Share</a>";
       output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
       output_str = output_str + "</H4> \n";
    elif (combined_plots == 1):
       output_str = "<H3> \n"
-      junk1 = "app_read_write_svr" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE, and Total CPU Utilization</a>";
+      junk1 = "app_derived" + str(iloop);
+      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Client Cache Effectiveness, Average I/O Size, and O_DIRECT Share</a>";
       output_str = output_str + "</H3> \n";
    # end if
    
    output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
-   output_str = output_str + "applications that read from the server via an NFS READ request \n";
-   output_str = output_str + "or written to server via an NFS WRITE request. It also plots \n";
-   output_str = output_str + "the total CPU usage (user + system). The throughput  is plotted \n";
-   output_str = output_str + "as a function of time. \n";
-   f.write(output_str);
+   output_str = output_str + "<P>This figure plots metrics derived from the nfsiostat columns: the \n";
+   output_str = output_str + "percentage of the data read through the page cache (read(2)) that did \n";
+   output_str = output_str + "not have to be read from the server, the average size in KB of the NFS \n";
+   output_str = output_str + "READ and NFS WRITE operations (compare to rsize and wsize), and the \n";
+   output_str = output_str + "percentage of the application throughput that used O_DIRECT. Intervals \n";
+   output_str = output_str + "without reads or writes are left blank. \n";
    
    # make the plot
-   ylabel1 = "Read Throughput (MB/s) \n by apps using NFS READ";
-   ylabel2 = "Write Throughput (MB/s) \n by apps using NFS WRITE";
-   ylabel3 = "Total CPU \n Percentage \n Utilization";
+   ylabel1 = "Read Cache \n Hit (%)";
+   ylabel2 = "Avg NFS READ \n Size (KB)";
+   ylabel3 = "Avg NFS WRITE \n Size (KB)";
+   ylabel4 = "O_DIRECT \n Share (%)";
    xlabel = "Time (seconds)";
-   d1 = "NFS Client Read";
-   d2 = "NFS Client Write";
-   d3 = "Total CPU Utilization";
-   filename = dirname + "/app_read_write_svr" + str(iloop);
+   d1 = "Cache Hit";
+   d2 = "Read Size";
+   d3 = "Write Size";
+   d4 = "O_DIRECT";
+   filename = dirname + "/app_derived" + str(iloop);
    fsize = 8;
    flegsize = 6;
    
+   panels = [(ylabel1, d1, "read_cache_hit"),
+             (ylabel2, d2, "read_size_kb"),
+             (ylabel3, d3, "write_size_kb"),
+             (ylabel4, d4, "direct_share")];
+   job = figure_job(filename, xlabel, panels, fsize, flegsize, combined_plots,
+                    item, fs_data_list, x_seconds, line_list);
+   
+   # HTML Output:
+   output_str = output_str + "<center> \n";
+   junk1 = "app_derived" + str(iloop) + ".png";
+   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
    if (combined_plots == 0):
-      box_expansion = 0.90;
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         if (len(d3) > ilongest):
-            ilongest = len(d3);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      Three_Chart(x_seconds, item["rMB_svr"], x_seconds, item["wMB_svr"],
-                  iostat_x_seconds, time_sum_list, xlabel, ylabel1, ylabel2, ylabel3,
-                  d1, d2, d3, fsize, flegsize, filename, box_expansion);
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - Cache Effectiveness, Average I/O Size, and O_DIRECT Share for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
    elif (combined_plots == 1):
-      jloop = -1;
-      expansion_box = 0.88;   # default
-      
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         d11 = item["fs"] + ": \n ";
-         if (len(d11) > ilongest):
-            ilongest = len(d11);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         d22 = item["fs"] + ": \n";
-         if (len(d22) > ilongest):
-            ilongest = len(d22);
+      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - Cache Effectiveness, Average I/O Size, and O_DIRECT Share </strong></center><BR><BR> \n";
+   # end if
+   output_str = output_str + "<BR><BR> \n";
+   output_str = output_str + "</P> \n \n";
+   return (output_str, job);
+   
+# end def
+
+
+
+
+
+
+
+
+
+# Metrics derived from FS_METRICS for every interval (see derived_metrics())
+DERIVED_METRICS = ["read_cache_hit", "read_size_kb", "write_size_kb", "direct_share"];
+
+
+def derived_ratio(numerator, denominator):
+   #
+   # numerator/denominator with NaN where the denominator is not > 0
+   #
+   with numpy.errstate(invalid="ignore", divide="ignore"):
+      ratio = numpy.true_divide(numerator, denominator);
+      ratio[~(denominator > 0)] = numpy.nan;
+   # end with
+   return ratio;
+# end def
+
+
+def derived_metrics(values):
+   #
+   # Derived efficiency metrics of every interval, vectorized over an
+   #   array of FS_METRICS on axis -2 (e.g. the (fs, metric, interval)
+   #   store). Returns the DERIVED_METRICS on axis -2:
+   #
+   #   read_cache_hit = % of the data read with read(2) (rMB_nor) that was
+   #                    not read from the server; the server reads are
+   #                    rMB_svr minus the O_DIRECT reads (which bypass the
+   #                    cache). Read-ahead can make it negative -> 0.
+   #   read_size_kb   = average NFS READ size in KB (rMB_svr/rops)
+   #   write_size_kb  = average NFS WRITE size in KB (wMB_svr/wops)
+   #   direct_share   = % of the application throughput that used O_DIRECT
+   #
+   # With sums over intervals instead of per interval values the same
+   #   formulas give the overall values (see derived_overall()).
+   #
+   values = numpy.asarray(values, dtype=numpy.float64);
+   (rMB_nor, wMB_nor, rMB_dir, wMB_dir, rMB_svr, wMB_svr, ops, rops, wops) = \
+      [values[..., j, :] for j in range(0, len(FS_METRICS))];
+   cache_hit = 100.0*(1.0 - derived_ratio(rMB_svr - rMB_dir, rMB_nor));
+   with numpy.errstate(invalid="ignore"):
+      cache_hit = numpy.clip(cache_hit, 0.0, 100.0);
+   # end with
+   read_size = 1024.0*derived_ratio(rMB_svr, rops);
+   write_size = 1024.0*derived_ratio(wMB_svr, wops);
+   direct_share = 100.0*derived_ratio(rMB_dir + wMB_dir, rMB_nor + wMB_nor + rMB_dir + wMB_dir);
+   return numpy.stack([cache_hit, read_size, write_size, direct_share], axis=-2);
+# end def
+
+
+def derived_overall(values):
+   #
+   # Overall derived metrics of every file system: derived_metrics() of
+   #   the per metric sums over all intervals (so busy intervals weigh
+   #   more than idle ones). Returns a (fs, DERIVED_METRICS) array.
+   #
+   totals = numpy.nansum(values, axis=2);
+   return derived_metrics(totals[:, :, None])[:, :, 0];
+# end def
+
+
+def derived_add(fs_data_list, store):
+   #
+   # Adds the DERIVED_METRICS series to the per file system dictionaries
+   #   of nfs_store_fs_data_list() (e.g. local_dict["read_size_kb"]) and
+   #   stores the (fs, derived metric, interval) array as store["derived"]
+   #
+   store["derived"] = derived_metrics(store["values"][0:len(store["fs_names"]), :, 0:store["count"]]);
+   for fs_id in range(0, len(fs_data_list)):
+      for j in range(0, len(DERIVED_METRICS)):
+         fs_data_list[fs_id][DERIVED_METRICS[j]] = store["derived"][fs_id, j];
+      # end for
+   # end for
+# end def
+
+
+def derived_summary(summary, store):
+   #
+   # Adds the statistics (SUMMARY_STATS plus "overall", see
+   #   derived_overall()) of the DERIVED_METRICS to every file system of a
+   #   fs_summary() dictionary
+   #
+   values = store["values"][0:len(store["fs_names"]), :, 0:store["count"]];
+   derived = store["derived"];
+   overall = derived_overall(values);
+   with warnings.catch_warnings():
+      warnings.simplefilter("ignore", RuntimeWarning);
+      stats = {};
+      stats["min"] = numpy.nanmin(derived, axis=2);
+      stats["mean"] = numpy.nanmean(derived, axis=2);
+      (stats["p50"], stats["p95"], stats["p99"]) = numpy.nanpercentile(derived, [50, 95, 99], axis=2);
+      stats["max"] = numpy.nanmax(derived, axis=2);
+   # end with
+   summary["derived_metrics"] = DERIVED_METRICS;
+   for fs_id in range(0, len(summary["file_systems"])):
+      local_dict = summary["file_systems"][fs_id];
+      local_dict["derived"] = {};
+      for j in range(0, len(DERIVED_METRICS)):
+         junk1 = dict([(stat, json_number(stats[stat][fs_id, j])) for stat in SUMMARY_STATS]);
+         junk1["overall"] = json_number(overall[fs_id, j]);
+         local_dict["derived"][DERIVED_METRICS[j]] = junk1;
+      # end for
+   # end for
+# end def
+
+
+def derived_html(summary, combined_plots):
+   #
+   # HTML fragment with the sortable table of the overall derived
+   #   metrics of every file system (see derived_summary())
+   #
+   output_str = "<P>Efficiency of every filesystem over the whole run: read cache hit (% of \n";
+   output_str = output_str + "read(2) data not read from the server), average NFS READ and NFS WRITE \n";
+   output_str = output_str + "size in KB (overall and 95th percentile of the intervals) and the O_DIRECT \n";
+   output_str = output_str + "share (% of the application throughput). \n";
+   output_str = output_str + "<BR><BR> \n";
+   output_str = output_str + "<TABLE BORDER=1 CELLPADDING=3> \n";
+   columns = [("read_cache_hit", "overall", "read cache hit %"),
+              ("read_size_kb", "overall", "read KB"),
+              ("read_size_kb", "p95", "read KB p95"),
+              ("write_size_kb", "overall", "write KB"),
+              ("write_size_kb", "p95", "write KB p95"),
+              ("direct_share", "overall", "O_DIRECT %")];
+   output_str = output_str + "<TR><TH onclick=\"sort_table(this, 0)\">Filesystem</TH>";
+   for icol in range(0, len(columns)):
+      output_str = output_str + "<TH onclick=\"sort_table(this, " + str(icol+1) + ")\">" + columns[icol][2] + "</TH>";
+   # end for
+   output_str = output_str + "</TR> \n";
+   rows = [];
+   iloop = -1;
+   for local_dict in summary["file_systems"]:
+      iloop = iloop + 1;
+      if (combined_plots == 0):
+         junk1 = "<a href=\"#app_derived" + str(iloop) + "\">" + local_dict["fs"] + "</a>";
+      else:
+         junk1 = local_dict["fs"];
+      # end if
+      row = "<TR><TD>" + junk1 + "</TD>";
+      for (metric, stat, junk1) in columns:
+         value = local_dict["derived"][metric][stat];
+         if (value == None):
+            row = row + "<TD data-v=\"-1\">-</TD>";
+         else:
+            row = row + "<TD data-v=\"%g\">%.1f</TD>" % (value, value);
          # end if
-         if (len(d3) > ilongest):
-            ilongest = len(d3);
+      # end for
+      rows.append(row + "</TR> \n");
+   # end for
+   output_str = output_str + "".join(rows);
+   output_str = output_str + "</TABLE> \n";
+   output_str = output_str + "</P> \n \n";
+   return output_str;
+# end def
+
+
+
+
+
+
+
+
+
+# Statistics in the summary (percentiles are of the per-interval values)
+SUMMARY_STATS = ["min", "mean", "p50", "p95", "p99", "max"];
+
+# Metrics shown in the summary table of the report (all FS_METRICS are in
+#   summary.json)
+SUMMARY_TABLE_METRICS = ["rMB_svr", "wMB_svr", "ops"];
+
+
+def json_number(value):
+   #
+   # float for JSON output; NaN (no data) becomes None (null)
+   #
+   if numpy.isnan(value):
+      return None;
+   # end if
+   return float(value);
+# end def
+
+
+def fs_summary(store, x_seconds, time_labels, busiest_n):
+   #
+   # Vectorized statistics over the store: every statistic is computed for
+   #   all file systems and metrics at once along the interval axis of
+   #   store["values"] (fs, metric, interval). NaN (file system not
+   #   present in an interval) is ignored.
+   #
+   # The busiest intervals of a file system are the busiest_n intervals
+   #   with the highest NFS throughput (rMB_svr + wMB_svr).
+   #
+   # time_labels = "date time meridian" string of every interval
+   # Returns a dictionary that can be written with json.dump()
+   #
+   values = store["values"][0:len(store["fs_names"]), :, 0:store["count"]];
+   
+   # All-NaN rows (a metric of a mount never seen) give RuntimeWarnings
+   with warnings.catch_warnings():
+      warnings.simplefilter("ignore", RuntimeWarning);
+      stats = {};
+      stats["min"] = numpy.nanmin(values, axis=2);
+      stats["mean"] = numpy.nanmean(values, axis=2);
+      (stats["p50"], stats["p95"], stats["p99"]) = numpy.nanpercentile(values, [50, 95, 99], axis=2);
+      stats["max"] = numpy.nanmax(values, axis=2);
+   # end with
+   intervals = numpy.sum(~numpy.isnan(values[:, 0, :]), axis=1);
+   
+   # Busiest intervals: NaN sorts last
+   busy = values[:, FS_METRICS.index("rMB_svr"), :] + values[:, FS_METRICS.index("wMB_svr"), :];
+   busy = numpy.where(numpy.isnan(busy), -numpy.inf, busy);
+   busiest = numpy.argsort(-busy, axis=1, kind="mergesort")[:, 0:busiest_n];
+   
+   summary = {"metrics": FS_METRICS, "stats": SUMMARY_STATS, "busiest_n": busiest_n,
+              "intervals": int(values.shape[2]), "file_systems": []};
+   for fs_id in range(0, values.shape[0]):
+      local_dict = {};
+      local_dict["fs"] = store["fs_names"][fs_id];
+      local_dict["intervals"] = int(intervals[fs_id]);
+      local_dict["stats"] = {};
+      for j in range(0, len(FS_METRICS)):
+         local_dict["stats"][FS_METRICS[j]] = dict([(junk1, json_number(stats[junk1][fs_id, j]))
+                                                   for junk1 in SUMMARY_STATS]);
+      # end for
+      local_dict["busiest"] = [];
+      for interval in busiest[fs_id]:
+         if numpy.isinf(busy[fs_id, interval]):
+            break;
          # end if
+         local_dict["busiest"].append({"interval": int(interval),
+                                       "seconds": float(x_seconds[interval]),
+                                       "time": time_labels[interval],
+                                       "MB_svr": float(busy[fs_id, interval]),
+                                       "ops": json_number(values[fs_id, FS_METRICS.index("ops"), interval])});
       # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      # Top plot:
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax1 = plt.subplot(311);                 # Define top plot using subplot function
-         d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_svr"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
-         ax1.set_xticklabels([]);                # get x-axis tick label
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+      summary["file_systems"].append(local_dict);
+   # end for
+   return summary;
+# end def
+
+
+def summary_html(summary, combined_plots):
+   #
+   # HTML fragment with the summary tables: one row per file system with
+   #   the mean/p95/p99/max of SUMMARY_TABLE_METRICS, and the busiest
+   #   intervals over all file systems. Clicking a column header sorts
+   #   the table by that column.
+   #
+   stats = ["mean", "p95", "p99", "max"];
+   output_str = "<script> \n";
+   output_str = output_str + "function sort_table(th, col) { \n";
+   output_str = output_str + "   var table = th.parentNode.parentNode; \n";
+   output_str = output_str + "   var rows = Array.prototype.slice.call(table.rows, 1); \n";
+   output_str = output_str + "   var dir = (th.getAttribute('data-dir') == 'd') ? 1 : -1; \n";
+   output_str = output_str + "   th.setAttribute('data-dir', (dir == 1) ? 'a' : 'd'); \n";
+   output_str = output_str + "   rows.sort(function(a, b) { \n";
+   output_str = output_str + "      var x = a.cells[col].getAttribute('data-v'), y = b.cells[col].getAttribute('data-v'); \n";
+   output_str = output_str + "      if (x === null) { x = a.cells[col].textContent; y = b.cells[col].textContent; } \n";
+   output_str = output_str + "      else { x = parseFloat(x); y = parseFloat(y); } \n";
+   output_str = output_str + "      return (x < y) ? -dir : ((x > y) ? dir : 0); }); \n";
+   output_str = output_str + "   for (var i = 0; i < rows.length; i++) { table.appendChild(rows[i]); } \n";
+   output_str = output_str + "} \n";
+   output_str = output_str + "</script> \n";
+   
+   output_str = output_str + "<H3> \n";
+   output_str = output_str + "<a id=\"summary\">Summary</a> \n";
+   output_str = output_str + "</H3> \n \n";
+   output_str = output_str + "<P>Statistics of every filesystem over the " + str(summary["intervals"]) + " intervals \n";
+   output_str = output_str + "(throughput in MB/s, operations per second). Click a column header to \n";
+   output_str = output_str + "sort the table. The full statistics of all metrics are in summary.json. \n";
+   output_str = output_str + "<BR><BR> \n";
+   output_str = output_str + "<TABLE BORDER=1 CELLPADDING=3> \n";
+   output_str = output_str + "<TR><TH onclick=\"sort_table(this, 0)\">Filesystem</TH>";
+   output_str = output_str + "<TH onclick=\"sort_table(this, 1)\">intervals</TH>";
+   icol = 1;
+   for metric in SUMMARY_TABLE_METRICS:
+      for stat in stats:
+         icol = icol + 1;
+         output_str = output_str + "<TH onclick=\"sort_table(this, " + str(icol) + ")\">" + metric + " " + stat + "</TH>";
       # end for
-      plt.grid();
-      # Legend
-      box = ax1.get_position()
-      ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame1 = leg1.get_frame();
-      frame1.set_facecolor("0.80");           # Make legend box have a gray background
-      for t in leg1.get_texts():
-         t.set_fontsize(flegsize);               # Change the font size of the legend text to 10 pt.
+   # end for
+   output_str = output_str + "</TR> \n";
+   
+   rows = [];
+   iloop = -1;
+   for local_dict in summary["file_systems"]:
+      iloop = iloop + 1;
+      if (combined_plots == 0):
+         junk1 = "<a href=\"#app_read_write_svr" + str(iloop) + "\">" + local_dict["fs"] + "</a>";
+      else:
+         junk1 = local_dict["fs"];
       # end if
-      
-      # Middle Plot:
-      jloop = -1;
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax2 = plt.subplot(312);
-         d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_svr"], marker, label=d22);
-         plt.xlabel(" ");
-         plt.ylabel(ylabel2, fontsize=fsize);
-         ax2.set_xticklabels([]);
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend:
-      box = ax2.get_position()
-      ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame2 = leg2.get_frame();
-      frame2.set_facecolor("0.80");
-      for t in leg2.get_texts():
-         t.set_fontsize(flegsize);
+      row = "<TR><TD>" + junk1 + "</TD>";
+      row = row + "<TD data-v=\"" + str(local_dict["intervals"]) + "\">" + str(local_dict["intervals"]) + "</TD>";
+      for metric in SUMMARY_TABLE_METRICS:
+         for stat in stats:
+            value = local_dict["stats"][metric][stat];
+            if (value == None):
+               row = row + "<TD data-v=\"-1\">-</TD>";
+            else:
+               row = row + "<TD data-v=\"%g\">%.2f</TD>" % (value, value);
+            # end if
+         # end for
       # end for
-      
-      # Bottom plot
-      ax3 = plt.subplot(313);
-      plt.plot(iostat_x_seconds, time_sum_list, "go-", label=d3);
-      plt.grid();
-      plt.xlabel(xlabel);
-      plt.ylabel(ylabel3, fontsize=fsize);
-      
-      # Legend
-      box = ax3.get_position()
-      ax3.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame3 = leg3.get_frame();
-      frame3.set_facecolor("0.80");
-      for t in leg3.get_texts():
-         t.set_fontsize(flegsize);
+      rows.append(row + "</TR> \n");
+   # end for
+   output_str = output_str + "".join(rows);
+   output_str = output_str + "</TABLE> \n";
+   output_str = output_str + "</P> \n \n";
+   
+   # Busiest intervals over all file systems
+   busiest = [];
+   for local_dict in summary["file_systems"]:
+      for interval_dict in local_dict["busiest"]:
+         busiest.append((interval_dict["MB_svr"], local_dict["fs"], interval_dict));
       # end for
-      
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
-      
-      # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
+   # end for
+   busiest.sort(key=lambda junk1: -junk1[0]);
+   busiest = busiest[0:summary["busiest_n"]];
+   output_str = output_str + "<P>The " + str(len(busiest)) + " busiest intervals (highest NFS read + write \n";
+   output_str = output_str + "throughput, rMB_svr + wMB_svr) over all filesystems. \n";
+   output_str = output_str + "<BR><BR> \n";
+   output_str = output_str + "<TABLE BORDER=1 CELLPADDING=3> \n";
+   output_str = output_str + "<TR><TH onclick=\"sort_table(this, 0)\">Filesystem</TH>";
+   output_str = output_str + "<TH onclick=\"sort_table(this, 1)\">Time</TH>";
+   output_str = output_str + "<TH onclick=\"sort_table(this, 2)\">Seconds</TH>";
+   output_str = output_str + "<TH onclick=\"sort_table(this, 3)\">MB/s (rMB_svr + wMB_svr)</TH>";
+   output_str = output_str + "<TH onclick=\"sort_table(this, 4)\">ops/s</TH></TR> \n";
+   rows = [];
+   for (junk1, fs, interval_dict) in busiest:
+      row = "<TR><TD>" + fs + "</TD><TD>" + interval_dict["time"] + "</TD>";
+      row = row + "<TD data-v=\"%g\">%g</TD>" % (interval_dict["seconds"], interval_dict["seconds"]);
+      row = row + "<TD data-v=\"%g\">%.2f</TD>" % (interval_dict["MB_svr"], interval_dict["MB_svr"]);
+      if (interval_dict["ops"] == None):
+         row = row + "<TD data-v=\"-1\">-</TD>";
       else:
-         plt.savefig(filename);
-         plt.close();
+         row = row + "<TD data-v=\"%g\">%.2f</TD>" % (interval_dict["ops"], interval_dict["ops"]);
       # end if
-   # end if
-      
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write_svr" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE, and Total CPU utilization for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE, and Total CPU utilization </strong></center><BR><BR> \n";
-   # end if
-   output_str = output_str + "<BR><BR> \n";
+      rows.append(row + "</TR> \n");
+   # end for
+   output_str = output_str + "".join(rows);
+   output_str = output_str + "</TABLE> \n";
    output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return output_str;
 # end def
 
 
 
 
 
-def plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-           fs_data_list, line_list):
+
+
+
+
+# Metrics checked for bursts, and the figure (anchor) that shows them
+ANOMALY_METRICS = [("ops", "app_ops"),
+                   ("rMB_svr", "app_read_write_svr"),
+                   ("wMB_svr", "app_read_write_svr")];
+
+
+def rolling_baseline(y, window, block=65536):
    #
-   # Figure 3a: read, write vs. time (NFS READ and NFS WRITE)
+   # Rolling median and MAD (median absolute deviation) of the "window"
+   #   intervals before every interval (not including it). The windows
+   #   are strided views of the series, processed "block" intervals at a
+   #   time so memory stays bounded for long captures. NaN where fewer
+   #   than a quarter of the window (at least 5 intervals) have data, so
+   #   the start of a capture or of a mount is not compared to noise.
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_read_write_svr" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_read_write_svr" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a>";
-      output_str = output_str + "</H3> \n";
-   # end if
-   
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
-   output_str = output_str + "applications that read from the server via an NFS READ request \n";
-   output_str = output_str + "or written to server via an NFS WRITE request. The throughput is \n";
-   output_str = output_str + "plotted as a function of time. \n";
-   f.write(output_str);
-   
-   # make the plot
-   ylabel1 = "Read Throughput (MB/s) \n by apps using NFS READ";
-   ylabel2 = "Write Throughput (MB/s) \n by apps using NFS WRITE";
-   xlabel = "Time (seconds)";
-   d1 = "NFS Client Read";
-   d2 = "NFS Client Write";
-   filename = dirname + "/app_read_write_svr" + str(iloop);
-   fsize = 8;
-   flegsize = 6;
-   
-   if (combined_plots == 0):
-      box_expansion = 0.90;
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
+   # Returns (median, mad) as float64 arrays of len(y)
+   #
+   y = numpy.asarray(y, dtype=numpy.float64);
+   n = len(y);
+   padded = numpy.empty(window + n);
+   padded[0:window] = numpy.nan;
+   padded[window:] = y;
+   stride = padded.strides[0];
+   median = numpy.empty(n);
+   mad = numpy.empty(n);
+   with warnings.catch_warnings():
+      warnings.simplefilter("ignore", RuntimeWarning);
+      for i0 in range(0, n, block):
+         i1 = min(i0 + block, n);
+         # windows[k] = y[i0+k-window : i0+k]
+         windows = as_strided(padded[i0:], shape=(i1 - i0, window), strides=(stride, stride));
+         history = numpy.sum(~numpy.isnan(windows), axis=1);
+         if numpy.all(history == window):
+            # numpy.median (partition based) is much faster than nanmedian
+            median[i0:i1] = numpy.median(windows, axis=1);
+            mad[i0:i1] = numpy.median(numpy.abs(windows - median[i0:i1, None]), axis=1);
+         else:
+            median[i0:i1] = numpy.nanmedian(windows, axis=1);
+            mad[i0:i1] = numpy.nanmedian(numpy.abs(windows - median[i0:i1, None]), axis=1);
+            median[i0:i1][history < max(5, window // 4)] = numpy.nan;
          # end if
       # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      Two_Chart(x_seconds, item["rMB_svr"], x_seconds, item["wMB_svr"], xlabel,
-                ylabel1, ylabel2, d1, d2,  fsize, flegsize, filename, box_expansion);
-   elif (combined_plots == 1):
-      jloop = -1;
-      expansion_box = 0.88;   # default
-      
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         d11 = item["fs"] + ": \n ";
-         if (len(d11) > ilongest):
-            ilongest = len(d11);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
+   # end with
+   return (median, mad);
+# end def
+
+
+def detect_anomalies(store, x_seconds, time_labels, window, threshold):
+   #
+   # Burst detection: robust z-score of every interval against the
+   #   rolling median/MAD of the previous "window" intervals (see
+   #   rolling_baseline()), for the ANOMALY_METRICS of every file system.
+   #   Intervals with z > threshold are flagged and consecutive flagged
+   #   intervals form one event. The MAD is floored at 1% of the series'
+   #   99th percentile so flat, nearly idle series do not flag noise.
+   #
+   # Returns a list of event dictionaries, highest z first
+   #
+   values = store["values"][0:len(store["fs_names"]), :, 0:store["count"]];
+   events = [];
+   for fs_id in range(0, values.shape[0]):
+      for (metric, anchor) in ANOMALY_METRICS:
+         y = values[fs_id, FS_METRICS.index(metric)];
+         finite = y[~numpy.isnan(y)];
+         if (len(finite) == 0):
+            continue;
          # end if
-         d22 = item["fs"] + ": \n";
-         if (len(d22) > ilongest):
-            ilongest = len(d22);
+         (median, mad) = rolling_baseline(y, window);
+         scale = numpy.maximum(1.4826*mad, 0.01*numpy.percentile(finite, 99) + 1.0e-9);
+         with numpy.errstate(invalid="ignore"):
+            z = (y - median)/scale;
+            flagged = numpy.flatnonzero(z > threshold);
+         # end with
+         if (len(flagged) == 0):
+            continue;
          # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      # Top plot:
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax1 = plt.subplot(211);                 # Define top plot using subplot function
-         d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_svr"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
-         ax1.set_xticklabels([]);                # get x-axis tick label
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend
-      box = ax1.get_position()
-      ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame1 = leg1.get_frame();
-      frame1.set_facecolor("0.80");           # Make legend box have a gray background
-      for t in leg1.get_texts():
-         t.set_fontsize(flegsize);               # Change the font size of the legend text to 10 pt.
-      # end if
-      
-      # Middle Plot:
-      jloop = -1;
-      for item in fs_data_list:
-         jloop = jloop + 1;
          
-         marker = line_list[jloop];
-         ax2 = plt.subplot(212);
-         d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_svr"], marker, label=d22);
-         plt.xlabel(xlabel);
-         plt.ylabel(ylabel2, fontsize=fsize);
-         ax2.set_xticklabels([]);
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend:
-      box = ax2.get_position()
-      ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame2 = leg2.get_frame();
-      frame2.set_facecolor("0.80");
-      for t in leg2.get_texts():
-         t.set_fontsize(flegsize);
+         # Runs of consecutive flagged intervals
+         breaks = numpy.flatnonzero(numpy.diff(flagged) > 1);
+         starts = flagged[numpy.concatenate(([0], breaks + 1))];
+         ends = flagged[numpy.concatenate((breaks, [len(flagged) - 1]))];
+         for (istart, iend) in zip(starts, ends):
+            ipeak = istart + numpy.nanargmax(z[istart:iend+1]);
+            events.append({"fs": store["fs_names"][fs_id], "fs_id": fs_id,
+                           "metric": metric, "figure": anchor,
+                           "start": int(istart), "end": int(iend),
+                           "time": time_labels[istart],
+                           "seconds": float(x_seconds[istart]),
+                           "intervals": int(iend - istart + 1),
+                           "peak": float(y[ipeak]),
+                           "baseline": float(median[ipeak]),
+                           "z": float(z[ipeak])});
+         # end for
       # end for
-      
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
-      
-      # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+   # end for
+   events.sort(key=lambda event: -event["z"]);
+   return events;
+# end def
+
+
+def anomalies_html(events, combined_plots, window, threshold, max_rows=100):
+   #
+   # HTML fragment listing the bursts found by detect_anomalies() with
+   #   links to the figure of the metric (sortable like the summary
+   #   tables; at most max_rows rows, all events are in summary.json).
+   #
+   output_str = "<H3> \n";
+   output_str = output_str + "<a id=\"anomalies\">Bursts and Anomalies</a> \n";
+   output_str = output_str + "</H3> \n \n";
+   output_str = output_str + "<P>Intervals where ops/s, rMB_svr or wMB_svr jump far above the recent \n";
+   output_str = output_str + "behaviour of the filesystem: the robust z-score (value minus the median of \n";
+   output_str = output_str + "the previous " + str(window) + " intervals, divided by their scaled median absolute \n";
+   output_str = output_str + "deviation) is above " + str(threshold) + ". Consecutive intervals are listed as one burst. \n";
+   if (len(events) == 0):
+      output_str = output_str + "No bursts were found. \n";
+      output_str = output_str + "</P> \n \n";
+      return output_str;
    # end if
-      
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write_svr" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE</strong></center><BR><BR> \n";
+   if (len(events) > max_rows):
+      output_str = output_str + "The " + str(max_rows) + " strongest of " + str(len(events)) + " bursts are listed. \n";
    # end if
    output_str = output_str + "<BR><BR> \n";
+   output_str = output_str + "<TABLE BORDER=1 CELLPADDING=3> \n";
+   output_str = output_str + "<TR>";
+   icol = -1;
+   for junk1 in ["Filesystem", "Metric", "Start", "Seconds", "Intervals", "Peak", "Baseline (median)", "z"]:
+      icol = icol + 1;
+      output_str = output_str + "<TH onclick=\"sort_table(this, " + str(icol) + ")\">" + junk1 + "</TH>";
+   # end for
+   output_str = output_str + "</TR> \n";
+   rows = [];
+   for event in events[0:max_rows]:
+      if (combined_plots == 0):
+         junk1 = event["figure"] + str(event["fs_id"]);
+      else:
+         junk1 = event["figure"] + "1";
+      # end if
+      row = "<TR><TD>" + event["fs"] + "</TD>";
+      row = row + "<TD><a href=\"#" + junk1 + "\">" + event["metric"] + "</a></TD>";
+      row = row + "<TD>" + event["time"] + "</TD>";
+      for junk1 in ["seconds", "intervals"]:
+         row = row + "<TD data-v=\"%g\">%g</TD>" % (event[junk1], event[junk1]);
+      # end for
+      for junk1 in ["peak", "baseline", "z"]:
+         row = row + "<TD data-v=\"%g\">%.2f</TD>" % (event[junk1], event[junk1]);
+      # end for
+      rows.append(row + "</TR> \n");
+   # end for
+   output_str = output_str + "".join(rows);
+   output_str = output_str + "</TABLE> \n";
    output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return output_str;
 # end def
 
 
 
 
+# Figures of the interactive report: (anchor, title, panels) with panels
+#   of (y-axis label, metric); "cpu" is the aligned total CPU utilization
+INTERACTIVE_FIGURES = [
+   ("app_read_write", "Application Read and Write Throughput",
+    [("Read MB/s via read(2)", "rMB_nor"), ("Write MB/s via write(2)", "wMB_nor"),
+     ("Total CPU %", "cpu")]),
+   ("app_read_write_dir", "Application Read and Write Throughput with O_DIRECT",
+    [("Read MB/s O_DIRECT", "rMB_dir"), ("Write MB/s O_DIRECT", "wMB_dir"),
+     ("Total CPU %", "cpu")]),
+   ("app_read_write_svr", "Application Read and Write using NFS_READ and NFS_WRITE",
+    [("Read MB/s NFS READ", "rMB_svr"), ("Write MB/s NFS WRITE", "wMB_svr"),
+     ("Total CPU %", "cpu")]),
+   ("app_ops", "Application Operations/s, Read ops/s, and Write Ops/s",
+    [("Ops/s", "ops"), ("Read Ops/s", "rops"), ("Write Ops/s", "wops")]),
+   ("app_derived", "Client Cache Effectiveness, Average I/O Size, and O_DIRECT Share",
+    [("Read cache hit %", "read_cache_hit"), ("Avg READ size KB", "read_size_kb"),
+     ("Avg WRITE size KB", "write_size_kb"), ("O_DIRECT share %", "direct_share")])];
 
+# HTML colors of the matplotlib color letters used in line_list
+HTML_COLORS = {"b": "#0000ff", "g": "#008000", "r": "#ff0000", "c": "#00bfbf",
+               "m": "#bf00bf", "y": "#bfbf00", "k": "#000000"};
 
-def plot4(iloop, iplot, combined_plots, f, dirname, x_seconds, 
-          fsize, item, fs_data_list, line_list):
+# Samples per full resolution chunk in the interactive report
+INTERACTIVE_CHUNK = 16384;
+
+# Chart width in pixels in the interactive report; the overview of every
+#   line has two samples (min and max) per pixel column
+INTERACTIVE_WIDTH = 900;
+
+
+def interactive_charts(combined_plots, fs_data_list, cpu_time_sum_list, line_list):
    #
-   # Figure 4: ops, read ops, write ops vs. time
+   # Lists the charts of the interactive report, the same figures as the
+   #   PNG report (one set per file system, or one set with every file
+   #   system if combined_plots == 1). The CPU panels are only included
+   #   when cpu_time_sum_list is not None.
    #
+   # Returns a list of (anchor, title, panels) where panels is a list of
+   #   (y-axis label, lines) and lines a list of (label, color, y data)
+   #
+   charts = [];
    if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_ops" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_ops" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a>";
-      output_str = output_str + "</H3> \n";
+      item_lists = [[item] for item in fs_data_list];
+      anchor_ids = range(0, len(fs_data_list));
+   else:
+      item_lists = [fs_data_list];
+      anchor_ids = [1];
    # end if
-   
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the overall ops/s, read ops/ (Read IOPS), and \n";
-   output_str = output_str + "write ops/s (Write IOPS) versus time.  \n";
-   f.write(output_str);
-   
-   # make the plot
-   ylabel1 = "Ops/s issued \n to Filesystem";
-   ylabel2 = "Read Ops/s \n to Filesystem";
-   ylabel3 = "Write Ops/s \n to Filesystem";
-   xlabel = "Time (seconds)";
-   d1 = "Ops/s";
-   d2 = "Read Ops/s";
-   d3 = "Write Ops/s";
-   filename = dirname + "/app_ops" + str(iloop);
-   fsize = 8;
-   flegsize = 6;
-   
-   if (combined_plots == 0):
-      box_expansion = 0.90;
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         if (len(d3) > ilongest):
-            ilongest = len(d3);
-         # end if
-      # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      # HTML Output: (Figure html)
-      Three_Chart(x_seconds, item["ops"], x_seconds, item["rops"],
-                  x_seconds, item["wops"], xlabel, ylabel1, ylabel2, ylabel3,
-                  d1, d2, d3, fsize, flegsize, filename, box_expansion);
-   elif (combined_plots == 1):
-      jloop = -1;
-      expansion_box = 0.88;   # default
-      
-      # Compute expansion_box factor:
-      ilongest = 0;
-      for item in fs_data_list:
-         if (len(d1) > ilongest):
-            ilongest = len(d1);
-         # end if
-         d11 = item["fs"] + ": \n ";
-         if (len(d11) > ilongest):
-            ilongest = len(d11);
-         # end if
-         if (len(d2) > ilongest):
-            ilongest = len(d2);
-         # end if
-         d22 = item["fs"] + ": \n";
-         if (len(d22) > ilongest):
-            ilongest = len(d22);
-         # end if
-         if (len(d3) > ilongest):
-            ilongest = len(d3);
-         # end if
-         d33 = item["fs"] + ": \n";
-         if (len(d33) > ilongest):
-            ilongest = len(d33);
+   for iloop in range(0, len(item_lists)):
+      for (anchor, title, figure_panels) in INTERACTIVE_FIGURES:
+         panels = [];
+         for (ylabel, metric) in figure_panels:
+            if (metric == "cpu"):
+               if (cpu_time_sum_list is None):
+                  continue;
+               # end if
+               lines = [("Total CPU Utilization", HTML_COLORS["g"], cpu_time_sum_list)];
+            elif (combined_plots == 0):
+               junk1 = ["r", "b", "g", "m"][len(panels)];
+               lines = [(ylabel, HTML_COLORS[junk1], item_lists[iloop][0][metric])];
+            else:
+               lines = [];
+               for jloop in range(0, len(fs_data_list)):
+                  junk1 = line_list[jloop % len(line_list)][0];
+                  lines.append( (fs_data_list[jloop]["fs"], HTML_COLORS[junk1], fs_data_list[jloop][metric]) );
+               # end for
+            # end if
+            panels.append( (ylabel, lines) );
+         # end for
+         if (combined_plots == 0):
+            junk1 = title + ". Filesystem: " + item_lists[iloop][0]["fs"];
+         else:
+            junk1 = title;
          # end if
+         charts.append( (anchor + str(anchor_ids[iloop]), junk1, panels) );
       # end for
-      junk1 = -0.0082702674*ilongest + 1.0538027948;
-      expansion_box = round(junk1,2);
-      
-      # Top plot:
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax1 = plt.subplot(311);                 # Define top plot using subplot function
-         d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["ops"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
-         ax1.set_xticklabels([]);                # get x-axis tick label
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+   # end for
+   return charts;
+# end def
+
+
+def base64_array(values, dtype):
+   #
+   # Little endian binary of a numpy array as a base64 string
+   #
+   junk1 = base64.b64encode(numpy.ascontiguousarray(values, dtype=dtype).tobytes());
+   return junk1.decode("ascii");
+# end def
+
+
+def interactive_html(x_seconds, charts, max_points):
+   #
+   # HTML fragment with the charts drawn in the browser on <canvas>
+   #   elements, so no PNG files are needed and the report is one file
+   #   that works offline. The data is embedded as JSON with base64
+   #   float arrays: x is float64, y float32 (NaN = no data), cut in
+   #   chunks of INTERACTIVE_CHUNK samples that are only decoded when a
+   #   zoomed view needs them, plus a decimate_minmax() overview of every
+   #   line (max_points samples) for views with too many samples.
+   #   A y array that is in several lines (the CPU utilization is in
+   #   three panels of every file system) is embedded once and the lines
+   #   refer to it.
+   #
+   # Drag to zoom, mouse wheel to zoom in or out, double click to reset.
+   #   All charts share the time axis.
+   #
+   n = len(x_seconds);
+   data = {};
+   data["n"] = n;
+   data["chunk"] = INTERACTIVE_CHUNK;
+   data["raw_limit"] = 1000000;
+   data["width"] = INTERACTIVE_WIDTH;
+   data["x"] = [base64_array(x_seconds[i:i+INTERACTIVE_CHUNK], '<f8')
+                for i in range(0, n, INTERACTIVE_CHUNK)];
+   if (n > 0):
+      data["x0"] = float(x_seconds[0]);
+      data["x1"] = float(x_seconds[-1]);
+   else:
+      data["x0"] = 0.0;
+      data["x1"] = 1.0;
+   # end if
+   data["series"] = [];
+   data["charts"] = [];
+   series_ids = {};           # id() of a y array -> index in data["series"]
+   for (anchor, title, panels) in charts:
+      chart = [];
+      for (ylabel, lines) in panels:
+         panel = {"ylabel": ylabel, "lines": []};
+         for (label, color, y) in lines:
+            if (id(y) not in series_ids):
+               (ox, oy) = decimate_minmax(x_seconds, y, max_points);
+               data["series"].append({"ox": base64_array(ox, '<f8'), "oy": base64_array(oy, '<f4'),
+                                      "y": [base64_array(y[i:i+INTERACTIVE_CHUNK], '<f4')
+                                            for i in range(0, n, INTERACTIVE_CHUNK)]});
+               series_ids[id(y)] = len(data["series"]) - 1;
+            # end if
+            panel["lines"].append({"label": label, "color": color, "s": series_ids[id(y)]});
+         # end for
+         chart.append(panel);
       # end for
-      plt.grid();
-      # Legend
-      box = ax1.get_position()
-      ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame1 = leg1.get_frame();
-      frame1.set_facecolor("0.80");           # Make legend box have a gray background
-      for t in leg1.get_texts():
-         t.set_fontsize(flegsize);               # Change the font size of the legend text to 10 pt.
+      data["charts"].append(chart);
+   # end for
+   
+   output_str = "<P>The figures below are interactive: drag across a chart to zoom in, \n";
+   output_str = output_str + "use the mouse wheel to zoom in and out, and double click to show the \n";
+   output_str = output_str + "whole run. All charts share the time axis (seconds). </P> \n \n";
+   parts = [output_str];
+   ichart = -1;
+   for (anchor, title, panels) in charts:
+      ichart = ichart + 1;
+      output_str = "<HR> \n";
+      output_str = output_str + "<H4> \n";
+      output_str = output_str + str(ichart+1) + ". <a id=\"" + anchor + "\">" + title + "</a> \n";
+      output_str = output_str + "</H4> \n";
+      output_str = output_str + "<div id=\"nfs_chart_" + str(ichart) + "\"></div> \n";
+      parts.append(output_str);
+   # end for
+   parts.append("<script type=\"application/json\" id=\"nfs_data\">");
+   parts.append(json.dumps(data).replace("</", "<\\/"));
+   parts.append("</script> \n");
+   parts.append("<script> \n" + INTERACTIVE_JS + "</script> \n");
+   return "".join(parts);
+# end def
+
+
+# Chart drawing code of the interactive report (see interactive_html())
+INTERACTIVE_JS = """
+(function() {
+var D = JSON.parse(document.getElementById("nfs_data").textContent);
+var W = D.width, H = 170, ML = 70, MR = 220, MT = 8, MB = 28;
+var view = [D.x0, D.x1], panels = [], xcache = {};
+
+function decode(b, type) {
+   var s = atob(b), u = new Uint8Array(s.length);
+   for (var i = 0; i < s.length; i++) { u[i] = s.charCodeAt(i); }
+   return new type(u.buffer);
+}
+function xchunk(c) {
+   if (!(c in xcache)) { xcache[c] = decode(D.x[c], Float64Array); }
+   return xcache[c];
+}
+function ychunk(s, c) {
+   if (!s.cache) { s.cache = {}; }
+   if (!(c in s.cache)) { s.cache[c] = decode(s.y[c], Float32Array); }
+   return s.cache[c];
+}
+function xat(i) { var c = Math.floor(i / D.chunk); return xchunk(c)[i - c*D.chunk]; }
+function lower(v) {
+   var lo = 0, hi = D.n;
+   while (lo < hi) { var m = (lo + hi) >> 1; if (xat(m) < v) { lo = m + 1; } else { hi = m; } }
+   return lo;
+}
+function points(s, i0, i1) {
+   var xs = [], ys = [], i;
+   if (i1 - i0 > D.raw_limit) {
+      if (!s.ovx) { s.ovx = decode(s.ox, Float64Array); s.ovy = decode(s.oy, Float32Array); }
+      for (i = 0; i < s.ovx.length; i++) {
+         if ((s.ovx[i] >= view[0]) && (s.ovx[i] <= view[1])) { xs.push(s.ovx[i]); ys.push(s.ovy[i]); }
+      }
+   } else {
+      for (i = i0; i < i1; i++) {
+         var c = Math.floor(i / D.chunk);
+         xs.push(xchunk(c)[i - c*D.chunk]); ys.push(ychunk(s, c)[i - c*D.chunk]);
+      }
+   }
+   return [xs, ys];
+}
+
+function draw(p) {
+   var ctx = p.canvas.getContext("2d"), pw = W - ML - MR, ph = H - MT - MB;
+   var i0 = Math.max(lower(view[0]) - 1, 0), i1 = Math.min(lower(view[1]) + 1, D.n);
+   var data = [], ymin = Infinity, ymax = -Infinity;
+   p.lines.forEach(function(l) {
+      var pts = points(D.series[l.s], i0, i1);
+      pts[1].forEach(function(y) { if (y < ymin) { ymin = y; } if (y > ymax) { ymax = y; } });
+      data.push(pts);
+   });
+   if (ymin > ymax) { ymin = 0; ymax = 1; }
+   if (ymin > 0) { ymin = 0; }
+   if (ymax <= ymin) { ymax = ymin + 1; }
+   ymax = ymax + 0.05*(ymax - ymin);
+   function px(x) { return ML + (x - view[0]) / (view[1] - view[0]) * pw; }
+   function py(y) { return MT + ph - (y - ymin) / (ymax - ymin) * ph; }
+
+   ctx.clearRect(0, 0, W, H);
+   ctx.font = "10px sans-serif";
+   ctx.strokeStyle = "#cccccc";
+   ctx.fillStyle = "#000000";
+   for (var t = 0; t <= 4; t++) {
+      var yv = ymin + (ymax - ymin)*t/4, xv = view[0] + (view[1] - view[0])*t/4;
+      ctx.beginPath(); ctx.moveTo(ML, py(yv)); ctx.lineTo(ML + pw, py(yv)); ctx.stroke();
+      ctx.beginPath(); ctx.moveTo(px(xv), MT); ctx.lineTo(px(xv), MT + ph); ctx.stroke();
+      ctx.textAlign = "right"; ctx.fillText(yv.toPrecision(3), ML - 4, py(yv) + 3);
+      ctx.textAlign = "center"; ctx.fillText(xv.toFixed(1), px(xv), MT + ph + 12);
+   }
+   ctx.strokeStyle = "#000000";
+   ctx.strokeRect(ML, MT, pw, ph);
+   ctx.save(); ctx.translate(12, MT + ph/2); ctx.rotate(-Math.PI/2);
+   ctx.textAlign = "center"; ctx.fillText(p.ylabel, 0, 0); ctx.restore();
+   if (p.last) { ctx.textAlign = "center"; ctx.fillText("Time (seconds)", ML + pw/2, H - 3); }
+
+   // One vertical min/max stroke per pixel column; NaN breaks the line
+   ctx.save(); ctx.beginPath(); ctx.rect(ML, MT, pw, ph); ctx.clip();
+   p.lines.forEach(function(l, j) {
+      var xs = data[j][0], ys = data[j][1], col = null, lo = 0, hi = 0, pen = false;
+      function flush() {
+         if (col === null) { return; }
+         if (pen) { ctx.lineTo(col, py(lo)); } else { ctx.moveTo(col, py(lo)); }
+         ctx.lineTo(col, py(hi)); pen = true;
+      }
+      ctx.strokeStyle = l.color; ctx.fillStyle = l.color; ctx.beginPath();
+      for (var i = 0; i < xs.length; i++) {
+         if (isNaN(ys[i])) { flush(); col = null; pen = false; continue; }
+         var c = Math.round(px(xs[i]));
+         if (c !== col) { flush(); col = c; lo = ys[i]; hi = ys[i]; }
+         else { lo = Math.min(lo, ys[i]); hi = Math.max(hi, ys[i]); }
+      }
+      flush(); ctx.stroke();
+      if (xs.length < pw/4) {
+         for (i = 0; i < xs.length; i++) {
+            if (!isNaN(ys[i])) { ctx.fillRect(px(xs[i]) - 2, py(ys[i]) - 2, 4, 4); }
+         }
+      }
+   });
+   ctx.restore();
+   p.lines.forEach(function(l, j) {
+      ctx.fillStyle = l.color; ctx.fillRect(ML + pw + 8, MT + 3 + j*12, 12, 3);
+      ctx.fillStyle = "#000000"; ctx.textAlign = "left";
+      ctx.fillText(l.label, ML + pw + 24, MT + 8 + j*12);
+   });
+   if (p.sel) {
+      ctx.fillStyle = "rgba(0, 0, 255, 0.15)";
+      ctx.fillRect(Math.min(p.sel[0], p.sel[1]), MT, Math.abs(p.sel[1] - p.sel[0]), ph);
+   }
+}
+
+function redraw() { panels.forEach(draw); }
+function value(cx) { return view[0] + (cx - ML) / (W - ML - MR) * (view[1] - view[0]); }
+function zoom(a, b) {
+   a = Math.max(a, D.x0); b = Math.min(b, D.x1);
+   if (b - a > 1e-6) { view = [a, b]; redraw(); }
+}
+
+D.charts.forEach(function(chart, k) {
+   var div = document.getElementById("nfs_chart_" + k);
+   chart.forEach(function(panel, j) {
+      var p = {canvas: document.createElement("canvas"), ylabel: panel.ylabel, lines: panel.lines,
+               last: (j == chart.length - 1), sel: null};
+      p.canvas.width = W; p.canvas.height = H; p.canvas.style.display = "block";
+      div.appendChild(p.canvas);
+      function cx(e) { return e.clientX - p.canvas.getBoundingClientRect().left; }
+      p.canvas.addEventListener("mousedown", function(e) { p.sel = [cx(e), cx(e)]; e.preventDefault(); });
+      p.canvas.addEventListener("mousemove", function(e) { if (p.sel) { p.sel[1] = cx(e); draw(p); } });
+      p.canvas.addEventListener("mouseleave", function(e) { if (p.sel) { p.sel = null; draw(p); } });
+      p.canvas.addEventListener("mouseup", function(e) {
+         var s = p.sel; p.sel = null;
+         if (s && (Math.abs(s[1] - s[0]) > 3)) {
+            zoom(value(Math.min(s[0], s[1])), value(Math.max(s[0], s[1])));
+         } else { draw(p); }
+      });
+      p.canvas.addEventListener("wheel", function(e) {
+         var c = value(cx(e)), f = (e.deltaY < 0) ? 0.8 : 1.25;
+         e.preventDefault(); zoom(c - (c - view[0])*f, c + (view[1] - c)*f);
+      });
+      p.canvas.addEventListener("dblclick", function(e) { view = [D.x0, D.x1]; redraw(); });
+      panels.push(p);
+   });
+});
+redraw();
+})();
+""";
+
+
+
+
+
+
+
+
+
+def follow_lines(input_file, poll_interval):
+   #
+   # Generator that follows a growing file (like "tail -f") or a pipe and
+   #   yields complete lines. At the end of a regular file it waits
+   #   poll_interval seconds and tries again; a pipe (stdin) ends at EOF.
+   #
+   is_pipe = not os.path.isfile(getattr(input_file, "name", ""));
+   partial = "";
+   while True:
+      line = input_file.readline();
+      if (line == ""):
+         if (is_pipe):
+            break;
+         # end if
+         time.sleep(poll_interval);
+         continue;
       # end if
-      
-      # Middle Plot:
-      jloop = -1;
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax2 = plt.subplot(312);
-         d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["rops"], marker, label=d22);
-         plt.xlabel(" ");
-         plt.ylabel(ylabel2, fontsize=fsize);
-         ax2.set_xticklabels([]);
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
-      # end for
-      plt.grid();
-      # Legend:
-      box = ax2.get_position()
-      ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame2 = leg2.get_frame();
-      frame2.set_facecolor("0.80");
-      for t in leg2.get_texts():
-         t.set_fontsize(flegsize);
+      partial = partial + line;
+      if (partial.endswith("\n")):
+         yield partial;
+         partial = "";
+      # end if
+   # end while
+# end def
+
+
+
+def ring_append_interval(ring, ts, rows):
+   #
+   # Stores one interval in a ring buffer store (an nfs_store_new() store
+   #   whose interval axis has a fixed length: the window). The oldest
+   #   interval is overwritten once the window is full.
+   #
+   # ring = store created by nfs_store_new(window)
+   # ts = time stamp of the interval (epoch seconds)
+   # rows = list of (file system, [9 values]) as yielded by nfsiostat_blocks()
+   #
+   window = ring["values"].shape[2];
+   ipos = ring["count"] % window;
+   fs_ids = [nfs_store_fs_id(ring, local_fs) for (local_fs, junk1) in rows];
+   ring["values"][:, :, ipos] = numpy.nan;
+   if (len(rows) > 0):
+      block = numpy.array([local_values for (junk1, local_values) in rows],
+                          dtype=numpy.float64);
+      ring["values"][fs_ids, :, ipos] = block;
+   # end if
+   ring["epoch"][ipos] = ts;
+   ring["count"] = ring["count"] + 1;
+# end def
+
+
+
+def ring_fs_data_list(ring):
+   #
+   # Returns (x_seconds, fs_data_list) for the intervals in a ring buffer,
+   #   oldest first, in the same layout as nfs_store_fs_data_list().
+   #
+   window = ring["values"].shape[2];
+   if (ring["count"] <= window):
+      order = numpy.arange(0, ring["count"]);
+   else:
+      order = (numpy.arange(0, window) + ring["count"]) % window;
+   # end if
+   epoch = ring["epoch"][order];
+   fs_data_list = [];
+   for fs_id in range(0, len(ring["fs_names"])):
+      local_dict = {};
+      local_dict["fs"] = ring["fs_names"][fs_id];
+      local_dict["values"] = ring["values"][fs_id][:, order];
+      for j in range(0, len(FS_METRICS)):
+         local_dict[FS_METRICS[j]] = local_dict["values"][j, :];
       # end for
-      
-      # Bottom Plot:
-      jloop = -1;
-      for item in fs_data_list:
-         jloop = jloop + 1;
-         
-         marker = line_list[jloop];
-         ax3 = plt.subplot(313);
-         d33 = item["fs"] + ": \n" + d3;
-         plt.plot(x_seconds, item["wops"], marker, label=d33);
-         plt.xlabel(xlabel);
-         plt.ylabel(ylabel3, fontsize=fsize);
-         ax3.set_xticklabels([]);
-         
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+      fs_data_list.append(local_dict);
+   # end for
+   if (len(epoch) > 0):
+      x_seconds = epoch - epoch[0];
+   else:
+      x_seconds = epoch;
+   # end if
+   return (x_seconds, fs_data_list);
+# end def
+
+
+
+def dashboard_write(dirname, ring, system_info, refresh, line_list):
+   #
+   # Writes the live dashboard: one combined figure of the server read
+   #   and write throughput and the ops/s of every file system over the
+   #   window, plus a table of the latest values. The page reloads itself
+   #   every "refresh" seconds.
+   #
+   (x_seconds, fs_data_list) = ring_fs_data_list(ring);
+   if (len(x_seconds) == 0):
+      return;
+   # end if
+   
+   panels = [("NFS READ \n (MB/s)", "Read", "rMB_svr"),
+             ("NFS WRITE \n (MB/s)", "Write", "wMB_svr"),
+             ("Ops/s", "Ops/s", "ops")];
+   job = figure_job(dirname + "/dashboard", "Time (seconds)", panels, 8, 6, 1,
+                    None, fs_data_list, x_seconds, line_list);
+   render_figure(job);
+   
+   window = ring["values"].shape[2];
+   ilast = (ring["count"] - 1) % window;
+   output_str = "<HTML><HEAD><META HTTP-EQUIV=\"refresh\" CONTENT=\"" + str(max(1, int(refresh))) + "\"> \n";
+   output_str = output_str + "<TITLE>nfsiostat: " + system_info.get("system_name", "") + "</TITLE></HEAD><BODY> \n";
+   output_str = output_str + "<H3>nfsiostat live: " + system_info.get("system_name", "") + "</H3> \n";
+   output_str = output_str + "<P>Last interval: " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ring["epoch"][ilast]));
+   output_str = output_str + ", window of " + str(len(x_seconds)) + " intervals.</P> \n";
+   output_str = output_str + "<TABLE BORDER=1 CELLPADDING=3> \n";
+   output_str = output_str + "<TR><TH>Filesystem</TH><TH>rMB_svr/s</TH><TH>wMB_svr/s</TH><TH>ops/s</TH>";
+   output_str = output_str + "<TH>max rMB_svr/s</TH><TH>max wMB_svr/s</TH><TH>max ops/s</TH></TR> \n";
+   for fs_id in range(0, len(ring["fs_names"])):
+      latest = ring["values"][fs_id, :, ilast];
+      output_str = output_str + "<TR><TD>" + ring["fs_names"][fs_id] + "</TD>";
+      for metric in ["rMB_svr", "wMB_svr", "ops"]:
+         output_str = output_str + "<TD>%.2f</TD>" % latest[FS_METRICS.index(metric)];
       # end for
-      plt.grid();
-      # Legend:
-      box = ax3.get_position()
-      ax3.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                        borderpad=0.15, handletextpad=0.2);
-      frame3 = leg3.get_frame();
-      frame3.set_facecolor("0.80");
-      for t in leg3.get_texts():
-         t.set_fontsize(flegsize);
+      for metric in ["rMB_svr", "wMB_svr", "ops"]:
+         junk1 = fs_data_list[fs_id][metric];
+         if numpy.all(numpy.isnan(junk1)):
+            output_str = output_str + "<TD>nan</TD>";
+         else:
+            output_str = output_str + "<TD>%.2f</TD>" % numpy.nanmax(junk1);
+         # end if
       # end for
-      
-      # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
-   # end if
-      
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_ops" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Operations/s, Read ops/s, and Write ops/s for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Operations/s, Read ops/s, and Write ops/s </strong></center><BR><BR> \n";
-   # end if
-   output_str = output_str + "<BR><BR> \n";
-   output_str = output_str + "</P> \n \n";
+      output_str = output_str + "</TR> \n";
+   # end for
+   output_str = output_str + "</TABLE> \n";
+   output_str = output_str + "<P><img src=\"dashboard.png?" + str(ring["count"]) + "\"></P> \n";
+   output_str = output_str + "</BODY></HTML> \n";
+   
+   # Replace the page atomically so a browser never sees half of it
+   html_filename = dirname + "/dashboard.html";
+   f = open(html_filename + ".tmp", 'w');
    f.write(output_str);
+   f.close();
+   os.rename(html_filename + ".tmp", html_filename);
+# end def
+
+
+
+def follow_dashboard(input_filename, dirname, window, refresh, line_list):
+   #
+   # Live follow mode: reads nfsiostat output from a growing file or from
+   #   stdin ("-"), keeps the last "window" intervals per file system in a
+   #   ring buffer and rewrites the dashboard every "refresh" seconds.
+   #   Memory use is bounded by the window. Stops at the end of a pipe or
+   #   on Ctrl-C.
+   #
+   if (input_filename == "-"):
+      input_file = sys.stdin;
+   else:
+      input_file = open(input_filename, 'r');
+   # end if
    
+   ring = nfs_store_new(window);
+   ring["values"] = numpy.empty( (4, len(FS_METRICS), window) );
+   ring["values"].fill(numpy.nan);
+   ring["epoch"] = numpy.zeros(window);
+   system_info = {};
+   last_refresh = 0.0;
+   print("Following ",input_filename,", dashboard: ",dirname + "/dashboard.html");
+   try:
+      for sample in nfsiostat_blocks(follow_lines(input_file, 1.0), system_info):
+         (local_date, local_time, local_meridian, rows) = sample;
+         (junk1, x_epoch) = interval_seconds([local_date], [local_time], [local_meridian]);
+         ring_append_interval(ring, x_epoch[0], rows);
+         if (time.time() - last_refresh >= refresh):
+            dashboard_write(dirname, ring, system_info, refresh, line_list);
+            last_refresh = time.time();
+         # end if
+      # end for
+   except KeyboardInterrupt:
+      pass;
+   # end try
+   dashboard_write(dirname, ring, system_info, refresh, line_list);
+   if (input_file != sys.stdin):
+      input_file.close();
+   # end if
 # end def
 
 
@@ -1603,268 +3170,489 @@ def plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
 
 
 
-# ===================
-# Main Python section
-# ===================
+def fleet_ingest_file(task):
+   #
+   # Pool worker for the fleet mode: parses one nfsiostat capture into
+   #   its own store.
+   #
+   # task = (input_filename, selection) where selection is None or the
+   #   (time_from, time_to, fs_patterns) of ingest_filter_new(). Every
+   #   capture gets its own filter, so times of day are put on the first
+   #   day of each capture.
+   #
+   # Returns (input_filename, system_info, fs_names, values, x_epoch) where
+   #   values is the (fs, metric, interval) array of the capture.
+   #
+   (input_filename, selection) = task;
+   ingest_filter = None;
+   if (selection != None):
+      ingest_filter = ingest_filter_new(selection[0], selection[1], selection[2]);
+   # end if
+   data = parse(input_filename, ingest_filter=ingest_filter);
+   return (input_filename, data["system_info"], data["store"]["fs_names"],
+           data["store"]["values"], data["x_epoch"]);
+# end def
 
-if __name__ == '__main__':
+
+
+def fleet_ingest(input_filenames, nworkers, selection=None):
+   #
+   # Parses all captures, one file per task in a pool of "nworkers"
+   #   processes when nworkers > 1. Yields the fleet_ingest_file() result
+   #   of every file in the order of input_filenames.
+   #
+   # selection = None or the (time_from, time_to, fs_patterns) applied to
+   #   every capture (see fleet_ingest_file())
+   #
+   tasks = [(input_filename, selection) for input_filename in input_filenames];
+   if (nworkers > 1) and (len(tasks) > 1):
+      pool = multiprocessing.Pool(min(nworkers, len(tasks)));
+      try:
+         for result in pool.imap(fleet_ingest_file, tasks, 1):
+            yield result;
+         # end for
+      finally:
+         pool.terminate();
+      # end try
+   else:
+      for task in tasks:
+         yield fleet_ingest_file(task);
+      # end for
+   # end if
+# end def
+
+
+
+def fleet_store(results):
+   #
+   # Merges the captures of many hosts into one store keyed by
+   #   (host, file system). All series are put on a common time grid
+   #   (first to last time stamp of all captures, with the median sampling
+   #   interval as step) with align_asof(), so hosts whose clocks tick at
+   #   different seconds line up and missing intervals are NaN.
+   #
+   # The host is the system name of the capture, or the file name when the
+   #   capture has none or the system name is already used.
+   #
+   # Returns the store: "fs_names" ("host fs" labels), "fs_index"
+   #   ((host, fs) -> id), "hosts", "mounts", "values", "count", "epoch"
+   #   (the time grid) and "step"
+   #
+   results = [result for result in results if (len(result[4]) > 0)];
+   store = nfs_store_new(0);
+   store["hosts"] = [];
+   store["mounts"] = [];
+   if (len(results) == 0):
+      store["epoch"] = numpy.zeros(0);
+      return store;
+   # end if
    
-   # Get the command line inputs
-   input_options = sys.argv;
-   combined_plots = 0;
-   help_flag = 0;
-   for item in input_options:
-      item2 = item.lower();
-      if (item2 == "-c"):
-         combined_plots = 1;
-      elif ( (item2[0:2] == "-h") or (item2[0:2] == "-H") ):
-         help_flag = 1;
+   steps = numpy.concatenate([numpy.diff(result[4]) for result in results]);
+   steps = steps[steps > 0];
+   if (len(steps) > 0):
+      step = numpy.median(steps);
+   else:
+      step = 1.0;
+   # end if
+   t0 = min([result[4][0] for result in results]);
+   t1 = max([result[4][-1] for result in results]);
+   epoch = t0 + step*numpy.arange(0, int(round((t1 - t0)/step)) + 1);
+   
+   nkeys = sum([len(result[2]) for result in results]);
+   store["values"] = numpy.empty( (nkeys, len(FS_METRICS), len(epoch)) );
+   store["values"].fill(numpy.nan);
+   host_names = {};
+   for (input_filename, system_info, fs_names, values, x_epoch) in results:
+      host = system_info.get("system_name", "");
+      if (len(host) == 0) or (host in host_names):
+         host = os.path.basename(input_filename);
       # end if
+      host_names[host] = 1;
+      aligned = align_asof(epoch, x_epoch, values);
+      for fs_id in range(0, len(fs_names)):
+         key_id = len(store["fs_names"]);
+         store["fs_index"][(host, fs_names[fs_id])] = key_id;
+         store["fs_names"].append(host + " " + fs_names[fs_id]);
+         store["hosts"].append(host);
+         store["mounts"].append(fs_names[fs_id]);
+         store["values"][key_id] = aligned[fs_id];
+      # end for
    # end for
-   if (help_flag == 1):
-      help_out();
-      sys.exit();
+   store["count"] = len(epoch);
+   store["epoch"] = epoch;
+   store["step"] = step;
+   return store;
+# end def
+
+
+
+def fleet_sum(values):
+   #
+   # Sum over the first axis ignoring NaN; NaN where every value is NaN
+   #
+   total = numpy.nansum(values, axis=0);
+   total[numpy.all(numpy.isnan(values), axis=0)] = numpy.nan;
+   return total;
+# end def
+
+
+
+def fleet_report(input_filenames, dirname, nworkers, top_n, busiest_n, line_list, selection=None):
+   #
+   # Fleet mode: one report for many nfsiostat captures (one per NFS
+   #   client). The captures are parsed in parallel and merged with
+   #   fleet_store(). The report has the fleet totals, the top_n hosts by
+   #   NFS throughput and the summary tables of every (host, file system).
+   #
+   # selection = None or the --from/--to/--fs selection applied while
+   #   reading every capture (see fleet_ingest_file())
+   #
+   print("reading ",len(input_filenames)," nfsiostat output files ... ");
+   results = [];
+   for result in fleet_ingest(input_filenames, nworkers, selection):
+      print("   ",result[0],": ",len(result[4])," data points for ",len(result[2])," NFS mounted file systems");
+      results.append(result);
+   # end for
+   store = fleet_store(results);
+   if (store["count"] == 0):
+      print("No nfsiostat data found");
+      return;
    # end if
+   epoch = store["epoch"];
+   x_seconds = epoch - epoch[0];
+   hosts = [];
+   for host in store["hosts"]:
+      if (host not in hosts):
+         hosts.append(host);
+      # end if
+   # end for
+   print("Merged ",len(store["fs_names"])," file systems of ",len(hosts)," hosts on ",len(epoch)," intervals");
    
-   input_filename = input_options[-1];
+   # Fleet totals and per host totals (sum over the mounts of a host)
+   ir = FS_METRICS.index("rMB_svr");
+   iw = FS_METRICS.index("wMB_svr");
+   fleet_dict = {"fs": "All hosts"};
+   for j in range(0, len(FS_METRICS)):
+      fleet_dict[FS_METRICS[j]] = fleet_sum(store["values"][:, j, :]);
+   # end for
+   host_data_list = [];
+   host_ids = numpy.array([hosts.index(host) for host in store["hosts"]]);
+   for ihost in range(0, len(hosts)):
+      host_values = fleet_sum(store["values"][host_ids == ihost]);
+      local_dict = {"fs": hosts[ihost]};
+      for j in range(0, len(FS_METRICS)):
+         local_dict[FS_METRICS[j]] = host_values[j];
+      # end for
+      local_dict["MB_svr"] = fleet_sum(host_values[[ir, iw]]);
+      with warnings.catch_warnings():
+         warnings.simplefilter("ignore", RuntimeWarning);
+         local_dict["mean_MB_svr"] = numpy.nanmean(local_dict["MB_svr"]);
+      # end with
+      host_data_list.append(local_dict);
+   # end for
+   host_data_list.sort(key=lambda local_dict: -numpy.nan_to_num(local_dict["mean_MB_svr"]));
+   top_list = host_data_list[0:top_n];
    
-   print "nfsiostat plotting script (includes iostat data)";
-   print " ";
-   print "input filename: ",input_filename;
+   # Figures
+   figure_jobs = [];
+   panels = [("Fleet NFS READ \n (MB/s)", "NFS READ", "rMB_svr"),
+             ("Fleet NFS WRITE \n (MB/s)", "NFS WRITE", "wMB_svr"),
+             ("Fleet Ops/s", "Ops/s", "ops")];
+   figure_jobs.append(figure_job(dirname + "/fleet_total", "Time (seconds)", panels, 8, 6, 0,
+                                 fleet_dict, [fleet_dict], x_seconds, line_list));
+   panels = [("NFS READ + WRITE \n (MB/s)", "MB/s", "MB_svr"),
+             ("Ops/s", "Ops/s", "ops")];
+   figure_jobs.append(figure_job(dirname + "/fleet_top_hosts", "Time (seconds)", panels, 8, 6, 1,
+                                 None, top_list, x_seconds, line_list));
+   for ijob in render_figures(figure_jobs, nworkers):
+      print("   Finished Plot ",ijob+1," of ",len(figure_jobs));
+   # end for
    
-   # Look for pickle file:
-   filename = "./iostat_file.pickle";
-   pickle_success = 0;
-   if os.path.isfile(filename):
-      pickle_success = 1;
-   # end if
+   # Summary of every (host, file system)
+   time_labels = [time.strftime("%m/%d/%Y %I:%M:%S %p", time.localtime(junk1)) for junk1 in epoch];
+   summary = fs_summary(store, x_seconds, time_labels, busiest_n);
+   for fs_id in range(0, len(summary["file_systems"])):
+      summary["file_systems"][fs_id]["host"] = store["hosts"][fs_id];
+      summary["file_systems"][fs_id]["mount"] = store["mounts"][fs_id];
+   # end for
+   summary_file = open(dirname + "/summary.json", 'w');
+   json.dump(summary, summary_file, indent=1, sort_keys=True);
+   summary_file.close();
    
-   # Read iostat pickle:
-   if (pickle_success > 0):
-      print "Reading iostat_file.pickle";
-      pickle_file = open('iostat_file.pickle', 'r');
-      
-      iostat_dict = pickle.load(pickle_file);
-      
-      # unravel iostat_dict
-      iostat_cpu_data = iostat_dict["cpu_data"];
-      iostat_user_list = iostat_dict["cpu_data"]["user_list"];
-      iostat_nice_list = iostat_dict["cpu_data"]["nice_list"];
-      iostat_system_list = iostat_dict["cpu_data"]["system_list"];
-      iostat_iowait_list = iostat_dict["cpu_data"]["iowait_list"];
-      iostat_steal_list = iostat_dict["cpu_data"]["steal_list"];
-      iostat_idle_list = iostat_dict["cpu_data"]["idle_list"];
-      iostat_cpu_lables = iostat_dict["cpu_data"]["cpu_labels"];
-      iostat_time_sum_list = iostat_dict["cpu_data"]["time_sum_list"];
-      
-      iostat_date_list = iostat_dict["time_data"]["date_list"];
-      iostat_time_list = iostat_dict["time_data"]["time_list"];
-      iostat_meridian_list = iostat_dict["time_data"]["meridian_list"];
-      
-      iostat_x_seconds = iostat_dict["x_seconds"];
-      
-      iostat_kernel = iostat_dict["system_info"]["kernel"];
-      iostat_system_name = iostat_dict["system_info"]["system_name"];
-      iostat_date = iostat_dict["system_info"]["date"];
-      iostat_CPU = iostat_dict["system_info"]["CPU"];
-      iostat_cores = iostat_dict["system_info"]["cores"];
-      
-      iostat_device_data_list = iostat_dict["device_data_list"];
-      
-      # "Total" CPU utilziation (user + system)
-      time_sum_list = [];
-      for i in range(0,len(iostat_user_list)):
-          time_sum_list.append( (iostat_user_list[i] + iostat_system_list[i]) );
-      # end for
-      #print "iostat_device_data_list:",iostat_device_data_list;
-      #print "iostat_device_data_list[iloop]:",iostat_device_data_list[1];
-      #print "iostat_device_data_list[iloop]["r"]:",iostat_device_data_list[1]["r"];
-      #print "total time: ",time_sum_list;
-      
-      pickle_file.close();
-   # end if
+   # HTML report
+   sections = [];
+   output_str = "<H3>\n";
+   output_str = output_str + "Introduction \n";
+   output_str = output_str + "</H3> \n \n";
+   output_str = output_str + "<P>This report combines the nfsiostat output of several NFS clients. \n";
+   output_str = output_str + "The captures were put on a common time base with a step of " + str(store["step"]) + " seconds \n";
+   output_str = output_str + "starting at " + time_labels[0] + ". The captures are: \n";
+   output_str = output_str + "<UL> \n";
+   junk1 = [];
+   for (input_filename, system_info, fs_names, values, x_epoch) in results:
+      junk1.append("   <LI>" + input_filename + ": " + system_info.get("system_name", "") + ", " +
+                   str(len(fs_names)) + " filesystems, " + str(len(x_epoch)) + " intervals \n");
+   # end for
+   output_str = output_str + "".join(junk1);
+   output_str = output_str + "</UL> \n";
+   output_str = output_str + "</P> \n";
+   sections.append(report_section("intro", output_str));
    
-   # Initialize lists that will store data
-   date_list = [];
-   time_list = [];
-   meridian_list = [];
+   sections.append(report_section("summary", summary_html(summary, 1)));
    
-   # Master dictionary of fs data
-   fs_data_list = [];
-   # List element is dictionary:
-   #   local_dict{"filesystem"} = "file system name"
-   #   local_dict{"rMB_nor"} = [];
-   #   local_dict{"wMB_nor"} = [];
-   #   local_dict{"rMB_dir"} = [];
-   #   local_dict{"wMB_dir"} = [];
-   #   local_dict{"rMB_svr"} = [];
-   #   local_dict{"wMB_svr"} = [];
-   #   local_dict{"ops"} = [];
-   #   local_dict{"rops"} = [];
-   #   local_dict{"wops"} = [];
-   
-   # flags for controlling flow
-   iflow_flag = 1;
-   
-   # Define fixed variables
-   fsize = 8;
+   output_str = "<HR> \n";
+   output_str = output_str + "<H3> \n";
+   output_str = output_str + "1. <a id=\"fleet_total\">Fleet NFS Read and Write Throughput and Operations/s</a> \n";
+   output_str = output_str + "</H3> \n";
+   output_str = output_str + "<P>This figure plots the sum over all hosts and filesystems of the NFS READ \n";
+   output_str = output_str + "and NFS WRITE throughput (MB/s) and the operations per second. \n";
+   output_str = output_str + "<center> \n";
+   output_str = output_str + "<img src=\"fleet_total.png\"> \n";
+   output_str = output_str + "<BR><BR><strong>Figure 1 - Fleet NFS Throughput and Operations/s</strong></center><BR><BR> \n";
+   output_str = output_str + "</P> \n \n";
+   output_str = output_str + "<HR> \n";
+   output_str = output_str + "<H3> \n";
+   output_str = output_str + "2. <a id=\"fleet_top_hosts\">Top " + str(len(top_list)) + " Hosts by NFS Throughput</a> \n";
+   output_str = output_str + "</H3> \n";
+   output_str = output_str + "<P>This figure plots the NFS READ + NFS WRITE throughput (MB/s) and the \n";
+   output_str = output_str + "operations per second of the hosts with the highest mean throughput \n";
+   output_str = output_str + "(summed over the filesystems of each host): \n";
+   output_str = output_str + "<OL> \n";
+   for local_dict in top_list:
+      output_str = output_str + "   <LI>" + local_dict["fs"] + ": %.2f MB/s mean \n" % numpy.nan_to_num(local_dict["mean_MB_svr"]);
+   # end for
+   output_str = output_str + "</OL> \n";
+   output_str = output_str + "<center> \n";
+   output_str = output_str + "<img src=\"fleet_top_hosts.png\"> \n";
+   output_str = output_str + "<BR><BR><strong>Figure 2 - Top Hosts by NFS Throughput</strong></center><BR><BR> \n";
+   output_str = output_str + "</P> \n \n";
+   sections.append(report_section("figures", output_str));
+   report_write(dirname + "/report.html", "NFSIOSTAT Fleet Report for " + str(len(hosts)) + " hosts",
+                sections);
    
-   # loop over lines in input file
-   print " ";
-   print "reading nfsiostat output file ... ";
-   icount = 0;
-   for line in open(input_filename,'r').readlines():
-      currentline = shlex.split(line);
-      
-      if (len(currentline) > 0):
-         if (iflow_flag == 5):
-            #print "   Reading and Storing fs values";
-            local_fs = temp_fs;
-            if (len(fs_data_list) == 0):
-               #print "      Adding new fs"
-               local_dict = {};
-               local_dict["fs"] = local_fs;
-               local_dict["rMB_nor"]=[float(currentline[0])];
-               local_dict["wMB_nor"]=[float(currentline[1])];
-               local_dict["rMB_dir"]=[float(currentline[2])]; 
-               local_dict["wMB_dir"]=[float(currentline[3])];
-               local_dict["rMB_svr"]=[float(currentline[4])];
-               local_dict["wMB_svr"]=[float(currentline[5])];
-               local_dict["ops"]=[float(currentline[6])];
-               local_dict["rops"]=[float(currentline[7])];
-               local_dict["wops"]=[float(currentline[8])];
-               fs_data_list.append(local_dict);
-            else:
-               # search for file system - add it if not new
-               ifind = 0;
-               for iloop in range(0, len(fs_data_list) ):
-                  item = fs_data_list[iloop];
-                  if (item["fs"] == local_fs):
-                     #print "         adding data to existing fs";
-                     fs_data_list[iloop]["rMB_nor"].append(float(currentline[0]));            
-                     fs_data_list[iloop]["wMB_nor"].append(float(currentline[1]));
-                     fs_data_list[iloop]["rMB_dir"].append(float(currentline[2]));            
-                     fs_data_list[iloop]["wMB_dir"].append(float(currentline[3]));
-                     fs_data_list[iloop]["rMB_svr"].append(float(currentline[4]));            
-                     fs_data_list[iloop]["wMB_svr"].append(float(currentline[5]));
-                     fs_data_list[iloop]["ops"].append(float(currentline[6]));            
-                     fs_data_list[iloop]["rops"].append(float(currentline[7]));
-                     fs_data_list[iloop]["wops"].append(float(currentline[8]));
-                     ifind = 1;
-                  # end if
-               # end
-               if (ifind == 0):
-                  #print "      Adding data to new fs";
-                  local_dict = {};
-                  local_dict["fs"] = temp_fs;
-                  local_dict["rMB_nor"]=[float(currentline[0])];
-                  local_dict["wMB_nor"]=[float(currentline[1])];
-                  local_dict["rMB_dir"]=[float(currentline[2])]; 
-                  local_dict["wMB_dir"]=[float(currentline[3])];
-                  local_dict["rMB_svr"]=[float(currentline[4])];
-                  local_dict["wMB_svr"]=[float(currentline[5])];
-                  local_dict["ops"]=[float(currentline[6])];
-                  local_dict["rops"]=[float(currentline[7])];
-                  local_dict["wops"]=[float(currentline[8])];
-                  fs_data_list.append(local_dict);
-               # end if
-            # end if
-            iflow_flag = 2;
-         elif (iflow_flag == 4):
-            #print "   Reading file system";
-            temp_fs = currentline[0];
-            iflow_flag = 5;
-         elif (iflow_flag == 3):
-            #print "      Reading and storing fs headers";
-            cpu_labels = [];
-            cpu_labels = currentline;
-	    iflow_flag = 4;
-         elif (iflow_flag == 2):
-            #print "   Reading time information";
-            date_list.append(currentline[0].replace("/"," "));
-            # if meridian is PM then need to add 12 hours to time_list
-            if (currentline[2] == "PM"):
-               junk1 = currentline[1].replace(":"," ");
-               junk2 = shlex.split(junk1);
-               if ( int(junk2[0]) < 12):
-                  junk3 = int(junk2[0]) + 12;
-               elif (int(junk2[0]) == 12):
-                  junk3 = int(junk2[0]);
-               # end if
-               junk4 = str(junk3) + ":" + junk2[1] + ":" + junk2[2];
-               time_list.append(junk4);
-            else:
-               time_list.append(currentline[1]);
-            # end if
-            meridian_list.append(currentline[2]);
-            iflow_flag = 3;
-            icount = icount + 1;
-         elif (iflow_flag == 1):
-            #print "   Read system information";
-            system_info = {};
-            system_info["OS"] = currentline[0];
-            system_info["kernel"] = currentline[1];
-            system_info["system_name"] = currentline[2][1:len(currentline[2])-1];
-            system_info["date"] = currentline[3];
-            system_info["CPU"] = currentline[4];
-            system_info["cores"] = currentline[5][1:];
-            iflow_flag = 2;
-         # end if
-      else:
-         #print "   Finished reading section - get ready for next section";
-         if (iflow_flag == 1):
-            iflow_flag = 2;
-         elif (iflow_flag >= 2):
-            iflow_flag = 2;
-         # end if
+   # Columnar exchange data
+   nfsiostat_dict = {};
+   nfsiostat_dict["x_seconds"] = x_seconds;
+   nfsiostat_dict["x_epoch"] = epoch;
+   nfsiostat_dict["fs_names"] = store["fs_names"];
+   nfsiostat_dict["hosts"] = store["hosts"];
+   nfsiostat_dict["mounts"] = store["mounts"];
+   nfsiostat_dict["fs_values"] = store["values"];
+   columns_write("./nfsiostat_file.columns", nfsiostat_dict,
+                 {"fs_metrics": FS_METRICS, "input_filenames": input_filenames});
+# end def
+
+
+
+
+
+
+
+
+
+def cpu_seconds():
+   #
+   # User + system CPU time of this process and of its finished child
+   #   processes (e.g. the render pool)
+   #
+   junk1 = os.times();
+   return junk1[0] + junk1[1] + junk1[2] + junk1[3];
+# end def
+
+
+def peak_rss_mb(who):
+   #
+   # Peak resident set size (high-water mark) in MB of this process
+   #   (who = "self") or of its largest finished child process
+   #   (who = "children"); NaN where the resource module is missing
+   #
+   if (resource_success == 0):
+      return numpy.nan;
+   elif (who == "self"):
+      maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss;
+   else:
+      maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss;
+   # end if
+   if (sys.platform == "darwin"):
+      return maxrss/1048576.0;               # bytes on macOS
+   # end if
+   return maxrss/1024.0;                     # KB on Linux
+# end def
+
+
+def stage_timer_new():
+   #
+   # Instrumentation of the stages of a run. stage_mark() ends the stage
+   #   that started at the previous mark and records its wall clock time,
+   #   CPU time (see cpu_seconds()), lines/s and the peak RSS so far.
+   #
+   timer = {};
+   timer["stages"] = [];
+   timer["wall"] = time.time();
+   timer["cpu"] = cpu_seconds();
+   return timer;
+# end def
+
+
+def stage_mark(timer, stage, nlines=0):
+   #
+   # Ends the current stage (see stage_timer_new()); nlines = number of
+   #   input lines handled in the stage (for lines/s), 0 if none
+   #
+   wall = time.time();
+   cpu = cpu_seconds();
+   local_dict = {};
+   local_dict["stage"] = stage;
+   local_dict["wall"] = wall - timer["wall"];
+   local_dict["cpu"] = cpu - timer["cpu"];
+   local_dict["lines"] = nlines;
+   local_dict["peak_rss_mb"] = peak_rss_mb("self");
+   local_dict["children_peak_rss_mb"] = peak_rss_mb("children");
+   timer["stages"].append(local_dict);
+   timer["wall"] = wall;
+   timer["cpu"] = cpu;
+   print("   [%s] %.2f s, CPU %.2f s, peak RSS %.1f MB" % (stage, local_dict["wall"],
+                                                         local_dict["cpu"], local_dict["peak_rss_mb"]));
+# end def
+
+
+def count_lines(input_lines, counter, interval):
+   #
+   # Generator that passes the input lines through, counting them in
+   #   counter["lines"], and prints the ingest rate every "interval"
+   #   seconds
+   #
+   start = time.time();
+   last_print = start;
+   for line in input_lines:
+      counter["lines"] = counter["lines"] + 1;
+      if ((counter["lines"] & 0xffff) == 0) and (time.time() - last_print >= interval):
+         last_print = time.time();
+         print("   read ",counter["lines"]," lines (%.0f lines/s)" % (counter["lines"]/(last_print - start)));
       # end if
+      yield line;
    # end for
-   print "Finished reading ",icount," data points for ",len(fs_data_list)," NFS mounted file systems.";
-   print "Creating plots and HTML report";
-   
-   # Create time list for x-axis data (need to convert to regular time format)
-   x_seconds = [];
-   for i in range(0,len(date_list)):
-      test2 = shlex.split(date_list[i]);
-      test3 = test2[2] + "-" + test2[0] + "-" + test2[1];
-      
-      junk1 = test3 + " " + time_list[i];
-      ts = time.mktime(time.strptime(junk1, '%Y-%m-%d %H:%M:%S'));
-      if (i == 0):
-         BeginTime = ts;
-         x_seconds.append(0.0);
+# end def
+
+
+def timing_html(timer):
+   #
+   # HTML footer with the timing breakdown of the stages
+   #
+   output_str = "<HR> \n";
+   output_str = output_str + "<P><small>Run time of nfsiostat_plotter_v4.py by stage (CPU time \n";
+   output_str = output_str + "includes the render processes; peak RSS is the high-water mark of \n";
+   output_str = output_str + "the main process, and of the largest render process in brackets). \n";
+   output_str = output_str + "<TABLE BORDER=1 CELLPADDING=2> \n";
+   output_str = output_str + "<TR><TH>Stage</TH><TH>Wall (s)</TH><TH>CPU (s)</TH><TH>Lines/s</TH><TH>Peak RSS (MB)</TH></TR> \n";
+   wall = 0.0;
+   cpu = 0.0;
+   for local_dict in timer["stages"]:
+      wall = wall + local_dict["wall"];
+      cpu = cpu + local_dict["cpu"];
+      output_str = output_str + "<TR><TD>" + local_dict["stage"] + "</TD>";
+      output_str = output_str + "<TD>%.2f</TD><TD>%.2f</TD>" % (local_dict["wall"], local_dict["cpu"]);
+      if (local_dict["lines"] > 0):
+         output_str = output_str + "<TD>%.0f</TD>" % (local_dict["lines"]/max(local_dict["wall"], 1.0e-6));
       else:
-         x_seconds.append( (ts - BeginTime) );
+         output_str = output_str + "<TD></TD>";
       # end if
-   # end of
-   
-   # 
-   # HTML Report initialization
-   #    Write all data files to subdirectory called HTML_REPORT
-   #    File is report.html
-   dirname ="./HTML_REPORT";
-   if not os.path.exists(dirname):
-      os.makedirs(dirname);
-   # end if
-   html_filename = dirname + '/report.html';
-   f = open(html_filename, 'w')
-   
-   # Print HTML Report header
-   output_str = "<H2>\n";
-   output_str = output_str + "NFSIOSTAT Report for file: " + input_filename + " \n";
-   output_str = output_str + "</H2>\n";
-   output_str = output_str + " \n";
+      output_str = output_str + "<TD>%.1f (%.1f)</TD></TR> \n" % (local_dict["peak_rss_mb"],
+                                                                  local_dict["children_peak_rss_mb"]);
+   # end for
+   output_str = output_str + "<TR><TD>total</TD><TD>%.2f</TD><TD>%.2f</TD><TD></TD><TD></TD></TR> \n" % (wall, cpu);
+   output_str = output_str + "</TABLE></small></P> \n";
+   return output_str;
+# end def
+
+
+def profile_write(profiler, dirname):
+   #
+   # Writes the cProfile data of the parse and render loops:
+   #   profile.pstats (for pstats, snakeviz, gprof2dot or flameprof) and
+   #   profile.txt (the 40 functions with the highest cumulative time)
+   #
+   profiler.dump_stats(dirname + "/profile.pstats");
+   profile_file = open(dirname + "/profile.txt", 'w');
+   stats = pstats.Stats(profiler, stream=profile_file);
+   stats.sort_stats("cumulative").print_stats(40);
+   profile_file.close();
+   print("Profile written to ",dirname + "/profile.pstats and profile.txt");
+# end def
+
+
+
+
+
+
+
+
+
+# Report writer
+# =============
+#
+# A report is a list of sections, report_section(name, html), that are
+#   built independently of each other (so they can be built in parallel
+#   or kept between runs) and rendered through REPORT_TEMPLATE with a
+#   single write by report_write(). Sections use list joins instead of
+#   repeated string concatenation for anything that grows with the number
+#   of file systems or intervals.
+REPORT_TEMPLATE = """<HTML>
+<HEAD>
+<META charset="utf-8">
+<TITLE>%(title)s</TITLE>
+</HEAD>
+<BODY>
+<H2>
+%(title)s
+</H2>
+%(body)s</BODY>
+</HTML>
+""";
+
+
+def report_section(name, html):
+   #
+   # One section of a report: {"name": name, "html": HTML fragment}
+   #
+   return {"name": name, "html": html};
+# end def
+
+
+def report_write(html_filename, title, sections, template=REPORT_TEMPLATE):
+   #
+   # Renders the sections (in list order) through the template and writes
+   #   the report with one buffered write. The file is replaced when it is
+   #   complete, so a browser never shows half of a report.
+   #
+   body = [];
+   for section in sections:
+      body.append("<!-- section: " + section["name"] + " --> \n");
+      body.append(section["html"]);
+   # end for
+   output_str = template % {"title": title, "body": "".join(body)};
+   f = open(html_filename + ".tmp", 'w');
+   f.write(output_str);
+   f.close();
+   os.rename(html_filename + ".tmp", html_filename);
+# end def
+
+
+def intro_html(data, combined_plots):
+   #
+   # Report section: introduction and system information of a parse()
+   #   data store
+   #
+   parts = [];
    
    # HTML Introduction
    output_str = "<H3>\n";
    output_str = output_str + "Introduction \n";
    output_str = output_str + "</H3> \n \n";
    output_str = output_str + "<P>This report plots the nfsiostat output contained in file: \n";
-   output_str = output_str + sys.argv[1] + ". The filesystems analyzed are: \n";
+   output_str = output_str + data["input_filename"] + ". The filesystems analyzed are: \n";
    output_str = output_str + "<UL> \n";
-   for item in fs_data_list:
-      output_str = output_str + "   <LI>" + item["fs"] + " \n";
-   # end if
+   output_str = output_str + "".join(["   <LI>" + item["fs"] + " \n" for item in data["fs_data_list"]]);
    if (combined_plots == 0):
       output_str = output_str + "</UL> \n";
       output_str = output_str + "For each filesystem there are a series of plots of the output \n";
@@ -1874,7 +3662,7 @@ if __name__ == '__main__':
       output_str = output_str + "and you will see the plots. Please note that all plots are \n";
       output_str = output_str + "referenced to the beginning time of the nfsiostat run. </P>\n";
       output_str = output_str + " \n";
-      f.write(output_str);
+      parts.append(output_str);
    elif(combined_plots == 1):
       output_str = output_str + "</UL> \n";
       output_str = output_str + "There are a series of plots from the captured nfsiostat output \n";
@@ -1886,7 +3674,7 @@ if __name__ == '__main__':
       output_str = output_str + "time of the nfsiostat run. \n";
       output_str = output_str + "</P>\n";
       output_str = output_str + " \n";
-      f.write(output_str);
+      parts.append(output_str);
    # end if
    
    
@@ -1894,32 +3682,46 @@ if __name__ == '__main__':
    output_str = "<P>NFSiostat outputs a number of basic system parameters when it\n";
    output_str = output_str + "creates the output. These parameters are listed below. \n";
    output_str = output_str + "<UL> \n";
-   output_str = output_str + "   <LI>System Name: " + system_info["system_name"] + " \n";
-   output_str = output_str + "   <LI>OS: " + system_info["OS"] + " \n";
-   output_str = output_str + "   <LI>Kernel: " + system_info["kernel"] + " \n";
-   output_str = output_str + "   <LI>Number of Cores " + system_info["cores"] + " \n";
-   output_str = output_str + "   <LI>Core Type " + system_info["CPU"] + " \n";
+   output_str = output_str + "   <LI>System Name: " + data["system_info"]["system_name"] + " \n";
+   output_str = output_str + "   <LI>OS: " + data["system_info"]["OS"] + " \n";
+   output_str = output_str + "   <LI>Kernel: " + data["system_info"]["kernel"] + " \n";
+   output_str = output_str + "   <LI>Number of Cores " + data["system_info"]["cores"] + " \n";
+   output_str = output_str + "   <LI>Core Type " + data["system_info"]["CPU"] + " \n";
    output_str = output_str + "</UL> \n";
-   output_str = output_str + "The nfsiostat run was started on " + system_info["date"] + " at \n";
-   output_str = output_str + time_list[0] + " " + meridian_list[0] + ". \n";
+   output_str = output_str + "The nfsiostat run was started on " + data["system_info"]["date"] + " at \n";
+   output_str = output_str + data["time_list"][0] + " " + data["meridian_list"][0] + ". \n";
+   if ("cpu_aligned" in data):
+      output_str = output_str + "CPU utilization from iostat was matched to " + str(data["cpu_matched"]) + " \n";
+      output_str = output_str + "of the " + str(len(data["x_epoch"])) + " nfsiostat intervals (iostat clock offset \n";
+      output_str = output_str + str(data["clock_offset"]) + " seconds). Intervals without an iostat sample \n";
+      output_str = output_str + "are left blank in the CPU plots. \n";
+   # end if
    output_str = output_str + "</P> \n";
-   f.write(output_str);
+   parts.append(output_str);
+   return "".join(parts);
+# end def
+
+
+def links_html(fs_data_list, combined_plots):
+   #
+   # Report section: hyperlinks to the figures
+   #
+   parts = [];
    
    # HTML hyperlinks
    if (combined_plots == 0):
       output_str = "<P>Below are hyperlinks to various plots within the report \n";
       output_str = output_str + "for each device. \n";
       output_str = output_str + "<BR><BR> \n";
-      f.write(output_str);
+      parts.append(output_str);
    elif (combined_plots == 1):
       output_str = "<P>Below are hyperlinks to various plots within the report \n";
       output_str = output_str + "where all of the devices are plotted together on each chart. \n";
       output_str = output_str + "<BR><BR> \n";
-      f.write(output_str);
+      parts.append(output_str);
    # end if
    iloop = -1;
-   plots_per_fs = 4;
-   max_plots = plots_per_fs * len(fs_data_list);
+   plots_per_fs = 5;
    if (combined_plots == 0):
       for item in fs_data_list:
          iloop = iloop + 1; 
@@ -1934,10 +3736,12 @@ if __name__ == '__main__':
          output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a> \n";
          junk1 = "app_ops" + str(iloop);
          output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a> \n";
+         junk1 = "app_derived" + str(iloop);
+         output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Client Cache Effectiveness, Average I/O Size, and O_DIRECT Share</a> \n";
          output_str = output_str + "</OL> \n";
          output_str = output_str + "</P> \n";
          output_str = output_str + " \n";
-         f.write(output_str);
+         parts.append(output_str);
       # end if
    elif (combined_plots == 1):
       iloop = 0;
@@ -1951,17 +3755,352 @@ if __name__ == '__main__':
       output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a> \n";
       junk1 = "app_ops" + str(iloop);
       output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a> \n";
+      junk1 = "app_derived" + str(iloop);
+      output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Client Cache Effectiveness, Average I/O Size, and O_DIRECT Share</a> \n";
       output_str = output_str + "</OL> \n";
       output_str = output_str + "</P> \n";
       output_str = output_str + " \n";
-      f.write(output_str);
+      parts.append(output_str);
+   # end if
+   return "".join(parts);
+# end def
+
+
+
+
+
+
+
+
+
+# Bulk export of the parsed series
+# ================================
+#
+# Every interval of every file system is one record with the FS_METRICS
+#   and the DERIVED_METRICS as fields:
+#
+#   InfluxDB line protocol (file or HTTP write endpoint), one line per record
+#      nfsiostat,host=<system name>,fs=<file system> rMB_nor=1.5,...,ops=420 <epoch ns>
+#   Prometheus remote write (HTTP endpoint), one series per file system
+#   and metric
+#      nfsiostat_<metric>{fs="<file system>",host="<system name>"}
+#      as snappy compressed protobuf WriteRequest messages
+#   Parquet, one file per host and day (Hive style partitions)
+#      <dirname>/host=<system name>/day=<YYYY-MM-DD>/part-<first epoch>.parquet
+#      with the columns "time" (timestamp, seconds), "fs" and one float64
+#      column per metric
+#
+# All are written in batches so memory use does not grow with the
+#   length of the capture. NaN (file system not reported) is left out
+#   of the line protocol and the remote write samples.
+EXPORT_METRICS = FS_METRICS + DERIVED_METRICS;
+
+
+def influx_escape(value):
+   #
+   # Escapes a tag value for the line protocol
+   #
+   return value.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ");
+# end def
+
+
+def influx_batches(data, batch):
+   #
+   # Generator that yields the line protocol of a parse() data store as
+   #   strings of at most "batch" lines (see EXPORT_METRICS above)
+   #
+   nfs_store = data["store"];
+   host = influx_escape(data["system_info"].get("system_name", "unknown"));
+   epoch = numpy.asarray(data["x_epoch"], dtype=numpy.int64);
+   nmetrics = len(EXPORT_METRICS);
+   template = ",".join([junk1 + "=%.10g" for junk1 in EXPORT_METRICS]) + " %d000000000\n";
+   lines = [];
+   for fs_id in range(0, len(nfs_store["fs_names"])):
+      prefix = "nfsiostat,host=" + host + ",fs=" + influx_escape(nfs_store["fs_names"][fs_id]) + " ";
+      for istart in range(0, len(epoch), batch):
+         # (interval, metric) block of this file system
+         block = numpy.concatenate((nfs_store["values"][fs_id, :, istart:istart+batch],
+                                    nfs_store["derived"][fs_id, :, istart:istart+batch])).T;
+         finite = ~numpy.isnan(block);
+         complete = numpy.all(finite, axis=1);
+         rows = block.tolist();
+         stamps = epoch[istart:istart+batch].tolist();
+         for i in range(0, len(rows)):
+            if (complete[i]):
+               lines.append(prefix + template % tuple(rows[i] + [stamps[i]]));
+            elif numpy.any(finite[i]):
+               junk1 = ",".join([EXPORT_METRICS[j] + "=%.10g" % rows[i][j]
+                                 for j in range(0, nmetrics) if finite[i, j]]);
+               lines.append(prefix + junk1 + " %d000000000\n" % stamps[i]);
+            # end if
+            if (len(lines) >= batch):
+               yield "".join(lines);
+               lines = [];
+            # end if
+         # end for
+      # end for
+   # end for
+   if (len(lines) > 0):
+      yield "".join(lines);
    # end if
+# end def
+
+
+def export_influx(data, target, batch=5000):
+   #
+   # Writes a parse() data store as InfluxDB line protocol to a file, or
+   #   POSTs it in batches of "batch" lines when target is a URL, e.g.
+   #   "http://localhost:8086/write?db=nfs" (InfluxDB 1.x) or the
+   #   /api/v2/write endpoint of InfluxDB 2.x, Telegraf or VictoriaMetrics.
+   #   Returns the number of batches written.
+   #
+   nbatches = 0;
+   if (target[0:7] == "http://") or (target[0:8] == "https://"):
+      try:
+         from urllib.request import urlopen, Request;
+      except ImportError:
+         from urllib2 import urlopen, Request;
+      # end try
+      for junk1 in influx_batches(data, batch):
+         request = Request(target, junk1.encode("utf-8"),
+                           {"Content-Type": "text/plain; charset=utf-8"});
+         urlopen(request).close();
+         nbatches = nbatches + 1;
+      # end for
+   else:
+      export_file = open(target, 'w');
+      for junk1 in influx_batches(data, batch):
+         export_file.write(junk1);
+         nbatches = nbatches + 1;
+      # end for
+      export_file.close();
+   # end if
+   return nbatches;
+# end def
+
+
+def proto_varint(value):
+   #
+   # Protocol buffers base 128 varint of a non-negative integer
+   #
+   parts = bytearray();
+   while (value > 0x7f):
+      parts.append((value & 0x7f) | 0x80);
+      value = value >> 7;
+   # end while
+   parts.append(value);
+   return bytes(parts);
+# end def
+
+
+def proto_bytes(field, payload):
+   #
+   # Protocol buffers length delimited field (string or message)
+   #
+   return proto_varint((field << 3) | 2) + proto_varint(len(payload)) + payload;
+# end def
+
+
+def snappy_compressor():
+   #
+   # Snappy block compression for the remote write protocol: the snappy
+   #   module (python-snappy) when it is installed, otherwise snappy_literal()
+   #
+   try:
+      import snappy;
+      return snappy.compress;
+   except ImportError:
+      return snappy_literal;
+   # end try
+# end def
+
+
+def snappy_literal(payload):
+   #
+   # Snappy block made of literals only: valid for every snappy decoder,
+   #   just not smaller than payload
+   #
+   parts = [proto_varint(len(payload))];
+   for i in range(0, len(payload), 65536):
+      junk1 = payload[i:i+65536];
+      # tag 61 << 2: literal with a 2 byte (length - 1)
+      parts.append(b"\xf4" + struct.pack("<H", len(junk1) - 1) + junk1);
+   # end for
+   return b"".join(parts);
+# end def
+
+
+def remote_write_batches(data, batch):
+   #
+   # Generator that yields the remote write WriteRequest messages of a
+   #   parse() data store (see EXPORT_METRICS above), not compressed, with
+   #   at most "batch" samples each:
+   #
+   #   WriteRequest { repeated TimeSeries timeseries = 1; }
+   #   TimeSeries   { repeated Label labels = 1; repeated Sample samples = 2; }
+   #   Label        { string name = 1; string value = 2; }
+   #   Sample       { double value = 1; int64 timestamp = 2; (ms) }
+   #
+   nfs_store = data["store"];
+   host = data["system_info"].get("system_name", "unknown").encode("utf-8");
+   epoch = numpy.asarray(data["x_epoch"], dtype=numpy.int64);
+   timeseries = [];
+   nsamples = 0;
+   for fs_id in range(0, len(nfs_store["fs_names"])):
+      fs = nfs_store["fs_names"][fs_id].encode("utf-8");
+      for j in range(0, len(EXPORT_METRICS)):
+         if (j < len(FS_METRICS)):
+            values = nfs_store["values"][fs_id, j];
+         else:
+            values = nfs_store["derived"][fs_id, j - len(FS_METRICS)];
+         # end if
+         # labels sorted by name, as Prometheus expects
+         labels = proto_bytes(1, proto_bytes(1, b"__name__") +
+                                 proto_bytes(2, ("nfsiostat_" + EXPORT_METRICS[j]).encode("utf-8")));
+         labels = labels + proto_bytes(1, proto_bytes(1, b"fs") + proto_bytes(2, fs));
+         labels = labels + proto_bytes(1, proto_bytes(1, b"host") + proto_bytes(2, host));
+         for istart in range(0, len(epoch), batch):
+            # samples of "batch" intervals of this series
+            block = values[istart:istart+batch];
+            index = numpy.nonzero(~numpy.isnan(block))[0];
+            samples = [proto_bytes(2, b"\x09" + struct.pack("<d", junk1) + b"\x10" + proto_varint(junk2*1000))
+                       for (junk1, junk2) in zip(block[index].tolist(),
+                                                 epoch[istart:istart+batch][index].tolist())];
+            k = 0;
+            while (k < len(samples)):
+               # as many samples as fit in the current message
+               junk1 = min(len(samples), k + batch - nsamples);
+               timeseries.append(proto_bytes(1, labels + b"".join(samples[k:junk1])));
+               nsamples = nsamples + junk1 - k;
+               k = junk1;
+               if (nsamples >= batch):
+                  yield b"".join(timeseries);
+                  timeseries = [];
+                  nsamples = 0;
+               # end if
+            # end while
+         # end for
+      # end for
+   # end for
+   if (len(timeseries) > 0):
+      yield b"".join(timeseries);
+   # end if
+# end def
+
+
+def export_remote_write(data, url, batch=5000):
+   #
+   # POSTs a parse() data store to a Prometheus remote write endpoint,
+   #   e.g. "http://localhost:9090/api/v1/write" (Prometheus with
+   #   --web.enable-remote-write-receiver), VictoriaMetrics, Mimir or
+   #   Thanos, in messages of at most "batch" samples. The snappy module
+   #   is used when it is installed (see snappy_compressor()).
+   #   Returns the number of messages written.
+   #
+   try:
+      from urllib.request import urlopen, Request;
+   except ImportError:
+      from urllib2 import urlopen, Request;
+   # end try
+   compress = snappy_compressor();
+   nbatches = 0;
+   for junk1 in remote_write_batches(data, batch):
+      request = Request(url, compress(junk1),
+                        {"Content-Type": "application/x-protobuf",
+                         "Content-Encoding": "snappy",
+                         "X-Prometheus-Remote-Write-Version": "0.1.0"});
+      urlopen(request).close();
+      nbatches = nbatches + 1;
+   # end for
+   return nbatches;
+# end def
+
+
+def export_parquet(data, dirname, batch=65536):
+   #
+   # Writes a parse() data store as Parquet files partitioned by host and
+   #   day (see EXPORT_METRICS above), one row group per "batch"
+   #   intervals. Needs the pyarrow module. Exporting the same capture
+   #   again replaces its files. Returns the list of files written.
+   #
+   try:
+      import pyarrow;
+      import pyarrow.parquet;
+   except ImportError:
+      print("Cannot import pyarrow module - this is needed for the Parquet export.");
+      print("Exiting...")
+      sys.exit();
+   # end try
+   nfs_store = data["store"];
+   nfs = len(nfs_store["fs_names"]);
+   epoch = numpy.asarray(data["x_epoch"], dtype=numpy.int64);
+   host = data["system_info"].get("system_name", "unknown");
+   fs_names = pyarrow.array(nfs_store["fs_names"], type=pyarrow.string());
+   fields = [pyarrow.field("time", pyarrow.timestamp("s")),
+             pyarrow.field("fs", pyarrow.dictionary(pyarrow.int32(), pyarrow.string()))];
+   fields = fields + [pyarrow.field(junk1, pyarrow.float64()) for junk1 in EXPORT_METRICS];
+   schema = pyarrow.schema(fields);
    
-   
-   # Create array of line colors/styles:
+   # Intervals of every day (the capture's own dates, see date_epoch())
+   (dates, date_inverse) = numpy.unique(numpy.array(data["date_list"]), return_inverse=True);
+   filenames = [];
+   for iday in range(0, len(dates)):
+      day = time.strftime("%Y-%m-%d", time.localtime(date_epoch(text_str(dates[iday]))));
+      index = numpy.nonzero(date_inverse == iday)[0];
+      partition = os.path.join(dirname, "host=" + host, "day=" + day);
+      if not os.path.exists(partition):
+         os.makedirs(partition);
+      # end if
+      filename = os.path.join(partition, "part-" + str(epoch[index[0]]) + ".parquet");
+      writer = pyarrow.parquet.ParquetWriter(filename + ".tmp", schema);
+      for istart in range(0, len(index), batch):
+         junk1 = index[istart:istart+batch];
+         # rows are (fs, interval) in file system order
+         columns = [pyarrow.array(numpy.tile(epoch[junk1], nfs), type=pyarrow.timestamp("s")),
+                    pyarrow.DictionaryArray.from_arrays(
+                       numpy.repeat(numpy.arange(nfs, dtype=numpy.int32), len(junk1)), fs_names)];
+         for values in [nfs_store["values"], nfs_store["derived"]]:
+            for j in range(0, values.shape[1]):
+               columns.append(pyarrow.array(values[:, j, junk1].ravel(), type=pyarrow.float64(),
+                                            from_pandas=True));   # NaN -> null
+            # end for
+         # end for
+         writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema));
+      # end for
+      writer.close();
+      os.rename(filename + ".tmp", filename);
+      filenames.append(filename);
+   # end for
+   return filenames;
+# end def
+
+
+
+
+
+
+
+
+
+# Library API
+# ===========
+#
+#   import nfsiostat_plotter_v4 as nfsiostat;
+#   data = nfsiostat.parse("nfsiostat.out");        # numpy only, no matplotlib
+#   nfsiostat.cpu_attach(data, nfsiostat.iostat_load("."));   # optional
+#   nfsiostat.render(data, "./HTML_REPORT");
+#   nfsiostat.export_influx(data, "nfsiostat.lp");   # or export_parquet()
+#
+# main() is the command line front end of the same functions.
+
+
+def line_styles():
+   #
+   # Array of line colors/styles for the combined plots:
    # http://matplotlib.org/api/artist_api.html#matplotlib.lines.Line2D.lineStyles
    # line_style = ['-', '--', '-.'];
    # line_marker  = ['o', '^', 's', '*', '+', '<', '>', 'v'];
+   #
    color_list = ['b', 'g', 'r', 'c', 'm', 'y', 'k'];
    line_style = ['o-', '^--', 's-.', '*-', '<--', '>-.', 'v-', 'o--'];
    line_list = [];
@@ -1971,153 +4110,759 @@ if __name__ == '__main__':
          line_list.append(junk2);
       # end for
    # end for
+   return line_list;
+# end def
+
+
+def iostat_load(dirname):
+   #
+   # Reads the iostat data that iostat_plotter.py wrote to directory
+   #   dirname: iostat_file.columns, or the old iostat_file.pickle.
+   #   Returns None when there is neither.
+   #
+   columns_dirname = os.path.join(dirname, "iostat_file.columns");
+   filename = os.path.join(dirname, "iostat_file.pickle");
+   if os.path.isdir(columns_dirname):
+      print("Reading iostat_file.columns");
+      (iostat_dict, junk1) = columns_load(columns_dirname);
+   elif os.path.isfile(filename) and (pickle_success > 0):
+      # Old format: only load pickles you trust
+      print("Reading iostat_file.pickle");
+      pickle_file = open(filename, 'rb');
+      if (sys.version_info[0] < 3):
+         iostat_dict = pickle.load(pickle_file);
+      else:
+         # Python 2 pickles: str (and numpy array data) as latin-1
+         iostat_dict = pickle.load(pickle_file, encoding="latin1");
+      # end if
+      pickle_file.close();
+   else:
+      return None;
+   # end if
+   return iostat_dict;
+# end def
+
+
+def cpu_attach(data, iostat_dict, clock_offset=0.0):
+   #
+   # Adds iostat data to a parse() data store so render() plots the CPU
+   #   utilization with the throughput: data["iostat_dict"], the CPU
+   #   series aligned to the nfsiostat intervals data["cpu_aligned"], the
+   #   number of intervals with a CPU sample data["cpu_matched"] (see
+   #   cpu_align()) and data["clock_offset"].
+   #
+   (cpu_aligned, cpu_matched) = cpu_align(iostat_dict, data["x_epoch"], clock_offset);
+   data["iostat_dict"] = iostat_dict;
+   data["cpu_aligned"] = cpu_aligned;
+   data["cpu_matched"] = cpu_matched;
+   data["clock_offset"] = clock_offset;
+   data["cpu_digest"] = cpu_digest(cpu_aligned);
+# end def
+
+
+def cpu_digest(cpu_aligned):
+   #
+   # sha1 of the aligned CPU series drawn in the figures (see cpu_align()),
+   #   so the incremental mode can tell when the CPU overlay changed, also
+   #   before the new intervals (iostat samples that arrived late)
+   #
+   junk1 = numpy.ascontiguousarray(cpu_aligned["time_sum_list"], dtype='<f8');
+   return hashlib.sha1(junk1.tobytes()).hexdigest();
+# end def
+
+
+def parse(source, parser_state=None, checkpoint=None, timer=None, profiler=None,
+          ingest_filter=None):
+   #
+   # Reads nfsiostat output into a data store for render() or for other
+   #   tools. Only numpy is needed.
+   #
+   # source = capture file name (plain or compressed, see open_capture())
+   #          or any iterable of lines, e.g. from a collector process
+   # parser_state = parser state to resume from and to update (incremental
+   #                mode, see nfsiostat_blocks()), None to read everything
+   # checkpoint = checkpoint_load() result with the intervals that were
+   #              read before parser_state, or None
+   # timer = stage_timer_new() timer: marks the "parse" and "time" stages
+   #         and prints the ingest rate, or None
+   # profiler = cProfile profiler that is enabled while reading, or None
+   # ingest_filter = ingest_filter_new() time window and file systems to
+   #                 keep, or None to keep every interval
+   #
+   # Returns a dictionary with
+   #   data["input_filename"] = source, or "-" for lines
+   #   data["store"] = nfs_store_new() store (with "derived", see derived_add())
+   #   data["fs_data_list"] = nfs_store_fs_data_list() of the store
+   #   data["date_list"], data["time_list"], data["meridian_list"] = time stamps
+   #   data["x_seconds"], data["x_epoch"] = interval_seconds() of the time stamps
+   #   data["system_info"] = system information from the first line
+   #   data["parser_state"] = parser_state
+   #   data["first_new"] = number of intervals that came from the checkpoint
+   #   data["checkpoint_cpu_digest"] = cpu_digest() of the checkpoint ("" if
+   #                                   none or drawn without CPU data)
+   #
+   if (checkpoint != None):
+      nfs_store = checkpoint["nfs_store"];
+      date_list = checkpoint["date_list"];
+      time_list = checkpoint["time_list"];
+      meridian_list = checkpoint["meridian_list"];
+      system_info = checkpoint["system_info"];
+   else:
+      nfs_store = nfs_store_new(4096);
+      date_list = [];
+      time_list = [];
+      meridian_list = [];
+      system_info = {};
+   # end if
+   first_new = nfs_store["count"];
+   
+   if isinstance(source, (str, type(u""))):
+      input_filename = source;
+      input_file = open_capture(source);
+      if (parser_state != None):
+         input_file.seek(parser_state["offset"]);
+      # end if
+   else:
+      input_filename = "-";
+      input_file = source;
+   # end if
+   line_counter = {"lines": 0};
+   input_lines = input_file;
+   if (timer != None):
+      input_lines = count_lines(input_file, line_counter, 5.0);
+   # end if
+   if (profiler != None):
+      profiler.enable();
+   # end if
+   for sample in nfsiostat_blocks(input_lines, system_info, parser_state, ingest_filter):
+      (local_date, local_time, local_meridian, rows) = sample;
+      date_list.append(local_date);
+      time_list.append(local_time);
+      meridian_list.append(local_meridian);
+      nfs_store_append_interval(nfs_store, rows);
+   # end for
+   if (input_file != source):
+      input_file.close();
+   # end if
+   fs_data_list = nfs_store_fs_data_list(nfs_store);
+   derived_add(fs_data_list, nfs_store);
+   if (profiler != None):
+      profiler.disable();
+   # end if
+   if (timer != None):
+      stage_mark(timer, "parse", line_counter["lines"]);
+   # end if
+   
+   # Time stamps (seconds since the first interval and epoch seconds)
+   (x_seconds, x_epoch) = interval_seconds(date_list, time_list, meridian_list);
+   if (timer != None):
+      stage_mark(timer, "time");
+   # end if
+   
+   data = {};
+   data["input_filename"] = input_filename;
+   data["store"] = nfs_store;
+   data["fs_data_list"] = fs_data_list;
+   data["date_list"] = date_list;
+   data["time_list"] = time_list;
+   data["meridian_list"] = meridian_list;
+   data["x_seconds"] = x_seconds;
+   data["x_epoch"] = x_epoch;
+   data["system_info"] = system_info;
+   data["parser_state"] = parser_state;
+   data["first_new"] = first_new;
+   data["checkpoint_cpu_digest"] = "";
+   if (checkpoint != None):
+      data["checkpoint_cpu_digest"] = checkpoint["cpu_digest"];
+   # end if
+   return data;
+# end def
+
+
+def render(data, dirname="./HTML_REPORT", combined_plots=0, nworkers=1, interactive=0,
+           busiest_n=10, anomaly_window=60, anomaly_threshold=6.0, timer=None, profiler=None,
+           figure_cache=1):
+   #
+   # Writes the HTML report of a parse() data store to dirname/report.html
+   #   with the figures, dirname/summary.json and, with a profiler,
+   #   dirname/profile.pstats (see main() and help_out() for the options).
+   #   Figures whose data did not change since the checkpoint
+   #   (data["first_new"] > 0) are not drawn again, and with figure_cache
+   #   figures found in dirname/figure_cache are copied instead of drawn.
+   #
+   # Returns the summary (see fs_summary()).
+   #
+   input_filename = data["input_filename"];
+   nfs_store = data["store"];
+   fs_data_list = data["fs_data_list"];
+   date_list = data["date_list"];
+   time_list = data["time_list"];
+   meridian_list = data["meridian_list"];
+   x_seconds = data["x_seconds"];
+   x_epoch = data["x_epoch"];
+   system_info = data["system_info"];
+   first_new = data["first_new"];
+   pickle_success = 0;
+   if ("cpu_aligned" in data):
+      pickle_success = 1;
+      cpu_time_sum_list = data["cpu_aligned"]["time_sum_list"];
+      cpu_matched = data["cpu_matched"];
+      clock_offset = data["clock_offset"];
+   # end if
+   if (timer == None):
+      timer = stage_timer_new();
+   # end if
+   line_list = line_styles();
+   if not os.path.exists(dirname):
+      os.makedirs(dirname);
+   # end if
+   
+   # File systems with new data since the checkpoint (all of them otherwise)
+   fs_changed = numpy.any(~numpy.isnan(nfs_store["values"][:, :, first_new:]), axis=2);
+   fs_changed = numpy.any(fs_changed, axis=1);
+   # CPU overlay not the one the figures were drawn with (see cpu_digest())
+   cpu_changed = (data.get("cpu_digest", "") != data.get("checkpoint_cpu_digest", ""));
+   
+   # Report sections, written with one report_write() at the end
+   sections = [];
+   sections.append(report_section("intro", intro_html(data, combined_plots)));
+   sections.append(report_section("links", links_html(fs_data_list, combined_plots)));
+   
+   # Summary statistics (HTML tables and summary.json)
+   time_labels = [(date_list[i] + " " + time_list[i] + " " + meridian_list[i]).strip()
+                  for i in range(0, len(date_list))];
+   summary = fs_summary(nfs_store, x_seconds, time_labels, busiest_n);
+   summary["anomalies"] = detect_anomalies(nfs_store, x_seconds, time_labels,
+                                           anomaly_window, anomaly_threshold);
+   print("Found ",len(summary["anomalies"])," bursts");
+   derived_summary(summary, nfs_store);
+   summary_file = open(dirname + "/summary.json", 'w');
+   json.dump(summary, summary_file, indent=1, sort_keys=True);
+   summary_file.close();
+   sections.append(report_section("summary", summary_html(summary, combined_plots)));
+   sections.append(report_section("derived", derived_html(summary, combined_plots)));
+   sections.append(report_section("anomalies", anomalies_html(summary["anomalies"], combined_plots,
+                                                               anomaly_window, anomaly_threshold)));
+   stage_mark(timer, "statistics");
+   
    
    
    
    # Actually create the plots!!
-   if (combined_plots == 0):
+   #   The HTML fragments and figure jobs are built first, the figures are
+   #   then rendered (in parallel) and the report is written last.
+   report_fragments = [];
+   figure_jobs = [];
+   figure_fs_ids = [];        # file system id of every figure (-1: all)
+   if (interactive == 1):
+      # Interactive report: charts drawn by the browser, no figure jobs
+      #   (and no matplotlib) needed
+      if (pickle_success > 0):
+         charts = interactive_charts(combined_plots, fs_data_list, cpu_time_sum_list, line_list);
+      else:
+         charts = interactive_charts(combined_plots, fs_data_list, None, line_list);
+      # end if
+      sections.append(report_section("interactive", interactive_html(x_seconds, charts,
+                                                                     2*INTERACTIVE_WIDTH)));
+   elif (combined_plots == 0):
       # Loop over each device and create plots and HTML:
       iloop = -1;
       iplot = 0;
       for item in fs_data_list:
          iloop = iloop + 1;
          
-         print "File system: ",item["fs"];
-         output_str = "<HR> \n";
-         f.write(output_str);
+         report_fragments.append("<HR> \n");
          
          # Figure 1:
          if (pickle_success > 0):
             # Figure 1: read(2), write(2), total CPU vs. time
             fsize = 6;
             iplot = iplot + 1;
-            plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-                  iostat_time_sum_list, fsize, item, fs_data_list, line_list);
-            print "   Finished Plot ",iplot," of ",max_plots;
+            (output_str, job) = plot1(iloop, iplot, combined_plots, dirname, x_seconds, cpu_time_sum_list,
+                                      fsize, item, fs_data_list, line_list);
          else:
             # Figure 1: read(2), write(2) vs. time
             fsize = 6;
             iplot = iplot + 1;
-            plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                   fs_data_list, line_list);
-            print "   Finished Plot ",iplot," of ",max_plots;
+            (output_str, job) = plot1a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item,
+                                       fs_data_list, line_list);
          # end if
+         report_fragments.append(output_str);
+         figure_jobs.append(job);
+         figure_fs_ids.append(iloop);
          
          # Figure 2:
          if (pickle_success > 0):
             # Figure 2: read, write, total CPU vs. time using O_DIRECT
             fsize = 6;
             iplot = iplot + 1;
-            plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-                  iostat_time_sum_list, fsize, item, fs_data_list, line_list);
+            (output_str, job) = plot2(iloop, iplot, combined_plots, dirname, x_seconds, cpu_time_sum_list,
+                                      fsize, item, fs_data_list, line_list);
          else:
             # Figure 2: read, write vs. time using O_DIRECT
             fsize = 6;
             iplot = iplot + 1;
-            plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item, 
-                   fs_data_list, line_list);
+            (output_str, job) = plot2a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item, 
+                                       fs_data_list, line_list);
          # end if
-         print "   Finished Plot ",iplot," of ",max_plots;
+         report_fragments.append(output_str);
+         figure_jobs.append(job);
+         figure_fs_ids.append(iloop);
          
          # Figure 3:
          if (pickle_success > 0):
-            # Figure 3: read, write, total CPU vs. time using O_DIRECT
+            # Figure 3: read, write, total CPU vs. time using NFS READ and NFS WRITE
             fsize = 6;
             iplot = iplot + 1;
-            plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-                  iostat_time_sum_list, fsize, item, fs_data_list, line_list);
+            (output_str, job) = plot3(iloop, iplot, combined_plots, dirname, x_seconds, cpu_time_sum_list,
+                                      fsize, item, fs_data_list, line_list);
          else:
-            # Figure 3: read, write time using O_DIRECT
+            # Figure 3: read, write time using NFS READ and NFS WRITE
             fsize = 6;
             iplot = iplot + 1;
-            plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                   fs_data_list, line_list);
+            (output_str, job) = plot3a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item,
+                                       fs_data_list, line_list);
          # end if
-         print "   Finished Plot ",iplot," of ",max_plots;
+         report_fragments.append(output_str);
+         figure_jobs.append(job);
+         figure_fs_ids.append(iloop);
          
          # Figure 4: ops, read ops, write ops vs. time
          fsize = 6;
          iplot = iplot + 1;
-         plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
-               fsize, item, fs_data_list, line_list);
-         print "   Finished Plot ",iplot," of ",max_plots;
+         (output_str, job) = plot4(iloop, iplot, combined_plots, dirname, x_seconds,
+                                   fsize, item, fs_data_list, line_list);
+         report_fragments.append(output_str);
+         figure_jobs.append(job);
+         figure_fs_ids.append(iloop);
+         
+         # Figure 5: derived efficiency metrics vs. time
+         fsize = 6;
+         iplot = iplot + 1;
+         (output_str, job) = plot5(iloop, iplot, combined_plots, dirname, x_seconds,
+                                   fsize, item, fs_data_list, line_list);
+         report_fragments.append(output_str);
+         figure_jobs.append(job);
+         figure_fs_ids.append(iloop);
       # end for
    elif (combined_plots == 1):
       # For each plot, loop over each device and create plot and HTML:
       iloop = 1;
       iplot = 0;
+      item = None;
        
-      output_str = "<HR> \n";
-      f.write(output_str);
+      report_fragments.append("<HR> \n");
       
       # Figure 1:
       if (pickle_success > 0):
          # Figure 1: read(2), write(2), total CPU vs. time
          fsize = 6;
          iplot = iplot + 1;
-         plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-               iostat_time_sum_list, fsize, item, fs_data_list, line_list);
+         (output_str, job) = plot1(iloop, iplot, combined_plots, dirname, x_seconds, cpu_time_sum_list,
+                                   fsize, item, fs_data_list, line_list);
       else:
          # Figure 1: read(2), write(2), total CPU vs. time
          fsize = 6;
          iplot = iplot + 1;
-         plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                fs_data_list, line_list);
-      print "   Finished Plot ",iplot," of ",max_plots;
+         (output_str, job) = plot1a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item,
+                                    fs_data_list, line_list);
+      # end if
+      report_fragments.append(output_str);
+      figure_jobs.append(job);
+      figure_fs_ids.append(-1);
       
       # Figure 2:
       if (pickle_success > 0):
          # Figure 2: read, write, total CPU vs. time using O_DIRECT
          fsize = 6;
          iplot = iplot + 1;
-         plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-               iostat_time_sum_list, fsize, item, fs_data_list, line_list);
+         (output_str, job) = plot2(iloop, iplot, combined_plots, dirname, x_seconds, cpu_time_sum_list,
+                                   fsize, item, fs_data_list, line_list);
       else:
          # Figure 2: read, write vs. time using O_DIRECT
          fsize = 6;
          iplot = iplot + 1;
-         plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                fs_data_list, line_list);
+         (output_str, job) = plot2a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item,
+                                    fs_data_list, line_list);
       # end if
-      print "   Finished Plot ",iplot," of ",max_plots;
+      report_fragments.append(output_str);
+      figure_jobs.append(job);
+      figure_fs_ids.append(-1);
       
       # Figure 3:
       if (pickle_success > 0):
-         # Figure 3: read, write, total CPU vs. time using O_DIRECT
+         # Figure 3: read, write, total CPU vs. time using NFS READ and NFS WRITE
          fsize = 6;
          iplot = iplot + 1;
-         plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-               iostat_time_sum_list, fsize, item, fs_data_list, line_list);
+         (output_str, job) = plot3(iloop, iplot, combined_plots, dirname, x_seconds, cpu_time_sum_list,
+                                   fsize, item, fs_data_list, line_list);
       else:
-         # Figure 3: read, write vs. time using O_DIRECT
+         # Figure 3: read, write vs. time using NFS READ and NFS WRITE
          fsize = 6;
          iplot = iplot + 1;
-         plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                fs_data_list, line_list);
+         (output_str, job) = plot3a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item,
+                                    fs_data_list, line_list);
       # end if
-      print "   Finished Plot ",iplot," of ",max_plots;
+      report_fragments.append(output_str);
+      figure_jobs.append(job);
+      figure_fs_ids.append(-1);
       
       # Figure 4: ops, read ops, write ops vs. time
       fsize = 6;
       iplot = iplot + 1;
-      plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
-            fsize, item, fs_data_list, line_list);
-      print "   Finished Plot ",iplot," of ",max_plots;
+      (output_str, job) = plot4(iloop, iplot, combined_plots, dirname, x_seconds,
+                                fsize, item, fs_data_list, line_list);
+      report_fragments.append(output_str);
+      figure_jobs.append(job);
+      figure_fs_ids.append(-1);
+      
+      # Figure 5: derived efficiency metrics vs. time
+      fsize = 6;
+      iplot = iplot + 1;
+      (output_str, job) = plot5(iloop, iplot, combined_plots, dirname, x_seconds,
+                                fsize, item, fs_data_list, line_list);
+      report_fragments.append(output_str);
+      figure_jobs.append(job);
+      figure_fs_ids.append(-1);
+   # end if
+   
+   # Incremental mode: only redraw figures whose data changed
+   if (first_new > 0):
+      render_jobs = [];
+      for ijob in range(0, len(figure_jobs)):
+         fs_id = figure_fs_ids[ijob];
+         if (fs_id < 0):
+            ichanged = numpy.any(fs_changed);
+         else:
+            ichanged = fs_changed[fs_id];
+         # end if
+         if (cpu_changed) and ((figure_jobs[ijob]["cpu"] == 1) or (len(data.get("cpu_digest", "")) == 0)):
+            # new CPU overlay, or the figures lost it (no iostat data any more)
+            ichanged = True;
+         # end if
+         if (ichanged) or (not os.path.isfile(figure_jobs[ijob]["filename"] + ".png")):
+            render_jobs.append(figure_jobs[ijob]);
+         # end if
+      # end for
+      print("Redrawing ",len(render_jobs)," of ",len(figure_jobs)," plots");
+   else:
+      render_jobs = figure_jobs;
    # end if
    
+   stage_mark(timer, "figures");
    
-   # Start of Pickling
-   # =================
-   if (pickle_success > 0):
-      # Open file for pickling
-      pickle_file = open('nfsiostat_file.pickle', 'w')
-      
-      # Write list to pickle file
-      pickle.dump(fs_data_list, pickle_file);
-      
-      # Close pickle file
-      pickle_file.close();
+   # Render the figures
+   if (profiler != None):
+      profiler.enable();
+   # end if
+   cache_dirname = None;
+   if (figure_cache == 1) and (interactive == 0):
+      cache_dirname = dirname + "/figure_cache";
+   # end if
+   run_start = time.time();
+   for ijob in render_figures(render_jobs, nworkers, cache_dirname):
+      print("   Finished Plot ",ijob+1," of ",len(render_jobs));
+   # end for
+   if (profiler != None):
+      profiler.disable();
+   # end if
+   if (cache_dirname != None) and (first_new > 0):
+      figure_cache_prune(cache_dirname, run_start, 1);
+   elif (cache_dirname != None):
+      figure_cache_prune(cache_dirname, run_start);
+   # end if
+   stage_mark(timer, "render");
+   
+   # Write the report
+   sections.append(report_section("figures", "".join(report_fragments)));
+   sections.append(report_section("timing", timing_html(timer)));
+   report_write(dirname + "/report.html", "NFSIOSTAT Report for file: " + input_filename, sections);
+   if (profiler != None):
+      profile_write(profiler, dirname);
+   # end if
+   return summary;
+# end def
+
+
+def columns_save(data, dirname):
+   #
+   # Writes a parse() data store (and the iostat data added with
+   #   cpu_attach()) as the columnar directory nfsiostat_file.columns
+   #   for downstream tools (see COLUMNS_FORMAT)
+   #
+   nfs_store = data["store"];
+   nfsiostat_dict = {};
+   nfsiostat_dict["x_seconds"] = data["x_seconds"];
+   nfsiostat_dict["x_epoch"] = data["x_epoch"];
+   nfsiostat_dict["time_data"] = {"date_list": data["date_list"], "time_list": data["time_list"],
+                                  "meridian_list": data["meridian_list"]};
+   nfsiostat_dict["system_info"] = data["system_info"];
+   nfsiostat_dict["fs_names"] = nfs_store["fs_names"];
+   nfsiostat_dict["fs_values"] = nfs_store["values"];
+   nfsiostat_dict["fs_derived"] = nfs_store["derived"];
+   if ("cpu_aligned" in data):
+      nfsiostat_dict["cpu_data"] = data["iostat_dict"]["cpu_data"];
+      nfsiostat_dict["device_data_list"] = data["iostat_dict"]["device_data_list"];
+      nfsiostat_dict["iostat_x_seconds"] = data["iostat_dict"]["x_seconds"];
+      nfsiostat_dict["cpu_aligned"] = data["cpu_aligned"];
+   # end if
+   columns_write(dirname, nfsiostat_dict,
+                 {"fs_metrics": FS_METRICS, "derived_metrics": DERIVED_METRICS,
+                  "input_filename": data["input_filename"]});
+# end def
+
+
+
+
+
+
+
+
+
+# ===================
+# Main Python section
+# ===================
+
+def main(argv):
+   #
+   # Command line front end (see help_out())
+   #
+   
+   # Get the command line inputs
+   input_options = argv;
+   combined_plots = 0;
+   help_flag = 0;
+   nworkers = multiprocessing.cpu_count();
+   incremental = 0;
+   follow = 0;
+   window = 600;
+   refresh = 10.0;
+   clock_offset = 0.0;
+   busiest_n = 10;
+   fleet = 0;
+   top_n = 5;
+   interactive = 0;
+   anomaly_window = 60;
+   anomaly_threshold = 6.0;
+   profile = 0;
+   influx_target = "";
+   figure_cache = 1;
+   parquet_dirname = "";
+   remote_write_url = "";
+   time_from = "";
+   time_to = "";
+   fs_patterns = [];
+   for item in input_options:
+      item2 = item.lower();
+      if (item2 == "-c"):
+         combined_plots = 1;
+      elif (item2[0:7] == "--jobs="):
+         nworkers = int(item2[7:]);
+      elif (item2 == "--incremental"):
+         incremental = 1;
+      elif (item2 == "--follow"):
+         follow = 1;
+      elif (item2[0:9] == "--window="):
+         window = int(item2[9:]);
+      elif (item2[0:10] == "--refresh="):
+         refresh = float(item2[10:]);
+      elif (item2[0:15] == "--clock-offset="):
+         clock_offset = float(item2[15:]);
+      elif (item2[0:10] == "--busiest="):
+         busiest_n = int(item2[10:]);
+      elif (item2 == "--fleet"):
+         fleet = 1;
+      elif (item2 == "--interactive"):
+         interactive = 1;
+      elif (item2[0:17] == "--anomaly-window="):
+         anomaly_window = int(item2[17:]);
+      elif (item2[0:20] == "--anomaly-threshold="):
+         anomaly_threshold = float(item2[20:]);
+      elif (item2 == "--profile"):
+         profile = 1;
+      elif (item2 == "--no-figure-cache"):
+         figure_cache = 0;
+      elif (item2[0:9] == "--influx="):
+         influx_target = item[9:];            # file names and URLs keep their case
+      elif (item2[0:10] == "--parquet="):
+         parquet_dirname = item[10:];
+      elif (item2[0:15] == "--remote-write="):
+         remote_write_url = item[15:];
+      elif (item2[0:7] == "--from="):
+         time_from = item[7:];
+      elif (item2[0:5] == "--to="):
+         time_to = item[5:];
+      elif (item2[0:5] == "--fs="):
+         fs_patterns.append(item[5:]);        # mount names are case sensitive
+      elif (item2[0:6] == "--top="):
+         top_n = int(item2[6:]);
+      elif ( (item2[0:2] == "-h") or (item2[0:2] == "-H") ):
+         help_flag = 1;
+      # end if
+   # end for
+   if (help_flag == 1):
+      help_out();
+      sys.exit();
+   # end if
+   for item in [time_from, time_to]:
+      try:
+         window_time(item);
+      except ValueError:
+         print("Cannot decode the --from/--to time \"" + item + "\" - use \"YYYY-MM-DD HH:MM[:SS]\",");
+         print("\"MM/DD/YYYY HH:MM[:SS]\" or a time of day \"HH:MM[:SS]\".");
+         print("Exiting...")
+         sys.exit();
+      # end try
+   # end for
+
+   input_filename = input_options[-1];
+   
+   # Stage timings (report footer) and the optional profiler
+   timer = stage_timer_new();
+   profiler = None;
+   if (profile == 1):
+      # Render in this process so the render loop is in the profile
+      profiler = cProfile.Profile();
+      nworkers = 1;
+   # end if
+   
+   print("nfsiostat plotting script (includes iostat data)");
+   print(" ");
+   if (fleet == 0):
+      print("input filename: ",input_filename);
+   # end if
+   
+   # Read iostat data (CPU utilization), if iostat_plotter.py wrote any
+   iostat_dict = iostat_load(".");
+   
+   # 
+   # HTML Report initialization
+   #    Write all data files to subdirectory called HTML_REPORT
+   #    File is report.html
+   dirname ="./HTML_REPORT";
+   if not os.path.exists(dirname):
+      os.makedirs(dirname);
+   # end if
+   line_list = line_styles();
+   
+   # Live follow mode: dashboard only, runs until the input ends
+   if (follow == 1):
+      follow_dashboard(input_filename, dirname, window, refresh, line_list);
+      sys.exit();
+   # end if
+   
+   # Fleet mode: every argument that is not an option is a capture file
+   if (fleet == 1):
+      junk1 = [];
+      if (combined_plots == 1):
+         junk1.append("-c");
+      # end if
+      if (interactive == 1):
+         junk1.append("--interactive");
+      # end if
+      if (incremental == 1):
+         junk1.append("--incremental");
+      # end if
+      if (len(influx_target) > 0) or (len(parquet_dirname) > 0) or (len(remote_write_url) > 0):
+         junk1.append("--influx/--parquet/--remote-write");
+      # end if
+      if (len(junk1) > 0):
+         print("The fleet report does not support " + ", ".join(junk1) + ".");
+         print("Exiting...")
+         sys.exit();
+      # end if
+      selection = None;
+      if (len(time_from) > 0) or (len(time_to) > 0) or (len(fs_patterns) > 0):
+         selection = (time_from, time_to, fs_patterns);
+      # end if
+      input_filenames = [item for item in input_options[1:] if (item[0:1] != "-")];
+      fleet_report(input_filenames, dirname, nworkers, top_n, busiest_n, line_list, selection);
+      print("Finished. Please open the document HTML/report.html in a browser.");
+      sys.exit();
+   # end if
+   
+   # Time window and file system selection, applied while reading
+   ingest_filter = None;
+   if (len(time_from) > 0) or (len(time_to) > 0) or (len(fs_patterns) > 0):
+      ingest_filter = ingest_filter_new(time_from, time_to, fs_patterns);
+   # end if
+   
+   # Incremental mode: continue from the checkpoint next to the report
+   #   (byte offsets of compressed captures are not file offsets)
+   parser_state = None;
+   checkpoint = None;
+   if (incremental == 1) and (input_filename == "-"):
+      print("Input from stdin - reading all of it instead of resuming from a checkpoint");
+      incremental = 0;
+   # end if
+   if (incremental == 1) and (len(capture_compression(input_filename)) > 0):
+      print("Compressed input - reading the whole file instead of resuming from a checkpoint");
+      incremental = 0;
+   # end if
+   if (incremental == 1) and (ingest_filter != None):
+      # The checkpoint would not describe the whole file
+      print("--from/--to/--fs selection - reading the whole file instead of resuming from a checkpoint");
+      incremental = 0;
+   # end if
+   if (incremental == 1):
+      checkpoint_filename = dirname + "/checkpoint.npz";
+      checkpoint = checkpoint_load(checkpoint_filename, input_filename);
+      if (checkpoint != None):
+         parser_state = checkpoint["parser_state"];
+         print("Resuming from checkpoint at byte ",parser_state["offset"]," (",checkpoint["nfs_store"]["count"]," data points)");
+      else:
+         parser_state = {"state": PARSE_SYSTEM, "offset": 0};
+      # end if
+   # end if
+   
+   # loop over interval blocks in input file
+   print(" ");
+   print("reading nfsiostat output file ... ");
+   stage_mark(timer, "setup");
+   data = parse(input_filename, parser_state, checkpoint, timer, profiler, ingest_filter);
+   print("Finished reading ",len(data["date_list"])," data points for ",len(data["fs_data_list"])," NFS mounted file systems.");
+   if (len(data["date_list"]) == 0):
+      print("No intervals were selected. Exiting...");
+      sys.exit();
+   # end if
+   print("Creating plots and HTML report");
+   
+   # Put the iostat CPU data on the nfsiostat time base
+   if (iostat_dict != None):
+      cpu_attach(data, iostat_dict, clock_offset);
+      print("iostat CPU data aligned to ",data["cpu_matched"]," of ",len(data["x_epoch"])," nfsiostat intervals");
+   # end if
+   
+   render(data, dirname, combined_plots, nworkers, interactive, busiest_n,
+          anomaly_window, anomaly_threshold, timer, profiler, figure_cache);
+   
+   if (incremental == 1):
+      checkpoint_save(checkpoint_filename, input_filename, data["store"], data["date_list"],
+                      data["time_list"], data["meridian_list"], data["system_info"],
+                      data["parser_state"], data.get("cpu_digest", ""));
+   # end if
+   
+   # Columnar exchange data for downstream tools
+   columns_save(data, "./nfsiostat_file.columns");
+   
+   # Bulk export
+   if (len(influx_target) > 0):
+      nbatches = export_influx(data, influx_target);
+      print("Exported ",nbatches," batches of line protocol to ",influx_target);
+   # end if
+   if (len(remote_write_url) > 0):
+      nbatches = export_remote_write(data, remote_write_url);
+      print("Exported ",nbatches," remote write requests to ",remote_write_url);
+   # end if
+   if (len(parquet_dirname) > 0):
+      filenames = export_parquet(data, parquet_dirname);
+      print("Exported ",len(filenames)," Parquet files to ",parquet_dirname);
    # end if
-   print "Finished. Please open the document HTML/report.html in a browser.";
    
-# end
+   print("Finished. Please open the document HTML/report.html in a browser.");
+# end def
+
+
+if __name__ == '__main__':
+   main(sys.argv);
+# end if
@@ -27,6 +27,7 @@ Options:
   --full                          Create full snapshot instead of thin clone using -copy options
   --metro
   --json                          Set output format set to JSON (Rest API)
+  --no-cache                      Ignore cached symcli discovery for show/list, query the arrays again
 
 Example:
   snapvx_clone.py list --source-db=JIRKA --target-db=BOSON
@@ -35,6 +36,7 @@ Example:
 
 from __future__ import print_function
 
+import fcntl
 import logging
 import os
 import sys
@@ -42,8 +44,11 @@ import shlex
 import subprocess
 import re
 import socket
+import threading
+import time
 import xml.etree.ElementTree as ET
 import json.tool
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from operator import itemgetter
 from docopt import docopt
@@ -57,6 +62,11 @@ __status__ = 'Development'
 Changelog:
 ==========
 
+20261018:
+- soubezne symsg dotazy na vsechna pole (SYMCLI_WORKERS)
+- discovery cache ~/.cache/snapvx_clone.json s TTL, zahozena po create/link/unlink/restore
+- add --no-cache
+
 20181201:
 - Add assert na pocet disku target sg a snapshot disku
 - Add wait for DEFINED stav disku pred unlink operation
@@ -98,6 +108,14 @@ DEBUG = False        # pouze pro vypsani symcli prikazu namisto jejich zavolani
 TRACE_DIR = '/var/log/dba'
 VMAX3_MODELS = ['VMAX250F', 'VMAX200K']
 SYMCLI_PATH = 'sudo /usr/symcli/bin/'
+SYMCLI_WORKERS = 6   # max. pocet soubezne bezicich symcli dotazu (pole VMAX)
+CACHE_FILE = os.path.expanduser('~/.cache/snapvx_clone.json')
+CACHE_TTL = {        # platnost polozek discovery cache v sekundach dle prikazu
+    'symcfg': 24 * 3600,    # seznam poli
+    'symsg': 3600,          # storage groupy a jejich disky
+    'symrdf': 3600,         # SRDF/Metro disky a RDF groupy
+}
+USE_CACHE = True     # False (--no-cache, zmenove akce): cache se necte, pouze se prepise
 DATA_ASM_DISKGROUP = r'_?(D\d+|DATA|nf)$'   # D01 nebo DATA, pro Starbank pak nf
 EXCLUDED_REGEXP_SG = r'^[pb]porazal_.*|_GK|p.aixz'
 SNAPSHOT_NAME_PREFIX = "SN_"
@@ -108,6 +126,143 @@ class SnapVXError(LookupError):
   pass
 
 
+_cache = None           # platne polozky nactene z CACHE_FILE
+_discovered = dict()    # polozky zjistene v tomto behu, uklada je cache_save()
+_cache_lock = threading.Lock()
+
+
+def cache_lock():
+  """ Zamek CACHE_FILE mezi soubeznymi behy (fcntl.flock na CACHE_FILE.lock)
+
+  :return: otevreny lock soubor, zamek se uvolni jeho zavrenim (with)
+  """
+
+  os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+  lock_file = open(CACHE_FILE + '.lock', 'a')
+  fcntl.flock(lock_file, fcntl.LOCK_EX)
+  return lock_file
+
+
+def cache_read():
+  """ Nacti discovery cache z CACHE_FILE
+
+  - soubor jineho tvaru nez {'invalidated': ..., 'entries': {...}} je prazdna cache
+  - vynech polozky s neznamym prikazem (CACHE_TTL), expirovane
+    a zjistene pred posledni invalidaci
+
+  :return: tuple (invalidated, dict {symcli prikaz: {'timestamp': ..., 'value': ...}})
+  """
+
+  try:
+    with open(CACHE_FILE) as cache_file:
+      content = json.load(cache_file)
+  except (IOError, OSError, ValueError) as err:
+    logging.debug('discovery cache not loaded: %s', err)
+    return (0, dict())
+
+  if (not isinstance(content, dict) or
+          not isinstance(content.get('invalidated'), (int, float)) or
+          not isinstance(content.get('entries'), dict)):
+    logging.warning('discovery cache %s is not valid, ignored', CACHE_FILE)
+    return (0, dict())
+
+  now = time.time()
+  invalidated = content['invalidated']
+  entries = dict()
+  for key, entry in content['entries'].items():
+    ttl = CACHE_TTL.get(key.split()[0]) if key.split() else None
+    if (ttl and isinstance(entry, dict) and 'value' in entry and
+            isinstance(entry.get('timestamp'), (int, float)) and
+            invalidated < entry['timestamp'] and now - entry['timestamp'] < ttl):
+      entries[key] = entry
+
+  return (invalidated, entries)
+
+
+def cache_write(invalidated, entries):
+  """ Zapis discovery cache, volat pod cache_lock()
+
+  - zapis pres docasny soubor a rename, soubezne behy nevidi polovicni soubor
+  """
+
+  tmp_file = '{}.{}'.format(CACHE_FILE, os.getpid())
+  with open(tmp_file, 'w') as cache_file:
+    json.dump({'invalidated': invalidated, 'entries': entries}, cache_file)
+  os.replace(tmp_file, CACHE_FILE)
+
+
+def cache_save():
+  """ Uloz polozky zjistene v tomto behu do CACHE_FILE, jednou po discovery
+
+  - pod zamkem znovu nacti soubor a pridej pouze nove zjistene polozky,
+    polozky ostatnich behu zustanou zachovany
+  - polozky zjistene pred invalidaci jinym behem se zahodi (cache_read())
+  """
+
+  with _cache_lock:
+    if not _discovered:
+      return
+    try:
+      with cache_lock():
+        invalidated, entries = cache_read()
+        entries.update({k: v for k, v in _discovered.items()
+                        if invalidated < v['timestamp']})
+        cache_write(invalidated, entries)
+    except (IOError, OSError) as err:
+      logging.warning('discovery cache not saved: %s', err)
+    _discovered.clear()
+
+
+def cache_invalidate():
+  """ Zahod discovery cache, volat po zmene na poli (create/link/unlink/restore)
+
+  - cas invalidace zustava v CACHE_FILE, starsi polozky soubeznych behu
+    se do cache uz nedostanou
+  """
+
+  global _cache
+  with _cache_lock:
+    _cache = dict()
+    _discovered.clear()
+    try:
+      with cache_lock():
+        cache_write(time.time(), dict())
+    except (IOError, OSError) as err:
+      logging.warning('discovery cache not invalidated: %s', err)
+  logging.debug('discovery cache invalidated')
+
+
+def cached(symcli_cmd, discover):
+  """ Vrat naparsovany vysledek symcli dotazu z discovery cache
+
+  :param symcli_cmd: symcli prikaz, klic cache; prvni slovo urcuje TTL (CACHE_TTL)
+  :param discover:   funkce bez parametru, ktera prikaz zavola a naparsuje,
+                     vysledek musi jit ulozit do JSON
+
+  :return: platna hodnota z cache, jinak vysledek discover()
+  """
+
+  global _cache
+  with _cache_lock:
+    if _cache is None:
+      _cache = cache_read()[1] if USE_CACHE else dict()
+    entry = _cache.get(symcli_cmd)
+
+  if USE_CACHE and entry:
+    logging.debug('cached: %s', symcli_cmd)
+    return entry['value']
+
+  # cas pred dotazem, vysledek nesmi byt novejsi nez stav pole
+  timestamp = time.time()
+  value = discover()
+
+  with _cache_lock:
+    _discovered[symcli_cmd] = {'timestamp': timestamp, 'value': value}
+    _cache[symcli_cmd] = _discovered[symcli_cmd]
+
+  return value
+
+
 def set_logging():
   """ Initialize debug logging """
   timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -177,6 +332,25 @@ def run_symcli_cmd(symcli_cmd, output_format='text', check=True, debug=False):
     return [output, returncode]
 
 
+def symcli_map(func, items):
+  """ Zavolej func pro kazdou polozku items soubezne (symcli dotazy na vice poli)
+
+  - nejvyse SYMCLI_WORKERS soubeznych volani
+  - vysledky jsou ve stejnem poradi jako items, nezavisle na tom,
+    ktery dotaz dobehne driv
+  - vyjimka z kterehokoliv volani se propaguje dale
+
+  :return: list vysledku func(item)
+  """
+
+  items = list(items)
+  if len(items) <= 1:
+    return [func(item) for item in items]
+
+  with ThreadPoolExecutor(max_workers=min(SYMCLI_WORKERS, len(items))) as executor:
+    return list(executor.map(func, items))
+
+
 def get_symid(symid):
   """ Vrat vsechna dostupna SymID VMAX3 pole ze symcfg list
 
@@ -187,14 +361,18 @@ def get_symid(symid):
   """
 
   symcli_cmd = 'symcfg list'
-  [syminfo_tree, _returncode] = run_symcli_cmd(symcli_cmd, output_format='xml')
 
-  """
-  naparsuj xml a vytvor
-  list of symid, vybrane vmax pole, posledni 4 cislice """
-  symid_list = [int(item.find('symid').text[-4:])
-                for item in syminfo_tree.findall('Symmetrix/Symm_Info')
-                if item.find('model').text in VMAX3_MODELS]
+  def discover():
+    [syminfo_tree, _returncode] = run_symcli_cmd(symcli_cmd, output_format='xml')
+
+    """
+    naparsuj xml a vytvor
+    list of symid, vybrane vmax pole, posledni 4 cislice """
+    return [int(item.find('symid').text[-4:])
+            for item in syminfo_tree.findall('Symmetrix/Symm_Info')
+            if item.find('model').text in VMAX3_MODELS]
+
+  symid_list = cached(symcli_cmd, discover)
 
   logging.debug("SymmId arrays: %s", symid_list)
 
@@ -219,14 +397,19 @@ def symsg_show(symid, sg):
   """
 
   symcli_cmd = 'symsg -sid {symid} show {sg}'.format(symid=symid, sg=sg)
-  [output_xml, _returncode] = run_symcli_cmd(symcli_cmd,
-                                             output_format='xml',
-                                             check=True)
 
-  dev_name = sorted([item.find('dev_name').text for item
-                     in output_xml.findall('SG/DEVS_List/Device')])
-  dev_type = [item.find('configuration').text for item
-              in output_xml.findall('SG/DEVS_List/Device')]
+  def discover():
+    [output_xml, _returncode] = run_symcli_cmd(symcli_cmd,
+                                               output_format='xml',
+                                               check=True)
+
+    dev_name = sorted([item.find('dev_name').text for item
+                       in output_xml.findall('SG/DEVS_List/Device')])
+    dev_type = [item.find('configuration').text for item
+                in output_xml.findall('SG/DEVS_List/Device')]
+    return [dev_name, dev_type]
+
+  dev_name, dev_type = cached(symcli_cmd, discover)
 
   if any([s.startswith('RDF') for s in dev_type]):
     metro = True
@@ -240,6 +423,26 @@ def symsg_show(symid, sg):
   return (dev_name, metro) if dev_name else None
 
 
+def symsg_info(symid):
+  """ symsg list
+
+  :param symid: symid VMAX3 pole
+
+  :return: list [sg_name, num_devs] vsech storage group na poli
+  """
+
+  symcli_cmd = 'symsg -sid {sid} list'.format(sid=symid)
+
+  def discover():
+    [sginfo_tree, _returncode] = run_symcli_cmd(symcli_cmd, output_format='xml')
+
+    # parse XML output ze symsg list
+    return [[item.find('name').text, int(item.find('num_devs').text)]
+            for item in sginfo_tree.findall('SG/SG_Info')]
+
+  return cached(symcli_cmd, discover)
+
+
 def symsg_list(symid, dbname):
   """ Funkce hleda nazev storage groupy dle zadane nazvu dbname
 
@@ -261,25 +464,29 @@ def symsg_list(symid, dbname):
   # pokud není symid typu list, tak ho zkonvertuj na list
   if not isinstance(symid, list):
     symid = [symid]
-  for sid in symid:
-    symcli_cmd = "symsg -sid {sid} list".format(sid=sid)
-    [sginfo_tree, _returncode] = run_symcli_cmd(symcli_cmd, output_format='xml')
 
-    # parse XML output ze symsg list
-    for item in sginfo_tree.findall('SG/SG_Info'):
-      sg_name = item.find('name').text
+  # symsg list na vsech polich soubezne, vysledky v poradi symid
+  sginfo_lists = symcli_map(symsg_info, symid)
+
+  # vyber sg dle nazvu db
+  matched = []
+  for sid, sginfo_list in zip(symid, sginfo_lists):
+    for sg_name, num_devs in sginfo_list:
 
       if (re.search(sg_to_match, sg_name, flags=re.IGNORECASE) and
               # vynech excludovane sg pro offload backup servery
               not(re.search(EXCLUDED_REGEXP_SG, sg_name,
                             flags=re.IGNORECASE))):
-        if sg_name not in sg:
-          # detekce typu disku RDF[12]
-          dev_name, metro = symsg_show(sid, sg_name)
-          sg = (sid, sg_name, dev_name, int(item.find('num_devs').text), metro)
-        else:
+        if matched and matched[-1][1] == sg_name:
           # pokud jiz sg existuje na jinem poli, vyhod Warning
           logging.warning("Multiple SymID for storage group %s found", sg_name)
+        else:
+          matched.append((sid, sg_name, num_devs))
+
+  # detekce typu disku RDF[12], symsg show soubezne pro nalezene sg
+  sg_show = symcli_map(lambda m: symsg_show(m[0], m[1]), matched)
+  for (sid, sg_name, num_devs), (dev_name, metro) in zip(matched, sg_show):
+    sg = (sid, sg_name, dev_name, num_devs, metro)
 
   logging.debug("symsg list: %s", sg)
   if not sg:
@@ -389,6 +596,9 @@ def get_symcli_env(source_db, target_db, symid, snapshot_name):
 
   logging.debug("symcli_env: %s", symcli_env)
 
+  # discovery hotova, uloz nove zjistene polozky
+  cache_save()
+
   return symcli_env
 
 
@@ -443,14 +653,18 @@ def symrdf_list(symid):
 
   symcli_cmd = 'symrdf -sid {sid} -rdf_metro list'.format(sid=symid)
 
-  [output_xml, _returncode] = run_symcli_cmd(
-      symcli_cmd, output_format='xml', check=True)
+  def discover():
+    [output_xml, _returncode] = run_symcli_cmd(
+        symcli_cmd, output_format='xml', check=True)
 
-  rdf_dev = dict()
-  for item in output_xml.findall('Symmetrix/Device/RDF/Local'):
-    dev_name = item.find('dev_name').text
-    rdf_group = item.find('ra_group_num').text
-    rdf_dev[dev_name] = rdf_group
+    rdf_dev = dict()
+    for item in output_xml.findall('Symmetrix/Device/RDF/Local'):
+      dev_name = item.find('dev_name').text
+      rdf_group = item.find('ra_group_num').text
+      rdf_dev[dev_name] = rdf_group
+    return rdf_dev
+
+  rdf_dev = cached(symcli_cmd, discover)
 
   return rdf_dev if rdf_dev else None
 
@@ -863,6 +1077,13 @@ def main(arguments):
   set_logging()
   logging.debug("snapvx_clone.py args: %s", arguments)
 
+  # discovery cache pouze pro read-only show/list (Jenkins)
+  # create/link/unlink/restore vzdy validuji proti aktualnimu stavu poli,
+  # --no-cache vynuti nove dotazy i pro show/list
+  global USE_CACHE
+  if arguments['--no-cache'] or arguments['<command>'] not in ('show', 'list'):
+    USE_CACHE = False
+
   # toem: rovnou exit 0
   if 'toem' in socket.gethostname():
     logging.debug('toem: exit 0')
@@ -909,7 +1130,10 @@ def main(arguments):
     if symcli_env['source_is_metro']:
       symcli_env['snapshot_opts'] += ['-both_sides']
 
-    establish_snapshot(symcli_env)
+    try:
+      establish_snapshot(symcli_env)
+    finally:
+      cache_invalidate()
 
     # na konci vypis pouze posledni vytvoreny snapshot
     list_snapshot(symcli_env, output_format, last_only=True)
@@ -921,10 +1145,16 @@ def main(arguments):
     if symcli_env['target_is_metro']:
       symcli_env['link_opts'] = ['-copy', '-remote']
 
-    link_snapshot(symcli_env)
+    try:
+      link_snapshot(symcli_env)
+    finally:
+      cache_invalidate()
 
   elif action == 'unlink':
-    unlink_snapshot(symcli_env['symid'], symcli_env['target_sg'])
+    try:
+      unlink_snapshot(symcli_env['symid'], symcli_env['target_sg'])
+    finally:
+      cache_invalidate()
 
   elif action == 'restore':
 
@@ -933,10 +1163,13 @@ def main(arguments):
       raise AssertionError(
           'Restore do SRDF/Metro Storage Group neni podporovan.')
 
-    # NUTNY unlink SOURCE sg pred restorem, pokud je source sg jiz linknuta
-    unlink_snapshot(symcli_env['symid'], symcli_env['source_sg'])
-    # restore sg
-    restore_snapshot(symcli_env)
+    try:
+      # NUTNY unlink SOURCE sg pred restorem, pokud je source sg jiz linknuta
+      unlink_snapshot(symcli_env['symid'], symcli_env['source_sg'])
+      # restore sg
+      restore_snapshot(symcli_env)
+    finally:
+      cache_invalidate()
 
 
 if __name__ == "__main__":